@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Benchmarks of yang_config_generator on the bundled router and IOS NED models.
+
+The models are compiled to benchmarks/fixtures, incrementally so only when
+a YANG file changed. The generator is run in-process, writing to a
+null sink, and the results are written as JSON so that runs on different
+commits can be compared:
+
+    benchmarks/run_benchmarks.py -I $NCS_DIR/src/ncs/yang -o before.json
+    benchmarks/run_benchmarks.py -I $NCS_DIR/src/ncs/yang -o after.json --compare before.json
+"""
+from argparse import ArgumentParser
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import rstr
+import yang_config_generator as ycg
+
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+# Fixture: (YANG modules, genconfig paths, descriptors)
+models = {
+    'router': (['router.yang'], [None, '/sys/interfaces', '/sys/routes'], ['desc.py', 'desc2.py']),
+    'ios': (['tailf-ned-cisco-ios.yang'], ['/interface', '/router/bgp', '/ip'], []),
+}
+
+DESCRIPTOR_SCALES = [1, 10, 100]  # Factors for the instances of the outermost lists of the descriptors
+XEGER_PATTERNS = 20  # Most used patterns of each model
+XEGER_SECONDS = 0.2  # Time to generate strings of each pattern
+
+
+def compile_fixture(args, name):
+    """Compile the model, which is a no-op when its YANG files are unchanged. Returns the schema path."""
+    modules, _, _ = models[name]
+    model = os.path.join(FIXTURES, f'{name}.json')
+    os.makedirs(FIXTURES, exist_ok=True)
+    cmd = [sys.executable, os.path.join(ROOT, 'yang_config_generator.py'), 'compile', '--ignore-errors',
+           '-o', model, '-I', ROOT]
+    for i in args.I:
+        cmd += ['-I', i]
+    subprocess.run(cmd + [os.path.join(ROOT, m) for m in modules], cwd=ROOT, check=True)
+    if not os.path.exists(model):
+        raise RuntimeError(f"compile of {name} produced no schema")
+    return model
+
+
+def generator_args(model, *argv):
+    """Parse the arguments of a yang_config_generator command, for the in-process API."""
+    return ycg.parser.parse_args(['-m', model, *argv])
+
+
+def null_sink(args):
+    backend, _ = ycg.output_formats[args.format]
+    return ycg.OutputSink(os.devnull, None, backend.binary)
+
+
+def measure(args, func):
+    """
+    Run func args.repeat times and return the best time and the result of the
+    last run, with the peak memory of an extra run under tracemalloc.
+    """
+    best = None
+    for _ in range(args.repeat):
+        random.seed(args.seed)
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    result = dict(result or {}, seconds=best)
+    if args.memory:
+        random.seed(args.seed)
+        tracemalloc.start()
+        func()
+        result['peak_memory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+
+def run_config(args, plan_or_schema, gen_args, model_schema):
+    """Generate config to a null sink, counting elements and bytes."""
+    sink = null_sink(gen_args)
+    budget = ycg.Budget(sink)
+    output = ycg.prepare_output(gen_args, model_schema, sink)
+    doc = ycg.BudgetBackend(output, budget)
+    if isinstance(plan_or_schema, ycg.PlanNode):
+        plan_or_schema.run(doc)
+    else:
+        ycg.iter_schema(gen_args, model_schema, doc)
+    output.close_document()
+    sink.close()
+    return {'elements': budget.elements, 'bytes': budget.size()}
+
+
+def bench_model(args, name, results):
+    _, paths, descriptors = models[name]
+    model = compile_fixture(args, name)
+
+    def add(bench, result):
+        result = dict(result, fixture=name, name=bench)
+        if 'elements' in result and result['seconds']:
+            result['elements_per_second'] = result['elements'] / result['seconds']
+        results.append(result)
+        if args.verbose:
+            print(json.dumps(result), file=sys.stderr)
+
+    def run(bench, func):
+        try:
+            add(bench, measure(args, func))
+        except (Exception, SystemExit) as e:
+            add(bench, {'seconds': None, 'error': f'{type(e).__name__}: {e}'})
+
+    run('schema-load', lambda: ycg.read_schema(model).json and None)
+    schema = ycg.read_schema(model)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tree_args = generator_args(model, 'tree', '-l')
+        run('tree', lambda: ycg.print_schema(tree_args, schema))
+        complex_args = generator_args(model, 'complex', '--no-cache')
+        run('complex', lambda: ycg.collect_schema_complexity(complex_args).lists and None)
+    for path in paths:
+        gen_args = generator_args(model, *(['-p', path] if path else []), 'genconfig', '-f', args.format)
+        run(f'genconfig {path or "/"}', lambda: run_config(args, schema, gen_args, schema))
+    for descriptor in descriptors:
+        for scale in DESCRIPTOR_SCALES:
+            gen_args = generator_args(model, 'rundesc', os.path.join(ROOT, descriptor), '-f', args.format)
+
+            def rundesc():
+                plan = ycg.compile_descriptor(gen_args, schema, schema, ycg.load_descriptor(gen_args.descriptor))
+                for pl in ycg.scaled_lists(plan):
+                    pl.no_instances = lambda n=pl.no_instances: n() * scale
+                return run_config(args, plan, gen_args, schema)
+            run(f'rundesc {descriptor} x{scale}', rundesc)
+    ctx = ycg.collect_schema_complexity(generator_args(model, 'complex'))
+    patterns = sorted(((p, s[0]) for p, s in ctx.patterns.items() if p), key=lambda p: -p[1])
+    for pattern, _ in patterns[:XEGER_PATTERNS]:
+        def xeger():
+            n, end = 0, time.perf_counter() + XEGER_SECONDS
+            while time.perf_counter() < end:
+                rstr.xeger(pattern)
+                n += 1
+            return {'values': n, 'values_per_second': n / XEGER_SECONDS}
+        try:
+            add(f'xeger {pattern}', dict(xeger(), seconds=XEGER_SECONDS))
+        except Exception as e:
+            add(f'xeger {pattern}', {'seconds': None, 'error': f'{type(e).__name__}: {e}'})
+
+
+def compare(results, path):
+    """Print the time of every benchmark relative to the results in path."""
+    with open(path) as f:
+        old = {(r['fixture'], r['name']): r for r in json.load(f)['results']}
+    print(f"{'Benchmark':<80} {'Before':>10} {'After':>10} {'Change':>8}")
+    for r in results:
+        o = old.get((r['fixture'], r['name']))
+        if not o:
+            continue
+        key = 'values_per_second' if 'values_per_second' in r else 'seconds'
+        before, after = o.get(key), r.get(key)
+        if not before or not after:
+            continue
+        change = (before / after if key == 'values_per_second' else after / before) - 1
+        print(f"{r['fixture'] + ' ' + r['name']:<80} {before:>10.3f} {after:>10.3f} {change:>+8.1%}")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-I', action='append', default=[], help="Directories to search for YANG modules.")
+    parser.add_argument('-m', '--model', action='append', choices=list(models), help="Models to benchmark (default all).")
+    parser.add_argument('-f', '--format', choices=list(ycg.output_formats), default='default',
+                        help="Output format of genconfig and rundesc.")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Runs of each benchmark, the best is reported.")
+    parser.add_argument('-s', '--seed', type=int, default=1, help="Random seed of each run.")
+    parser.add_argument('--no-memory', dest='memory', action='store_false', help="Do not measure peak memory.")
+    parser.add_argument('-o', '--output', help="File to write the JSON results to (default stdout).")
+    parser.add_argument('--compare', help="Results of an earlier run to compare with.")
+    parser.add_argument('-v', '--verbose', action='store_true', help="Print every result when done.")
+    args = parser.parse_args()
+    if not args.I and os.environ.get('NCS_DIR'):
+        args.I = [os.path.join(os.environ['NCS_DIR'], 'src', 'ncs', 'yang')]
+
+    results = []
+    errors = {}
+    for name in args.model or list(models):
+        try:
+            bench_model(args, name, results)
+        except (Exception, SystemExit) as e:
+            errors[name] = f'{type(e).__name__}: {e}'
+            print(f"ERROR: {name}: {errors[name]}", file=sys.stderr)
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    report = {
+        'commit': commit,
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'format': args.format,
+        'max_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'errors': errors,
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,7 +26,6 @@ generator_descriptor = {
                 "name": gen_name,
                 "description": "ulrik",
                 "speed": random_speed,
-                "enabled": False,
                 "unit": {  # name
                     "__NO_INSTANCES": 0,
                     "status": {
@@ -92,14 +91,6 @@ generator_descriptor = {
             },
             "options": {
 
-            }
-        },
-        "oper": {  # name
-
-        },
-        "test": {
-            "l2": {
-
             }
         }
     }
@@ -6,10 +6,10 @@ configuration or state data to XML.
 
 Requires the latest version of pyang from github.
 
-Missing YANG information (not passed to json):
- - mandatory
- - when
- - leafref
+Generation metadata is passed as a trailing dict of each node, with only
+what differs from the defaults: min-elements, max-elements and unique of
+lists, mandatory and default of leafs and choices, and the resolved target
+path and datatype of leafrefs.
 
 Special trix to generate config:
  - Escaping all xml strings
@@ -33,11 +33,14 @@ Special trix to generate config:
 #  - Return the array of ranges for decimal64.
 
 import json
+import optparse
 
 from pyang import plugin, error, types, statements
 from pyang.util import unique_prefixes
 import pprint as pp
 
+from pmod_compact import compact_schema
+
 pprint = pp.PrettyPrinter(indent=4).pprint
 
 
@@ -97,6 +100,19 @@ class PModPlugin(plugin.PyangPlugin):
         self.multiple_modules = True
         fmts['pmod'] = self
 
+    def add_opts(self, optparser):
+        optlist = [
+            optparse.make_option("--pmod-depends",
+                                 dest="pmod_depends",
+                                 help="Write the files of all modules used to this file"),
+            optparse.make_option("--pmod-compact",
+                                 dest="pmod_compact",
+                                 action="store_true",
+                                 help="Emit the schema with string tables and positional nodes"),
+        ]
+        g = optparser.add_option_group("PMod output specific options")
+        g.add_options(optlist)
+
     def setup_fmt(self, ctx):
         ctx.implicit_errors = False
 
@@ -107,6 +123,7 @@ class PModPlugin(plugin.PyangPlugin):
             if error.is_error(error.err_level(etag)):
                 raise error.EmitError("PMod plugin needs a valid module")
         tree = {}
+        self.ctx = ctx
         self.mods = {}
         annots = {}
         self.typedefs = {}
@@ -137,13 +154,21 @@ class PModPlugin(plugin.PyangPlugin):
 
         for module in modules:
             self.process_children(module, tree, None)
-        json.dump({
+        schema = {
             "modules": self.mods,
             "tree": tree,
             "typedefs": self.typedefs,
             "identities": self.identities,
             "annotations": annots
-        }, fd)
+        }
+        if ctx.opts.pmod_compact:
+            fd.write(json.dumps(compact_schema(schema), separators=(',', ':')))
+        else:
+            fd.write(json.dumps(schema))  # json.dump to a file is several times slower
+        if ctx.opts.pmod_depends:
+            # The files of all (sub)modules, also the imported, for incremental compiles
+            with open(ctx.opts.pmod_depends, 'w') as f:
+                json.dump(sorted({m.pos.ref for m in ctx.modules.values()}), f)
         # pprint(tree)
 
     def process_children(self, node, parent, pmod):
@@ -173,7 +198,7 @@ class PModPlugin(plugin.PyangPlugin):
                 if st is not None and st.arg == 'false':
                     continue  # Skip operational data
                 st = ch.search_one("presence")
-                if st is not None and st.arg == 'true':
+                if st is not None:
                     ndata[0] = 'p-container'  # Mark as presence container
                 ndata.append({})
                 self.process_children(ch, ndata[2], nmod)
@@ -199,8 +224,87 @@ class PModPlugin(plugin.PyangPlugin):
                 ndata.append({})
                 self.process_children(ch, ndata[2], pmod)
             modname = ch.i_module.i_modulename
+            meta = self.node_meta(ch)
+            if meta:
+                ndata.append(meta)
             parent[nodename] = ndata
 
+    def node_meta(self, ch):
+        """Generation metadata of `ch`, only what differs from the YANG defaults."""
+        meta = {}
+        if ch.keyword in ["list", "leaf-list"]:
+            st = ch.search_one("min-elements")
+            if st is not None and int(st.arg) > 0:
+                meta["min-elements"] = int(st.arg)
+            st = ch.search_one("max-elements")
+            if st is not None and st.arg != "unbounded":
+                meta["max-elements"] = int(st.arg)
+        if ch.keyword == "list":
+            uniques = [u.arg.split() for u in ch.search("unique")]
+            if uniques:
+                meta["unique"] = uniques
+        if ch.keyword in ["leaf", "choice"]:
+            st = ch.search_one("mandatory")
+            if st is not None and st.arg == "true":
+                meta["mandatory"] = True
+        if ch.keyword == "leaf":
+            if getattr(ch, "i_default", None) is not None:
+                meta["default"] = ch.i_default_str  # Also the default of the typedef
+        elif ch.keyword == "leaf-list":
+            defaults = [d.arg for d in ch.search("default")]
+            if defaults:
+                meta["default"] = defaults
+        elif ch.keyword == "choice":
+            st = ch.search_one("default")
+            if st is not None:
+                meta["default"] = st.arg  # The default case
+        target = self.leafref_target(ch) if ch.keyword in ["leaf", "leaf-list"] else None
+        if target is not None:
+            meta["leafref-target"] = self.data_path(target)
+            seen = set()
+            while self.leafref_target(target) is not None and target not in seen:
+                seen.add(target)  # Follow chained leafrefs to the leaf with the values
+                target = self.leafref_target(target)
+            try:
+                dt = self.type_data(target.search_one("type"))
+            except TypeError:
+                dt = None  # E.g. bits
+            if dt is not None:
+                meta["leafref-type"] = dt
+        return meta
+
+    def leafref_target(self, ch):
+        """The leaf a leafref or tailf non-strict-leafref refers to, or None."""
+        if getattr(ch, "i_leafref_ptr", None):
+            return ch.i_leafref_ptr[0]
+        nst = ch.search_one(('tailf-common', 'non-strict-leafref'))
+        path = nst.search_one('path') if nst is not None else None
+        if path is None:
+            return None
+        # Resolved like pyang does for leafrefs, only missing targets are accepted
+        try:
+            path_spec = types.validate_path_expr(self.ctx.errors, path)
+            x = path_spec and statements.validate_leafref_path(self.ctx, ch, path_spec, path,
+                                                               accept_non_config_target=True)
+        except Exception:
+            return None
+        return x[0] if x else None
+
+    def data_path(self, node):
+        """The path of `node` in the tree, with the module where it changes as in the keys."""
+        nodes = []
+        while node.keyword not in ["module", "submodule"]:
+            if node.keyword not in ["choice", "case"]:
+                nodes.append(node)
+            node = node.parent
+        path = []
+        pmod = None
+        for n in reversed(nodes):
+            nmod = n.i_module.i_modulename
+            path.append(n.arg if nmod == pmod else f"{nmod}:{n.arg}")
+            pmod = nmod
+        return "/" + "/".join(path)
+
     def base_type(self, ch, of_type):
         """Return the base type of `of_type`."""
         while 1:
@@ -239,7 +343,7 @@ class PModPlugin(plugin.PyangPlugin):
         # print(8, t.i_is_validated)
         # print(9, t.substmts)
         if t.i_typedef:  # Handle references to typedefs
-            td = self.type_data(t.i_typedef.substmts[0])
+            td = self.type_data(t.i_typedef.search_one('type'))
             # print(f"X {t}", end='')
             # pprint(td)
             self.add_typedef(t, td)
@@ -0,0 +1,86 @@
+"""Compact encoding of the pmod schema
+
+Used by the pmod plugin (--pmod-compact) and by the compile command of the
+config generator, so it must not depend on pyang.
+
+ - Strings (node names, modules, when/must, patterns, enum values, paths)
+   are stored once in "strings" and referenced by index.
+ - Nodes are positional arrays:
+     [kind, name, module, when, must, members]
+     [kind, name, module, when, must, members, keys]   (list)
+     [kind, name, module, when, must, datatype]        (leaf, leaf-list)
+     [kind, name, module, when, must, [[case, members], ...]]   (choice)
+   where kind is an index in KINDS and module is -1 when it is the module of
+   the parent. Nodes with generation metadata have an index in "metas"
+   appended, the distinct metadata dicts.
+ - Each distinct datatype is stored once in "datatypes" and referenced by
+   index, also from unions and typedefs.
+ - The pattern records added by the compile command of the config generator
+   are stored as [pattern, record] with the pattern as a string index.
+"""
+
+import json
+
+VERSION = 2
+KINDS = ['container', 'p-container', 'list', 'choice', 'leaf', 'leaf-list']
+STRING_ARGUMENTS = ['leafref', 'ns-leafref', 'identityref', 'typedef']
+
+
+def pyang_plugin_init():
+    pass  # Not a plugin, but pyang imports every module in the plugin directory
+
+
+def compact_schema(schema):
+    """Return the pmod schema in the compact encoding."""
+    strings = {}
+    datatypes = {}
+    metas = {}
+
+    def s(value):
+        return strings.setdefault(value, len(strings))
+
+    def dt(datatype):
+        name, r = datatype
+        if name == 'union':
+            r = [dt(m) for m in r]
+        elif name == 'enumeration':
+            r = [s(e) for e in r]
+        elif name == 'string':
+            r = [r[0], [s(p) for p in r[1]]]
+        elif name in STRING_ARGUMENTS:
+            r = s(r)
+        return datatypes.setdefault(json.dumps([s(name), r]), len(datatypes))
+
+    def nodes(tree):
+        lst = []
+        for key, (kind, (when, must), data, *rest) in tree.items():
+            module, name = key.split(':') if ':' in key else (None, key)
+            node = [KINDS.index(kind), s(name), -1 if module is None else s(module), s(when), s(must)]
+            if kind == 'choice':
+                node.append([[s(case), nodes(members)] for case, members in data.items()])
+            elif kind in ('leaf', 'leaf-list'):
+                node.append(dt(data))
+            else:
+                node.append(nodes(data))
+            if kind == 'list':
+                node.append([[s(m), s(k)] for m, k in rest[0]])
+            if rest and isinstance(rest[-1], dict):
+                node.append(metas.setdefault(json.dumps(rest[-1], sort_keys=True), len(metas)))
+            lst.append(node)
+        return lst
+
+    tree = nodes(schema['tree'])
+    typedefs = {name: dt(datatype) for name, datatype in schema['typedefs'].items()}
+    patterns = [[s(p), record] for p, record in schema.get('patterns', {}).items()]
+    return {
+        'format': ['compact', VERSION],
+        'strings': list(strings),
+        'datatypes': [json.loads(d) for d in datatypes],
+        'metas': [json.loads(m) for m in metas],
+        'modules': schema['modules'],
+        'tree': tree,
+        'typedefs': typedefs,
+        'identities': schema['identities'],
+        'annotations': schema['annotations'],
+        'patterns': patterns,
+    }
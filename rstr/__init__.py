@@ -1,4 +1,4 @@
-from rstr.xeger import Xeger, XegerMinMax
+from rstr.xeger import Xeger, XegerCardinality, XegerMinMax
 from rstr.rstr_base import SameCharacterError as SameCharacterError
 
 Rstr = Xeger
@@ -6,7 +6,9 @@ _default_instance = Rstr()
 
 rstr = _default_instance.rstr
 xeger = _default_instance.xeger
+xeger_parsed = _default_instance.xeger_parsed
 xeger_minmax = XegerMinMax().xeger
+xeger_cardinality = XegerCardinality().xeger
 
 # This allows convenience methods from rstr to be accessed at the package
 # level, without requiring the user to instantiate an Rstr() object.
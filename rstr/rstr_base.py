@@ -83,9 +83,9 @@ ALPHABETS: Mapping[str, str] = {
     'normal': string.ascii_letters + string.digits + ' ',
     'word': string.ascii_letters + string.digits + '_',
     'nonword': ''.join(
-        set(string.printable).difference(string.ascii_letters + string.digits + '_')
+        sorted(set(string.printable).difference(string.ascii_letters + string.digits + '_'))
     ),
-    'unambiguous': ''.join(set(string.ascii_letters + string.digits).difference('0O1lI')),
+    'unambiguous': ''.join(sorted(set(string.ascii_letters + string.digits).difference('0O1lI'))),
     'postalsafe': string.ascii_letters + string.digits + ' .-#/',
     'urlsafe': string.ascii_letters + string.digits + '-._~',
     'domainsafe': string.ascii_letters + string.digits + '-',
@@ -14,3 +14,6 @@ class TestPackageLevelFunctions(unittest.TestCase):
 
     def test_convenience_function(self) -> None:
         assert re.match(r'^[a-zA-Z]+$', rstr.letters())
+
+    def test_xeger_cardinality(self) -> None:
+        assert rstr.xeger_cardinality(r'[0-9]{2}') == 100
@@ -1,7 +1,10 @@
+import math
+import random
 import re
+import sre_parse
 import unittest
 
-from rstr import Rstr
+from rstr import Rstr, XegerCardinality
 
 
 class TestXeger(unittest.TestCase):
@@ -96,3 +99,44 @@ class TestXeger(unittest.TestCase):
     def test_zero_or_more_non_greedy(self) -> None:
         pattern = r'a*?'
         assert re.match(pattern, self.rs.xeger(pattern))
+
+    def test_parsed(self) -> None:
+        pattern = r'(foo|bar)-[0-9]{1,3}\1'
+        parsed = sre_parse.parse(pattern)
+        for i in range(20):
+            random.seed(i)
+            expected = self.rs.xeger(pattern)
+            random.seed(i)
+            assert self.rs.xeger_parsed(parsed) == expected
+            assert re.match(pattern, expected)
+
+
+class TestXegerCardinality(unittest.TestCase):
+    def setUp(self) -> None:
+        self.xc = XegerCardinality()
+
+    def test_literals(self) -> None:
+        assert self.xc.xeger(r'foo') == 1
+
+    def test_character_group(self) -> None:
+        assert self.xc.xeger(r'[0-9]') == 10
+        assert self.xc.xeger(r'[A-Fa]') == 7
+
+    def test_negation_group(self) -> None:
+        assert self.xc.xeger(r'[^a]') == 99
+
+    def test_branch(self) -> None:
+        assert self.xc.xeger(r'(1|2)(3|4)') == 4
+
+    def test_counted_repeat(self) -> None:
+        assert self.xc.xeger(r'[ab]{2}') == 4
+        assert self.xc.xeger(r'\d{1,2}') == 110
+
+    def test_optional(self) -> None:
+        assert self.xc.xeger(r'ab?') == 2
+
+    def test_backreference(self) -> None:
+        assert self.xc.xeger(r'(foo|bar)baz\1') == 2
+
+    def test_unbounded(self) -> None:
+        assert self.xc.xeger(r'[0-9]+') == math.inf
@@ -1,12 +1,13 @@
 import functools
+import math
 import random
 import sre_parse
 import string
 from itertools import chain
 import typing
-from typing import Any, Callable, Dict, Mapping, Pattern, Sequence, Union
+from typing import Any, Callable, Dict, Mapping, Pattern, Sequence, Set, Union
 
-from rstr.rstr_base import RstrBase
+from rstr.rstr_base import ALPHABETS, RstrBase
 
 if typing.TYPE_CHECKING:
     from rstr.rstr_base import _Random
@@ -64,7 +65,11 @@ class Xeger(RstrBase):
         except AttributeError:
             pattern = typing.cast(str, string_or_regex)
 
-        parsed = sre_parse.parse(pattern)
+        return self.xeger_parsed(sre_parse.parse(pattern))
+
+    def xeger_parsed(self, parsed: Any) -> str:
+        '''Generate a string from a regular expression already parsed with
+        sre_parse.parse, to parse a pattern used many times only once.'''
         result = self._build_string(parsed)
         self._cache.clear()
         return result
@@ -91,7 +96,7 @@ class Xeger(RstrBase):
     def _handle_in(self, value: Any) -> Any:
         candidates = list(chain(*(self._handle_state(i) for i in value)))
         if candidates[0] is False:
-            candidates = list(set(string.printable).difference(candidates[1:]))
+            candidates = sorted(set(string.printable).difference(candidates[1:]))
         return self._random.choice(candidates)
 
     def _handle_repeat(self, start_range: int, end_range: int, value: str) -> str:
@@ -181,3 +186,100 @@ class XegerMinMax(object):
             bresult = [self._handle_state(i) for i in branch]
             result.append(functools.reduce(lambda a, b: (a[0] + b[0], a[1] + b[1]), bresult))
         return functools.reduce(lambda a, b: (min(a[0], b[0]), max(a[1], b[1])), result)
+
+# Cardinalities above this limit are reported as math.inf. It keeps the
+# arithmetic on small integers and is far above any realistic number of
+# generated list entries.
+CARDINALITY_LIMIT = 2 ** 64
+
+
+class XegerCardinality(object):
+    '''Estimate the number of distinct strings Xeger can generate from a
+    regular expression. Branches are assumed to be disjoint, so the result is
+    an upper bound. Repeats are limited by STAR_PLUS_LIMIT in the same way as
+    in Xeger. Unbounded results are returned as math.inf.'''
+
+    def __init__(
+            self
+    ) -> None:
+        super(XegerCardinality, self).__init__()
+        printable = ALPHABETS['printable']
+        self._categories: Mapping[str, str] = {
+            'category_digit': ALPHABETS['digits'],
+            'category_not_digit': ALPHABETS['nondigits'],
+            'category_space': ALPHABETS['whitespace'],
+            'category_not_space': ALPHABETS['nonwhitespace'],
+            'category_word': ALPHABETS['word'],
+            'category_not_word': ALPHABETS['nonword'],
+        }
+
+        self._cases: Mapping[str, Callable[..., Any]] = {
+            'literal': lambda x: 1,
+            'not_literal': lambda x: len(printable.replace(chr(x), '')),
+            'at': lambda x: 1,
+            'in': lambda x: len(self._handle_in(x)),
+            'any': lambda x: len(printable.replace('\n', '')),
+            'range': lambda x: x[1] - x[0] + 1,
+            'category': lambda x: len(set(self._categories[x])),
+            'branch': lambda x: self._saturate(sum(self._handle_sequence(i) for i in x[1])),
+            'subpattern': lambda x: self._handle_sequence(x[-1]),
+            'assert': lambda x: self._handle_sequence(x[1]),
+            'assert_not': lambda x: 1,
+            'groupref': lambda x: 1,  # Always a copy of the referenced group
+            'min_repeat': lambda x: self._handle_repeat(*x),
+            'max_repeat': lambda x: self._handle_repeat(*x),
+        }
+
+    def xeger(self, string_or_regex: Union[str, Pattern[str]]) -> Union[int, float]:
+        try:
+            pattern = typing.cast(Pattern[str], string_or_regex).pattern
+        except AttributeError:
+            pattern = typing.cast(str, string_or_regex)
+
+        parsed = sre_parse.parse(pattern)
+        return self._handle_sequence(parsed)
+
+    def _saturate(self, n: Union[int, float]) -> Union[int, float]:
+        return math.inf if n > CARDINALITY_LIMIT else n
+
+    def _handle_sequence(self, states: Any) -> Union[int, float]:
+        result: Union[int, float] = 1
+        for state in states:
+            result = self._saturate(result * self._handle_state(state))
+        return result
+
+    def _handle_state(self, state: Any) -> Any:
+        opcode, value = state
+        opcode = opcode.name.lower()
+        if opcode == 'category':
+            value = value.name.lower()
+        return self._cases[opcode](value)
+
+    def _handle_in(self, value: Any) -> Set[str]:
+        chars: Set[str] = set()
+        negate = False
+        for opcode, v in value:
+            opcode = opcode.name.lower()
+            if opcode == 'negate':
+                negate = True
+            elif opcode in ('literal', 'not_literal'):
+                chars.add(chr(v))
+            elif opcode == 'range':
+                chars.update(chr(i) for i in range(v[0], v[1] + 1))
+            elif opcode == 'category':
+                chars.update(self._categories[v.name.lower()])
+        if negate:
+            chars = set(ALPHABETS['printable']).difference(chars)
+        return chars
+
+    def _handle_repeat(self, start_range: int, end_range: int, value: Any) -> Union[int, float]:
+        end_range = min((end_range, STAR_PLUS_LIMIT))
+        unit = self._handle_sequence(value)
+        if unit == 0:
+            return 1 if start_range == 0 else 0
+        if unit == 1:
+            return end_range - start_range + 1
+        if unit == math.inf or end_range * math.log2(unit) > 64:
+            return math.inf
+        # Geometric series unit**start_range + ... + unit**end_range
+        return self._saturate((unit ** (end_range + 1) - unit ** start_range) // (unit - 1))
@@ -3,26 +3,32 @@
 import sre_parse
 from argparse import ArgumentParser, RawDescriptionHelpFormatter
 from itertools import chain
+import copy
+import decimal
+import gzip
+import hashlib
+import io
+import ipaddress
+import itertools
 import json
+import lzma
+import marshal
+import math
 import os
 import random
+import re
+import shutil
 import subprocess
 import sys
-from xml.dom import minidom
-import xml.etree.ElementTree as ET
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from xml.parsers import expat
 from xml.sax.saxutils import escape
 
 import rstr
 
 
-def prettify(elem):
-    """Return a pretty-printed XML string for the Element.
-    """
-    rough_string = ET.tostring(elem, 'utf-8')
-    reparsed = minidom.parseString(rough_string)
-    return reparsed.toprettyxml(indent="  ")
-
-
 ####################################################################
 #  Argument Parser
 ####################################################################
@@ -43,6 +49,9 @@ def create_parser():
                         action='store_true',
                         default=False,
                         help="Enable verbose mode")
+    p.add_argument("--seed",
+                        type=int,
+                        help="Seed of the random generator, to generate the same config again")
     return p, p.add_subparsers(dest="subcommand")
 
 
@@ -143,11 +152,26 @@ def find_kp(ch, kp):
     return ch
 
 
+def unique_leaf(ch, path):
+    """The leaf of a descendant path of a unique statement of the list ch, None if not found."""
+    for name in path.split('/'):
+        name = name.split(':')[-1]  # Matched by name, the prefix is ignored
+        if not isinstance(ch, HasChildren):
+            return None
+        ch = next((n for n in ch.data_children().values() if n.name == name), None)
+    return ch if isinstance(ch, Leaf) and not isinstance(ch, LeafList) else None
+
+
 def get_ns(m, schema):
     return schema['modules'][m][1]
 
 
 class Node:
+    # Generation metadata from the schema, set by the loader when it isn't the default
+    mandatory = False
+    default = None
+    condition = None  # Compiled when and must, set by compile_conditions
+
     def __init__(self, parent, name, module=None, wm=None):
         self.parent = parent
         self.name = name
@@ -179,6 +203,35 @@ class Node:
 class HasChildren:
     def __init__(self):
         self.children = {}
+        self._index = None
+
+    def child_index(self):
+        """Index of the children by name and module:name, built on first use."""
+        if getattr(self, '_index', None) is None:
+            self._index = {}
+            for ch in self.children.values():
+                self._index.setdefault(ch.name, ch)
+                if ch.module:
+                    self._index.setdefault(f'{ch.module}:{ch.name}', ch)
+        return self._index
+
+    def data_children(self):
+        """
+        Index of the data nodes by their key in the children, module:name when
+        the module differs from the parent, with the members of choices.
+        """
+        if getattr(self, '_data_children', None) is None:
+            self._data_children = index = {}
+
+            def add(children):
+                for k, ch in children.items():
+                    if isinstance(ch, Choice):
+                        for case in ch.choices.values():
+                            add(case)
+                    else:
+                        index.setdefault(k, ch)
+            add(self.children)
+        return self._data_children
 
     def __iter__(self):
         for k, v in self.children.items():
@@ -196,6 +249,8 @@ class HasChildren:
         return None
 
     def find_path(self, p, find_in_choice=True):
+        if not find_in_choice:
+            return self.child_index().get(p)
         m = None
         n = p
         if ':' in p:
@@ -246,6 +301,10 @@ class Choice(Node):
 
 
 class List(Node, HasChildren):
+    min_elements = 0
+    max_elements = math.inf
+    unique = ()
+
     def __init__(self, parent, name, key_leafs, module=None, wm=None):
         Node.__init__(self, parent, name, module, wm)
         HasChildren.__init__(self)
@@ -254,13 +313,20 @@ class List(Node, HasChildren):
 
 
 class Leaf(Node):
+    # Leafrefs: the path and datatype of the target from the schema, and the
+    # target node linked when loaded (None if it isn't in the schema)
+    leafref_path = None
+    leafref_type = None
+    leafref_target = None
+
     def __init__(self, parent, name, datatype, module=None, wm=None):
         super().__init__(parent, name, module, wm)
         self.datatype = datatype
 
 
 class LeafList(Leaf):
-    pass
+    min_elements = 0
+    max_elements = math.inf
 
 
 class Schema(HasChildren):
@@ -268,10 +334,28 @@ class Schema(HasChildren):
         super().__init__()
         self.json = schema
         if schema is not None:
-            load_schema(schema['tree'], self)
+            leafrefs = []
+            if schema.get('format', [None])[0] == 'compact':
+                load_compact_schema(schema, self, leafrefs)
+            else:
+                load_schema(schema['tree'], self, leafrefs=leafrefs)
+            link_leafrefs(self, leafrefs)
+        self.patterns = {p: PatternRecord(p, r) for p, r in (schema or {}).get('patterns', {}).items()}
+        if any(record.stale for record in self.patterns.values()):
+            print("WARNING: The pattern overrides (random_pattern) changed since the schema was compiled, "
+                  "compile it again.", file=sys.stderr)
+        self.conditions = None  # Number of nodes with when or must and the nodes they refer to, by compile_conditions
+        self.retained = set()
         self.name = ''
         self.module = ''
 
+    def pattern(self, pattern):
+        """The record of a pattern, prepared now if the schema has none e.g. not built by compile."""
+        record = self.patterns.get(pattern)
+        if record is None:
+            record = self.patterns[pattern] = PatternRecord(pattern, pattern_record(pattern))
+        return record
+
     def prefix2module(self, prefix):
         for m_name, (m_prefix, m_ns) in self.json['modules'].items():
             if prefix == m_prefix:
@@ -283,7 +367,37 @@ class Schema(HasChildren):
         return []
 
 
-def load_schema(schema, node, children=None, parent=None):
+# Schema node metadata and the node attributes they are loaded to
+node_meta_attributes = {
+    'min-elements': 'min_elements',
+    'max-elements': 'max_elements',
+    'unique': 'unique',
+    'mandatory': 'mandatory',
+    'default': 'default',
+    'leafref-target': 'leafref_path',
+    'leafref-type': 'leafref_type',
+}
+
+
+def load_meta(node, meta, leafrefs):
+    for k, v in meta.items():
+        if k in node_meta_attributes:
+            setattr(node, node_meta_attributes[k], v)
+    if 'leafref-target' in meta:
+        leafrefs.append(node)
+
+
+def link_leafrefs(schema, leafrefs):
+    """Link the leafrefs to their target nodes, each target path is looked up once."""
+    targets = {}
+    for node in leafrefs:
+        path = node.leafref_path
+        if path not in targets:
+            targets[path] = find_kp(schema, str2kp(path))
+        node.leafref_target = targets[path]
+
+
+def load_schema(schema, node, children=None, parent=None, leafrefs=None):
     children = children if children is not None else node.children
     parent = parent or node
     for k, v in schema.items():
@@ -292,12 +406,13 @@ def load_schema(schema, node, children=None, parent=None):
         if ':' in k:
             m, k = k.split(':')
         t, wm, dt, *r = v
+        meta = r.pop() if r and isinstance(r[-1], dict) else None
         if t in ['container', 'p-container']:
             nn = Container(parent, k, module=m, presence=t == 'p-container', wm=wm)
-            load_schema(dt, nn)
+            load_schema(dt, nn, leafrefs=leafrefs)
         elif t == 'list':
             nn = List(parent, k, r[0], m, wm=wm)
-            load_schema(dt, nn)
+            load_schema(dt, nn, leafrefs=leafrefs)
             for c, v2 in nn.children.items():
                 if c not in nn.key_leafs:
                     nn.nk_children[c] = v2
@@ -306,17 +421,82 @@ def load_schema(schema, node, children=None, parent=None):
             for case, v2 in dt.items():
                 c = {}
                 nn.choices[case] = c
-                load_schema(v2, nn, parent=parent, children=c)
+                load_schema(v2, nn, parent=parent, children=c, leafrefs=leafrefs)
         elif t == 'leaf':
             nn = Leaf(parent, k, dt, m, wm=wm)
         elif t == 'leaf-list':
             nn = LeafList(parent, k, dt, m, wm=wm)
         else:
             raise Exception(f'Unhandled type {t}')
+        if meta:
+            load_meta(nn, meta, leafrefs)
         if nn is not None:
             children[mk] = nn
 
 
+COMPACT_SCHEMA_VERSION = 2
+COMPACT_KINDS = ['container', 'p-container', 'list', 'choice', 'leaf', 'leaf-list']
+
+
+def load_compact_schema(schema, node, leafrefs):
+    """
+    Load a schema in the compact encoding of plugins/pmod_compact.py. Each
+    datatype is decoded once and shared by all leafs using it. The typedefs
+    and pattern records are decoded in place, so schema.json looks the same as
+    for the plain encoding, except for the tree.
+    """
+    if schema['format'][1] > COMPACT_SCHEMA_VERSION:
+        raise Exception(f"Unsupported compact schema version {schema['format'][1]}")
+    strings = schema['strings']
+    datatypes = []
+    for name, r in schema['datatypes']:
+        name = strings[name]
+        if name == 'union':
+            r = [datatypes[i] for i in r]
+        elif name == 'enumeration':
+            r = [strings[i] for i in r]
+        elif name == 'string':
+            r = [r[0], [strings[i] for i in r[1]]]
+        elif name in ('leafref', 'ns-leafref', 'identityref', 'typedef'):
+            r = strings[r]
+        datatypes.append([name, r])
+    schema['typedefs'] = {name: datatypes[i] for name, i in schema['typedefs'].items()}
+    schema['patterns'] = {strings[p]: r for p, r in schema.get('patterns', [])}
+    load_compact_nodes(schema['tree'], node, strings, datatypes, schema.get('metas', []), leafrefs)
+
+
+def load_compact_nodes(nodes, node, strings, datatypes, metas, leafrefs, children=None, parent=None):
+    children = children if children is not None else node.children
+    parent = parent or node
+    for kind, name, module, when, must, dt, *r in nodes:
+        k = strings[name]
+        m = strings[module] if module >= 0 else None
+        wm = (strings[when], strings[must])
+        t = COMPACT_KINDS[kind]
+        if t in ['container', 'p-container']:
+            nn = Container(parent, k, module=m, presence=t == 'p-container', wm=wm)
+            load_compact_nodes(dt, nn, strings, datatypes, metas, leafrefs)
+        elif t == 'list':
+            nn = List(parent, k, [(strings[km], strings[kn]) for km, kn in r[0]], m, wm=wm)
+            load_compact_nodes(dt, nn, strings, datatypes, metas, leafrefs)
+            for c, v2 in nn.children.items():
+                if c not in nn.key_leafs:
+                    nn.nk_children[c] = v2
+        elif t == 'choice':
+            nn = Choice(parent, k, wm=wm)
+            for case, members in dt:
+                c = {}
+                nn.choices[strings[case]] = c
+                load_compact_nodes(members, nn, strings, datatypes, metas, leafrefs, parent=parent, children=c)
+        elif t == 'leaf':
+            nn = Leaf(parent, k, datatypes[dt], m, wm=wm)
+        else:
+            nn = LeafList(parent, k, datatypes[dt], m, wm=wm)
+        if len(r) > (t == 'list'):
+            load_meta(nn, metas[r[-1]], leafrefs)
+        children[f'{m}:{k}' if m else k] = nn
+
+
 #############################################################################################################
 # Helper function for generating random config
 #############################################################################################################
@@ -506,12 +686,11 @@ def f_random_not_implemented(ctx, dt, r):
     raise NotImplementedError(f"Unhandled datatype: {dt}")
 
 
-def f_random_int(ctx ,dt, r):
-    if not r:
+def int_range(dt, r):
+    if r is None:
         mi, mx = ilimits[dt]
         step = 1
     else:
-        r = random.choice(r)
         mi, mx, *step = r
         step = step[0] if step else 1
         if mx is None:
@@ -524,18 +703,94 @@ def f_random_int(ctx ,dt, r):
         mx = ilimits[dt][0]
     elif mx == 'max':
         mx = ilimits[dt][1]
+    return mi, mx, step
+
+
+def f_random_int(ctx ,dt, r):
+    mi, mx, step = int_range(dt, random.choice(r) if r else None)
     return str(random.randrange(mi, mx + 1, step))
 
 
-def f_random_string(ctx ,dt, r):
-    lengths, patterns = r
+DEFAULT_STRING_PATTERN = "[a-zA-Z0-9 ._]+"
+
+
+def pattern_record(pattern):
+    """
+    Prepare a pattern for generation, done by compile for all patterns of the
+    schema. The record holds the regex generated from with
+    --use-unaltered-patterns, if Python re can compile the pattern, the
+    min/max length of the strings it matches (None if unknown) and the name of
+    the generator function overriding it.
+    """
+    regex = pattern
+    # Avoid generating strings with 'non-readable' or 'invalid' chars.
+    if '.*' in regex:
+        regex = regex.replace('.*', '[a-z0-9]{0,15}')
+    if '.+' in regex:
+        regex = regex.replace('.+', '[a-z0-9]{1,15}')
+    try:
+        re.compile(pattern)
+        re.compile(regex)
+        valid = True
+    except re.error:
+        valid = False
+    try:
+        length = list(rstr.xeger_minmax(pattern)) if valid else None
+    except Exception:
+        length = None  # Constructs XegerMinMax can't handle
+    g = random_pattern.get(pattern)
+    return {'regex': regex, 'valid': valid, 'length': length, 'override': g.__name__ if g else None}
+
+
+class PatternRecord:
+    """A pattern record of the schema, with the regexes parsed when first used."""
+    def __init__(self, pattern, record):
+        self.pattern = pattern
+        self.regex = record['regex']
+        self.valid = record['valid']
+        self.length = record['length']
+        # The current override, random_pattern may have changed since the compile
+        self.generator = random_pattern.get(pattern, False)
+        self.stale = record['override'] != (self.generator.__name__ if self.generator else None)
+        self._parsed = {}
+        self._match = None
+
+    def parsed(self, unaltered):
+        if unaltered not in self._parsed:
+            self._parsed[unaltered] = sre_parse.parse(self.regex if unaltered else self.pattern)
+        return self._parsed[unaltered]
+
+    def match(self):
+        """The fullmatch of the pattern, anchored as XSD patterns are. None if Python re can't compile it."""
+        if self._match is None:
+            try:
+                self._match = re.compile(self.pattern).fullmatch
+            except re.error:
+                self._match = False
+        return self._match or None
+
+
+def string_pattern(args, schema, patterns):
+    """
+    Return the record of the pattern used to generate a string and the
+    generator function overriding it (False if none).
+    """
     if patterns:
         pattern = patterns[0] # Only first pattern is used
     else:
-        if ctx.args.use_unaltered_patterns:
+        if args.use_unaltered_patterns:
             pattern = '.*'
         else:
-            pattern = "[a-zA-Z0-9 ._]+"
+            pattern = DEFAULT_STRING_PATTERN
+    record = schema.pattern(pattern)
+    g = record.generator if not args.use_unaltered_patterns else False
+    if not record.valid and not g:
+        record = schema.pattern(DEFAULT_STRING_PATTERN)  # Not supported by Python re
+    return record, g
+
+
+def f_random_string(ctx ,dt, r):
+    lengths, patterns = r
     if lengths:
         length = random.choice(lengths)  # Select a random length
         lmin, lmax = length
@@ -543,26 +798,15 @@ def f_random_string(ctx ,dt, r):
     else:
         lmin, lmax = 1, 255
     v = ""
-    x = 0
-    g = random_pattern.get(pattern) if not ctx.args.use_unaltered_patterns else False
-    if ctx.args.use_unaltered_patterns:
-        # Avoid generating strings with 'non-readable' or 'invalid' chars.
-        if '.*' in pattern:
-            pattern = pattern.replace('.*', '[a-z0-9]{0,15}')
-        if '.+' in pattern:
-            pattern = pattern.replace('.+', '[a-z0-9]{1,15}')
+    record, g = string_pattern(ctx.args, ctx.schema, patterns)
+    short = not g and record.length and record.length[1] < lmin  # Can't match strings this long
     while len(v) < lmin:  # Iterate until we get a string that is long enough
-        # ps = pattern.split('|')
-        # print(ps)
         if g:
             v = g(ctx.datatype)
         else:
-            v = rstr.xeger(pattern)
-        x += 1
-        if x == 100:
-            print(pattern)
-            print(lmin, lmax)
-    v = escape(v)
+            v = rstr.xeger_parsed(record.parsed(ctx.args.use_unaltered_patterns))
+        if short:
+            break
     v = v.replace(chr(11), "")
     v = v.replace(chr(12), "")
     if lmax and len(v) > lmax:
@@ -612,10 +856,7 @@ def f_random_identityref(ctx, dt, r, strict=True):
     raise Exception(f"Unknown identity: {r}")
 
 
-def f_random_leafref(ctx, dt, r, strict=True):
-    schema = ctx.schema
-    module = ctx.module
-    node = ctx.node
+def resolve_leafref(schema, module, node, r):
     path = r.split('/')
     if path[0] == '..':
         n = node
@@ -644,6 +885,41 @@ def f_random_leafref(ctx, dt, r, strict=True):
                 print(node.get_kp, module, file=sys.stderr)
                 print(n.get_kp, file=sys.stderr)
                 raise e
+    return n
+
+
+def leafref_target(schema, module, node, r):
+    """
+    The target node of the leafref r of node. The target linked when the
+    schema was loaded is used when there is one, otherwise the path is
+    resolved. None when the schema has the path, but the target isn't in it.
+    """
+    if getattr(node, 'leafref_path', None) is not None:
+        return node.leafref_target
+    return resolve_leafref(schema, module, node, r)
+
+
+def value_datatype(schema, node):
+    """
+    The datatype values of node are encoded as: the one of the target for
+    leafrefs, when the schema has it, as in RFC 7951 and RFC 9254.
+    """
+    if node is None:
+        return None
+    datatype = node.datatype
+    if node.leafref_path is not None and base_types(schema, datatype) <= {'leafref', 'ns-leafref'}:
+        if node.leafref_target is not None:
+            return value_datatype(schema, node.leafref_target)
+        return node.leafref_type or datatype
+    return datatype
+
+
+def f_random_leafref(ctx, dt, r, strict=True):
+    n = leafref_target(ctx.schema, ctx.module, ctx.node, r)
+    if n is None:
+        # Not in the schema, e.g. config false or in a module not compiled
+        return generate_random_value(ctx.args, ctx.schema, ctx.module, ctx.node, ctx.node.leafref_type) \
+            if ctx.node.leafref_type else None
     kp = n.get_kp
     if isinstance(n.parent, List) and n.name in n.parent.key_leafs:
         g = random_keypath.get(kp[:-1]) if not ctx.args.use_unaltered_patterns else False
@@ -678,306 +954,3137 @@ def generate_random_value(args, schema, module, node, datatype):
         f_random_not_implemented(RandomContext(args, schema, module, node, datatype), dt, r)
 
 
+#############################################################################################################
+# Cardinality estimation
+#############################################################################################################
+# Estimates how many distinct values the generator functions above can produce
+# for a datatype. It is used to detect lists whose key space is too small for
+# the requested number of instances. Values produced by custom generator
+# functions can't be estimated and are reported as unlimited (math.inf).
+
+def datatype_cardinality(args, schema, module, node, datatype):
+    dt, r = datatype
+    if not args.use_unaltered_patterns and dt in random_datatype:
+        return math.inf
+    if dt in ilimits:
+        n = 0
+        for rng in (r or [None]):
+            mi, mx, step = int_range(dt, rng)
+            n += (mx - mi) // step + 1
+        return n
+    elif dt == 'string':
+        _lengths, patterns = r
+        record, g = string_pattern(args, schema, patterns)
+        if g:
+            return math.inf
+        return rstr.xeger_cardinality(record.regex if args.use_unaltered_patterns else record.pattern)
+    elif dt == 'boolean':
+        return 2
+    elif dt == 'empty':
+        return 1
+    elif dt == 'enumeration':
+        return len(r)
+    elif dt == 'decimal64':
+        fd, rng = r
+        if not rng:
+            return math.inf
+        return int((rng[1] - rng[0]) * 10 ** fd) + 1
+    elif dt == 'identityref':
+        identities = schema.json['identities']
+        if r not in identities and ':' in r:
+            r = r.split(':')[1]
+        return max(1, len(identities.get(r, [])))
+    elif dt in ['leafref', 'ns-leafref']:
+        n = leafref_target(schema, module, node, r)
+        if n is None:
+            return datatype_cardinality(args, schema, module, node, node.leafref_type) if node.leafref_type else 1
+        if isinstance(n.parent, List) and n.name in n.parent.key_leafs:
+            return datatype_cardinality(args, schema, module, n, n.datatype)
+        return 1  # Leafrefs to non key leafs are not generated
+    elif dt == 'typedef':
+        if not args.use_unaltered_patterns and r in random_datatype:
+            return math.inf
+        return datatype_cardinality(args, schema, module, node, schema.json['typedefs'][r])
+    elif dt == 'union':
+        return sum(datatype_cardinality(args, schema, module, node, m) for m in r)
+    return math.inf
+
+
+def list_keyspace(args, schema, node, desc=None):
+    """
+    Return the number of distinct key combinations that can be generated for
+    the list node. Key leafs with constant values in the descriptor desc count
+    as a single value.
+    """
+    module = node.module
+    parent = node.parent
+    while module is None and isinstance(parent, Node):
+        module, parent = parent.module, parent.parent
+    n = 1
+    for ln in node.key_leafs:
+        kl = node.children[ln]
+        if desc is not None and ln in desc:
+            v = desc[ln]
+            if isinstance(v, SequenceSource) and v.size:
+                n *= v.size
+            elif callable(v) or hasattr(v, '__next__') or isinstance(v, tuple):
+                return math.inf
+        else:
+            n *= datatype_cardinality(args, schema, module, kl, kl.datatype)
+    return n
+
+
+def format_cardinality(n):
+    if n == math.inf:
+        return 'inf'
+    if n >= 10 ** 6:
+        return f'{n:.3g}'
+    return str(n)
+
+
 #############################################################################################################
 #  Output backends
 #############################################################################################################
 class OutputBackend:
+    """
+    Interface used when iterating the schema or a descriptor to output config.
+    The schema node is passed when known, for backends that need the datatype
+    to encode values.
+    """
+    binary = False  # True for backends writing bytes
+
     def __init__(self, schema):
         self.schema = schema
 
-    def add_container(self, name, module):
+    @classmethod
+    def open_document(cls, args, schema, output_file, envelope):
+        """Write the envelope of the chosen output format and return the root backend."""
+        return cls(schema)
+
+    def close_document(self):
+        pass
+
+    def add_container(self, name, module, node=None):
         return "container node"
-    def add_list_entry(self, name, module, keys, values):
+
+    def add_list_entry(self, name, module, keys, values, node=None):
         return "list entry"
 
-    def add_leaf(self, name, module, value):
+    def add_leaf(self, name, module, value, node=None):
         pass
 
-class XMLBackend(OutputBackend):
-    def __init__(self, schema, doc):
-        super().__init__(schema)
-        self.doc = doc
 
-    def add_container(self, name, module):
-        e = ET.SubElement(self.doc, name)
-        if module:
-            ns = get_ns(module, self.schema.json)
-            e.set('xmlns', ns)
-        return XMLBackend(self.schema, e)
+class StreamFrame:
+    def __init__(self, node, level, name=None, opener=None):
+        self.node = node  # Schema node of the object, None for the document root and envelope
+        self.level = level  # Nesting level of the object
+        self.name = name
+        self.opener = opener  # Arguments to add_container/add_list_entry to reopen the object in a new chunk
+        self.members = 0
+        self.array = None  # Key of the list or leaf-list array currently open
 
-    def add_list_entry(self, name, module, key_leafs, values):
-        e = ET.SubElement(self.doc, name)
-        if module:
-            ns = get_ns(module, self.schema.json)
-            e.set('xmlns', ns)
-        doc = XMLBackend(self.schema, e)
-        for key, value in zip(key_leafs, values):
-            doc.add_leaf(key, module, value)
+
+class OutputStream:
+    """State shared by all backends writing to the same document."""
+    def __init__(self, args, envelope, output_file):
+        self.args = args
+        self.envelope = envelope
+        self.output_file = output_file
+        self.write = output_file.write
+        self.frames = []
+        self.root_depth = 0  # Depth of the config root below the envelope
+        self.encoders = {}  # Value encoders cached per schema node
+
+
+class StreamBackend(OutputBackend):
+    """
+    Base for backends writing config directly to the output file. Members are
+    written as they are added. Open objects and arrays are closed when a
+    member is added to an enclosing object or when the document is closed, so
+    no intermediate tree is built. Subclasses write the tokens of the encoding.
+    """
+    array_level = 0  # Extra nesting level of the elements of arrays
+    frame_class = StreamFrame
+
+    def __init__(self, schema, stream, depth):
+        super().__init__(schema)
+        self.stream = stream
+        self.depth = depth  # Position of the object of this backend in stream.frames
+
+    @classmethod
+    def open_document(cls, args, schema, output_file, envelope):
+        return cls(schema, OutputStream(args, envelope, output_file), 0).begin_document()
+
+    def begin_document(self):
+        """
+        Write the document header and the envelope, and return the backend for
+        the config root. Called on the backend for the document root.
+        """
+        raise NotImplementedError
+
+    def open_root(self, name=None):
+        self.stream.frames.append(self.frame_class(None, 0, name))
+        return self
+
+    def close_document(self):
+        while self.stream.frames:
+            self.close_object()
+
+    def close_object(self):
+        frame = self.stream.frames.pop()
+        if frame.array is not None:
+            self.write_end_array(frame)
+        self.write_end_object(frame)
+
+    def next_chunk(self):
+        """
+        Close the document in the current chunk and reopen it, including the
+        envelope and the objects enclosing this backend, in the next chunk.
+        """
+        stream = self.stream
+        openers = [f.opener for f in stream.frames[stream.root_depth + 1:self.depth + 1]]
+        root = self.__class__(self.schema, stream, 0)
+        root.close_document()
+        stream.output_file.next_chunk()
+        doc = root.begin_document()
+        for kind, *opener in openers:
+            doc = doc.add_container(*opener) if kind == 'container' else doc.add_list_entry(*opener)
+
+    def member(self, name, module, node, array=False):
+        """
+        Close objects opened after this backend and write the member key. For
+        array members (list entries and leaf-list values) consecutive members
+        with the same key are written as elements of the same array.
+        """
+        frames = self.stream.frames
+        while len(frames) > self.depth + 1:
+            self.close_object()
+        frame = frames[-1]
+        key = self.member_key(frame, name, module, node)
+        if frame.array is not None:
+            if array and frame.array == key:
+                self.write_element(frame)
+                return
+            self.write_end_array(frame)
+            frame.array = None
+        self.write_member(frame, key, array)
+        frame.members += 1
+        if array:
+            frame.array = key
+
+    def open_object(self, name, node, opener):
+        frames = self.stream.frames
+        parent = frames[-1]
+        self.write_begin_object()
+        level = parent.level + 1 + (self.array_level if parent.array is not None else 0)
+        frames.append(self.frame_class(node, level, name, opener))
+        return self.__class__(self.schema, self.stream, len(frames) - 1)
+
+    def add_container(self, name, module, node=None):
+        self.member(name, module, node)
+        return self.open_object(name, node, ('container', name, module, node))
+
+    def add_list_entry(self, name, module, key_leafs, values, node=None):
+        output_file = self.stream.output_file
+        if output_file.chunked and output_file.chunk_full():
+            self.next_chunk()
+        output_file.entries += 1
+        self.member(name, module, node, array=True)
+        doc = self.open_object(name, node, ('list', name, module, key_leafs, values, node))
+        doc.add_keys(key_leafs, values, node)
         return doc
 
-    def add_leaf(self, name, module, value):
-        e = ET.SubElement(self.doc, name)
-        e.text = value
-        if module:
-            ns = get_ns(module, self.schema.json)
-            e.set('xmlns', ns)
+    def add_keys(self, key_leafs, values, node):
+        for key, value in zip(key_leafs, values):
+            self.add_leaf(key, None, value, node.children[key] if node is not None else None)
 
+    def add_leaf(self, name, module, value, node=None):
+        self.member(name, module, node, array=isinstance(node, LeafList))
+        self.stream.write(self.encode(node, value))
 
-#############################################################################################################
-#  Create config by iterating schema model
-#############################################################################################################
-"""
-../pyang/bin/pyang -p /src/ncs/yang \
-	      --ignore-errors --plugindir `pwd`/plugins -f pmod oc/openconfig-interfaces.yang -o oc/openconfig-interfaces.json-raw
-cat oc/openconfig-interfaces.json-raw | python3 -m json.tool - > oc/openconfig-interfaces.json
-rm oc/openconfig-interfaces.json-raw
-"""
-@subcommand([
-    argument('--bin',
-        type=str,
-        default='pyang',
-        help="pyang binary to use for compilation."
-    ),
-    argument("modules",
-         type=str, nargs="+",
-         help="YANG modules to compile."
-    ),
-    argument("-I",
-         type=str, action='append', default=[],
-         help="Directories to search for YANG modules."
-    ),
-    argument("-o",
-         type=str, default='model.json',
-         help="JSON output file."
-    ),
-    argument("--no-version-check",
-         action='store_true', default=False,
-         help="No pyang version check."
-    ),
-    argument("--ignore-errors",
-         action='store_true', default=False,
-         help="Ignore pyang errors."
-    )],
-    help="show model tree"
-)
-def cmd_compile(args, schema):
-    cmd = [args.bin,
-           '--plugindir', f'{os.getcwd()}/plugins',
-           '-f', 'pmod',
-           '-o', args.o,
-          ]
-    for i in args.I:
-        cmd += ['-p', i]
-    cmd += args.modules
-    try:
-        result = subprocess.run((args.bin, '--version'), capture_output=True)
-        vstr = result.stdout.decode().strip()
-        _, version = vstr.split(' ')
-        vparts = version.split('.')
-        if vparts[0]<'2' or (vparts[0]=='2' and vparts[1]<'5'):
-            print(f"ERROR: pyang version {version} is older than 2.5.")
-            sys.exit(1)
-    except PermissionError:
-        print("ERROR: pyang not found or is not executable.")
-        sys.exit(1)
-    subprocess.run(cmd)
+    def encode(self, node, value):
+        encoder = self.stream.encoders.get(node)
+        if encoder is None:
+            encoder = self.value_encoder(value_datatype(self.schema, node))
+            self.stream.encoders[node] = encoder
+        return encoder(value)
 
+    def member_key(self, frame, name, module, node):
+        raise NotImplementedError
 
-#############################################################################################################
-#  Create config by iterating schema model
-#############################################################################################################
-@subcommand([
-    argument('-f', '--format',
-        choices=['default', 'tailf-config', 'nso-device'],
-        default='default',
-        help="config output format"
-    ),
-    argument('-n', '--name',
-        type=str,
-        default='ce0',
-        help="Device name for output format nso-device"
-    ),
-    argument("-o", "--output",
-         type=str,
-         help="File to write generated config to."
-     ),
-    argument("-1", "--one-level",
-         action="store_true",
-         help="Show one level"
-    ),
-    argument("--use-unaltered-patterns",
-         action="store_true",
-         help="Do not alter patterns to generator more natual strings."
-    )],
-    help="show model tree"
-)
-def cmd_genconfig(args, schema):
+    def value_encoder(self, datatype):
+        raise NotImplementedError
+
+    def write_member(self, frame, key, array):
+        raise NotImplementedError
+
+    def write_element(self, frame):
+        raise NotImplementedError
+
+    def write_end_array(self, frame):
+        raise NotImplementedError
+
+    def write_begin_object(self):
+        raise NotImplementedError
+
+    def write_end_object(self, frame):
+        raise NotImplementedError
+
+
+# Namespaces of the modules used in output envelopes
+envelope_namespaces = {
+    'tailf-ncs': 'http://tail-f.com/ns/ncs',
+}
+
+
+class XMLBackend(StreamBackend):
     """
-    Show the JSON schema tree.
+    Writes indented XML. The start tag of an element is completed when its
+    first child is added or when it is closed, to write empty elements as <name/>.
     """
-    doc, xmlroot = prepare_output(args)
-    outputroot = XMLBackend(schema, xmlroot)
-    iter_schema(args, schema, outputroot)
+    def begin_document(self):
+        envelope = self.stream.envelope
+        if envelope == 'default':
+            self.stream.write('<?xml version="1.0" ?>\n<root')
+            doc = self.open_root('root')
+        else:
+            self.stream.write('<?xml version="1.0" ?>\n<config xmlns="http://tail-f.com/ns/config/1.0"')
+            doc = self.open_root('config')
+        if envelope == 'nso-device':
+            doc = doc.add_container('devices', 'tailf-ncs')
+            doc = doc.add_list_entry('device', None, ['name'], [self.stream.args.name])
+            doc = doc.add_container('config', None)
+        self.stream.root_depth = doc.depth
+        return doc
 
-    output_file = open(args.output, 'w') if args.output else sys.stdout
-    output_file.write(prettify(doc))
-    exit(0)
+    def close_document(self):
+        super().close_document()
+        self.stream.write('\n')
 
+    def member_key(self, frame, name, module, node):
+        if module:
+            ns = envelope_namespaces.get(module) or get_ns(module, self.schema.json)
+            return f'{name} xmlns="{ns}"'
+        return name
 
-class IterContext:
-    def __init__(self):
-        self.path = tuple()
-        self.module = None
+    def write_member(self, frame, key, array):
+        start = '>' if not frame.members else ''
+        self.stream.write(f'{start}\n{"  " * (frame.level + 1)}<{key}')
 
+    def write_element(self, frame):
+        self.stream.write(f'\n{"  " * (frame.level + 1)}<{frame.array}')
 
-def create_list_entry(args, schema, doc, ch, tp, ctx, processed=None):
-    if processed is None: processed = []
-    if ch.module:
-        ctx.module = ch.module
-    g = random_keypath.get(tp)
-    values = []
-    if g:
-        if not hasattr(g, '__iter__'):
-            g = [g]
-        for ln, klg in zip(ch.key_leafs, g):
-            kl = ch.children[ln]
-            values.append(klg(kl.datatype))
-    else:
-        for ln in ch.key_leafs:
-            kl = ch.children[ln]
-            values.append(generate_random_value(args, schema, ctx.module, kl, kl.datatype))
-            processed.append(kl.name)
-    return doc.add_list_entry(ch.name, ch.module, ch.key_leafs, values)
+    def write_end_array(self, frame):
+        pass
 
+    def write_begin_object(self):
+        pass
 
+    def write_end_object(self, frame):
+        if frame.members:
+            self.stream.write(f'\n{"  " * frame.level}</{frame.name}>')
+        else:
+            self.stream.write('/>')
 
-def add_levels(args, schema, doc, kp, ctx):
-    ch = schema
-    tp = tuple()
-    for p in kp:
-        tp += (p,)
-        ch = ch.find(p)
-        if isinstance(ch, Container):
-            e = doc.add_container(ch.name, ch.module)
-            if ch.module:
-                ctx.module = ch.module
-            doc = e
-        elif isinstance(ch, List):
-            # Create a random number of list elements between 0 and 5
-            n = 1  # random.randint(0, 2)
-            if n > 0:
-                for _ in range(0, n):
-                    e = create_list_entry(args, schema, doc, ch, tp, ctx)
-            doc = e
+    def add_leaf(self, name, module, value, node=None):
+        self.member(name, module, node)
+        if value is None or value == '':
+            self.stream.write('/>')
         else:
-            print("ERROR: Type not supported with --path")
-            sys.exit(1)
-    return e
+            self.stream.write(f'>{escape(str(value), xml_entities)}</{name}>')
 
 
-def iter_schema(args, schema, doc, ctx=None, ch=None, processed = None):
-    processed = processed or []
-    if ctx is None:
-        ctx = IterContext()
-        if args.path:
-            kp = str2kp(args.path)
-            ch = find_kp(schema, kp)
-            if ch is None:
-                print(f"Path {args.path} not found")
-                sys.exit(1)
-            doc = add_levels(args, schema, doc, kp, ctx)
+xml_entities = {'"': '&quot;'}
 
-    ch = ch or schema
-    for k, t in ch:
+
+class JSONBackend(StreamBackend):
+    """Writes RFC 7951 JSON encoded config."""
+    array_level = 1
+
+    def begin_document(self):
+        self.stream.write('{')
+        doc = self.open_root()
+        envelope = self.stream.envelope
+        if envelope == 'restconf':
+            doc = doc.add_container('data', 'ietf-restconf')
+        elif envelope == 'nso-device':
+            doc = doc.add_container('devices', 'tailf-ncs')
+            doc = doc.add_list_entry('device', None, ['name'], [self.stream.args.name])
+            doc = doc.add_container('config', None)
+        self.stream.root_depth = doc.depth
+        return doc
+
+    def close_document(self):
+        super().close_document()
+        self.stream.write('\n')
+
+    def member_key(self, frame, name, module, node):
+        return f'{module}:{name}' if module else name
+
+    def value_encoder(self, datatype):
+        return json_encoder(self.schema, datatype)
+
+    def write_member(self, frame, key, array):
+        sep = ',' if frame.members else ''
+        indent = '  ' * (frame.level + 1)
+        if array:
+            self.stream.write(f'{sep}\n{indent}"{key}": [\n{indent}  ')
+        else:
+            self.stream.write(f'{sep}\n{indent}"{key}": ')
+
+    def write_element(self, frame):
+        self.stream.write(f',\n{"  " * (frame.level + 2)}')
+
+    def write_end_array(self, frame):
+        self.stream.write(f'\n{"  " * (frame.level + 1)}]')
+
+    def write_begin_object(self):
+        self.stream.write('{')
+
+    def write_end_object(self, frame):
+        if frame.members:
+            self.stream.write(f'\n{"  " * frame.level}}}')
+        else:
+            self.stream.write('}')
+
+
+def json_string(value):
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def json_number(value):
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return json_string(value)
+
+
+def json_boolean(value):
+    if isinstance(value, str):
+        return 'true' if value == 'true' else 'false'
+    return 'true' if value else 'false'
+
+
+def json_union(encoders):
+    def encode(value):
+        s = str(value)
+        if json_number in encoders and s.lstrip('-').isdigit():
+            return s
+        if json_boolean in encoders and s in ['true', 'false']:
+            return s
+        return json_string(value)
+    return encode
+
+
+def json_encoder(schema, datatype):
+    """Return a function encoding values of the datatype according to RFC 7951."""
+    if datatype is None:
+        return lambda value: 'null' if value is None else json_string(value)
+    dt, r = datatype
+    if dt in ['int8', 'int16', 'int32', 'uint8', 'uint16', 'uint32']:
+        return json_number
+    elif dt == 'boolean':
+        return json_boolean
+    elif dt == 'empty':
+        return lambda value: '[null]'
+    elif dt == 'typedef':
+        return json_encoder(schema, schema.json['typedefs'][r])
+    elif dt == 'union':
+        return json_union([json_encoder(schema, m) for m in r])
+    # int64, uint64, decimal64 and all string like types are encoded as strings
+    return lambda value: 'null' if value is None else json_string(value)
+
+
+#### NSO CLI
+
+class CLIFrame(StreamFrame):
+    def __init__(self, node, level, name=None, opener=None):
+        super().__init__(node, level, name, opener)
+        self.started = opener is None  # Header line written, the root is always started
+        self.indent = 0  # Indentation of the lines of the members
+        self.prefix = ''  # Written before the members, the enclosing C-style containers
+
+
+class CLIBackend(StreamBackend):
+    """
+    Writes NSO CLI config for load merge. The header line of an object is
+    written when its first member is, so empty non-presence containers are
+    left out without buffering. Objects with a submode get their own indented
+    block, the members of other objects are written with the object names as
+    prefix. List keys are written in the header.
+    """
+    frame_class = CLIFrame
+    indent_unit = ''
+    line_end = ''  # Written after leafs and empty objects
+
+    def begin_document(self):
+        doc = self.open_root()
+        if self.stream.envelope == 'nso-device':
+            doc = doc.add_container('devices', None)
+            doc = doc.add_list_entry('device', None, ['name'], [self.stream.args.name])
+            doc = doc.add_container('config', None)
+        self.stream.root_depth = doc.depth
+        return doc
+
+    def submode(self, frame):
+        raise NotImplementedError
+
+    def member(self, name, module, node, array=False):
+        # Only leaf-lists are arrays, list entries are written as separate objects
+        super().member(name, module, node, array and isinstance(node, LeafList))
+
+    def member_key(self, frame, name, module, node):
+        if module:
+            return f'{self.schema.json["modules"][module][0]}:{name}'
+        return name
+
+    def value_encoder(self, datatype):
+        return cli_encoder(self.schema, datatype)
+
+    def open_object(self, name, node, opener):
+        parent = self.stream.frames[-1]
+        header = self.member_key(parent, name, opener[2], node)
+        if opener[0] == 'list':
+            header = ' '.join([header] + [cli_string(v) for v in opener[4]])
+        doc = super().open_object(header, node, opener)
+        frame = self.stream.frames[-1]
+        if self.submode(frame):
+            frame.indent = parent.indent + 1
+        else:
+            frame.indent = parent.indent
+            frame.prefix = f'{parent.prefix}{header} '
+        return doc
+
+    def add_keys(self, key_leafs, values, node):
+        pass
+
+    def add_leaf(self, name, module, value, node=None):
+        self.member(name, module, node, array=True)
+        frame = self.stream.frames[-1]
+        value = self.encode(node, value)
+        if frame.array is not None:
+            self.stream.write(f' {value}')
+        else:
+            key = self.member_key(frame, name, module, node)
+            self.start(frame)
+            self.write_line(frame, key if value is None else f'{key} {value}', self.line_end)
+
+    def start(self, frame):
+        """Write the header lines of the frame and of its enclosing frames not written yet."""
+        frames = self.stream.frames
+        i = frames.index(frame)
+        while not frames[i].started:
+            i -= 1
+        for i in range(i + 1, frames.index(frame) + 1):
+            f = frames[i]
+            if self.submode(f):
+                self.write_header(frames[i - 1], f)
+            f.started = True
+
+    def write_line(self, frame, line, end=''):
+        self.stream.write(f'{self.indent_unit * frame.indent}{frame.prefix}{line}{end}\n')
+
+    def write_member(self, frame, key, array):
+        if array:
+            self.start(frame)
+            self.stream.write(f'{self.indent_unit * frame.indent}{frame.prefix}{key} [')
+
+    def write_element(self, frame):
+        pass
+
+    def write_begin_object(self):
+        pass
+
+    def write_end_object(self, frame):
+        if frame.opener is None:
+            return
+        parent = self.stream.frames[-1]
+        if frame.started:
+            if self.submode(frame):
+                self.write_footer(parent, frame)
+        elif frame.opener[0] == 'list' or (frame.node is not None and frame.node.presence):
+            self.start(parent)
+            self.write_line(parent, frame.name, self.line_end)
+
+
+class JStyleBackend(CLIBackend):
+    """J-style CLI: every container and list entry is a {} block."""
+    indent_unit = '    '
+    line_end = ';'
+
+    def submode(self, frame):
+        return True
+
+    def write_header(self, parent, frame):
+        self.write_line(parent, frame.name, ' {')
+
+    def write_footer(self, parent, frame):
+        self.write_line(parent, '}')
+
+    def write_end_array(self, frame):
+        self.stream.write(' ];\n')
+
+
+class CStyleBackend(CLIBackend):
+    """C-style CLI: list entries are submodes ended by !, containers prefix their members."""
+    indent_unit = ' '
+    line_end = ''
+
+    def submode(self, frame):
+        return frame.opener[0] == 'list'
+
+    def write_header(self, parent, frame):
+        self.write_line(parent, frame.name)
+
+    def write_footer(self, parent, frame):
+        self.stream.write(f'{self.indent_unit * parent.indent}!\n')
+
+    def write_end_array(self, frame):
+        self.stream.write(' ]\n')
+
+
+# Characters that require a CLI string to be quoted
+cli_special = re.compile(r'[\s"\\;{}\[\]!#\'()|<>&]')
+cli_escapes = {'\\': '\\\\', '"': '\\"', '\n': '\\n', '\t': '\\t', '\r': '\\r'}
+
+
+def cli_string(value):
+    s = str(value)
+    if s and not cli_special.search(s):
+        return s
+    return '"' + ''.join(cli_escapes.get(c, c) for c in s) + '"'
+
+
+def cli_encoder(schema, datatype):
+    """Return a function encoding values of the datatype as a CLI word, None for empty leafs."""
+    if datatype is None:
+        return lambda value: None if value is None else cli_string(value)
+    types = base_types(schema, datatype)
+    if types == {'empty'}:
+        return lambda value: None
+    elif types == {'boolean'}:
+        return json_boolean
+    return cli_string
+
+
+#### CBOR
+
+# SIDs below this value are reserved (RFC 9254 uses SIDs allocated in .sid files).
+SID_BASE = 1000
+
+CBOR_BREAK = b'\xff'
+CBOR_NULL = b'\xf6'
+CBOR_TAG_DECIMAL = 4  # Decimal fraction [exponent, mantissa]
+CBOR_TAG_ENUM = 44  # Enumeration as string (RFC 9254)
+CBOR_TAG_IDENTITY = 45  # Identityref as SID (RFC 9254)
+CBOR_SELF_DESCRIBE = b'\xd9\xd9\xf7'  # Tag 55799 starting every document
+
+
+class SIDTable:
+    """
+    Schema item identifiers derived from the schema. SIDs are assigned from
+    SID_BASE to the modules (sorted), the identities (sorted) and the data
+    nodes (schema order, choices and cases are not data nodes). The same
+    schema file always gives the same SIDs.
+    """
+    def __init__(self, schema):
+        self.sids = {}  # module name, identity name or data node -> SID
+        self.items = {}  # SID -> module name, identity name or data node
+        for m in sorted(schema.json['modules']):
+            self.add(m)
+        for i in sorted(schema.json['identities']):
+            self.add(i)
+        self.add_nodes(schema)
+
+    def add(self, item):
+        sid = SID_BASE + len(self.items)
+        self.sids[item] = sid
+        self.items[sid] = item
+
+    def add_nodes(self, node):
+        for _, ch in node:
+            if isinstance(ch, Choice):
+                for _, case in ch:
+                    self.add_nodes(case.items())
+            else:
+                self.add(ch)
+                if isinstance(ch, HasChildren):
+                    self.add_nodes(ch)
+
+
+def cbor_head(major, n):
+    if n < 24:
+        return bytes([major << 5 | n])
+    elif n < 0x100:
+        return bytes([major << 5 | 24, n])
+    elif n < 0x10000:
+        return bytes([major << 5 | 25]) + n.to_bytes(2, 'big')
+    elif n < 0x100000000:
+        return bytes([major << 5 | 26]) + n.to_bytes(4, 'big')
+    return bytes([major << 5 | 27]) + n.to_bytes(8, 'big')
+
+
+def cbor_int(n):
+    return cbor_head(0, n) if n >= 0 else cbor_head(1, -1 - n)
+
+
+def cbor_text(s):
+    b = str(s).encode()
+    return cbor_head(3, len(b)) + b
+
+
+def cbor_encoder(schema, sids, datatype):
+    """Return a function encoding values of the datatype according to RFC 9254."""
+    def encode_int(value):
+        try:
+            return cbor_int(int(value))
+        except (TypeError, ValueError):
+            return cbor_text(value)
+
+    def encode_decimal(value):
+        s = str(value)
+        fd = len(s) - s.index('.') - 1 if '.' in s else 0
+        return cbor_head(6, CBOR_TAG_DECIMAL) + b'\x82' + cbor_int(-fd) + cbor_int(int(s.replace('.', '')))
+
+    def encode_identity(value, tag=False):
+        sid = sids.sids.get(value)
+        if sid is None:
+            return cbor_text(value)
+        return (cbor_head(6, CBOR_TAG_IDENTITY) if tag else b'') + cbor_int(sid)
+
+    def encode_union(value):
+        s = str(value)
+        if 'int' in base and s.lstrip('-').isdigit():
+            return cbor_int(int(s))
+        if 'boolean' in base and s in ['true', 'false']:
+            return b'\xf5' if s == 'true' else b'\xf4'
+        if 'identityref' in base and s in sids.sids:
+            return encode_identity(s, tag=True)
+        return cbor_text(s)
+
+    if datatype is None:
+        return lambda value: CBOR_NULL if value is None else cbor_text(value)
+    base = base_types(schema, datatype)
+    if len(base) > 1:
+        base = {'int' if dt in ilimits else dt for dt in base}
+        return encode_union
+    dt = base.pop()
+    if dt in ilimits:
+        return encode_int
+    elif dt == 'decimal64':
+        return encode_decimal
+    elif dt == 'boolean':
+        return lambda value: b'\xf5' if json_boolean(value) == 'true' else b'\xf4'
+    elif dt == 'empty':
+        return lambda value: CBOR_NULL
+    elif dt == 'enumeration':
+        return lambda value: cbor_head(6, CBOR_TAG_ENUM) + cbor_text(value)
+    elif dt == 'identityref':
+        return encode_identity
+    return lambda value: CBOR_NULL if value is None else cbor_text(value)
+
+
+def base_types(schema, datatype):
+    """
+    Return the set of base type names of a datatype, expanding typedefs and
+    unions. Leafrefs are not expanded, see value_datatype.
+    """
+    dt, r = datatype
+    if dt == 'typedef':
+        return base_types(schema, schema.json['typedefs'][r])
+    elif dt == 'union':
+        return set().union(*[base_types(schema, m) for m in r])
+    return {dt}
+
+
+class CBORBackend(StreamBackend):
+    """
+    Writes YANG-CBOR (RFC 9254) encoded config. Member names are SIDs from the
+    SIDTable, delta encoded against the SID of the enclosing node. Maps and
+    arrays use indefinite length encoding so the document can be streamed.
+    """
+    binary = True
+
+    def begin_document(self):
+        self.stream.write(CBOR_SELF_DESCRIBE + b'\xbf')
+        if not hasattr(self.stream, 'sids'):
+            self.stream.sids = SIDTable(self.schema)
+        return self.open_root()
+
+    def member_key(self, frame, name, module, node):
+        if node is None:
+            raise Exception(f"CBOR output requires a schema node for {name}")
+        sids = self.stream.sids.sids
+        parent = sids[frame.node] if frame.node is not None else 0
+        return sids[node] - parent
+
+    def value_encoder(self, datatype):
+        return cbor_encoder(self.schema, self.stream.sids, datatype)
+
+    def write_member(self, frame, key, array):
+        self.stream.write(cbor_int(key) + b'\x9f' if array else cbor_int(key))
+
+    def write_element(self, frame):
+        pass
+
+    def write_end_array(self, frame):
+        self.stream.write(CBOR_BREAK)
+
+    def write_begin_object(self):
+        self.stream.write(b'\xbf')
+
+    def write_end_object(self, frame):
+        self.stream.write(CBOR_BREAK)
+
+
+class CBORReader:
+    """Reads a document written by CBORBackend and replays it into another backend."""
+    def __init__(self, schema, input_file):
+        self.schema = schema
+        self.read = input_file.read
+        self.tell = input_file.tell
+        self.sids = SIDTable(schema)
+        self.failed = False  # Invalid CBOR is raised, see ConfigReader
+
+    def position(self):
+        return f'offset {self.tell()}'
+
+    def head(self):
+        b = self.read(1)
+        if not b:
+            raise EOFError("Unexpected end of CBOR data")
+        major, info = b[0] >> 5, b[0] & 0x1f
+        if info < 24:
+            return major, info
+        elif info == 31:
+            return major, None  # Indefinite length or break
+        return major, int.from_bytes(self.read(1 << (info - 24)), 'big')
+
+    def item(self, major, arg, node=None):
+        if major == 0:
+            if node is not None and 'identityref' in base_types(self.schema, value_datatype(self.schema, node)):
+                return self.sids.items.get(arg, str(arg))
+            return str(arg)
+        elif major == 1:
+            return str(-1 - arg)
+        elif major == 2:
+            return self.read(arg)
+        elif major == 3:
+            return self.read(arg).decode()
+        elif major == 4:
+            return [self.item(*self.head()) for _ in range(arg)]
+        elif major == 6:
+            v = self.item(*self.head())
+            if arg == CBOR_TAG_DECIMAL:
+                e, m = int(v[0]), v[1]
+                sign = '-' if m.startswith('-') else ''
+                m = m.lstrip('-').rjust(-e + 1, '0')
+                return f'{sign}{m[:len(m) + e]}.{m[len(m) + e:]}' if e else sign + m
+            elif arg == CBOR_TAG_IDENTITY:
+                return self.sids.items.get(int(v), v)
+            return v
+        elif major == 7:
+            return {20: 'false', 21: 'true', 22: None}.get(arg)
+        raise ValueError(f"Unsupported CBOR item: major type {major}")
+
+    def replay(self, doc):
+        if self.read(len(CBOR_SELF_DESCRIBE)) != CBOR_SELF_DESCRIBE or self.head() != (5, None):
+            raise ValueError("Not a CBOR document written by yang_config_generator")
+        self.replay_map(doc, None)
+
+    def member(self, parent):
+        """Read a member key and return its schema node, None at the end of the map."""
+        major, arg = self.head()
+        if major == 7 and arg is None:
+            return None
+        sids = self.sids
+        parent_sid = sids.sids[parent] if parent is not None else 0
+        sid = parent_sid + (arg if major == 0 else -1 - arg)
+        if sid not in sids.items:
+            raise ValueError(f"Unknown SID {sid}, the schema isn't the one the config was generated with")
+        return sids.items[sid]
+
+    def replay_map(self, doc, parent):
+        # Members of an indefinite length map, list keys are always written first
+        while (node := self.member(parent)) is not None:
+            if isinstance(node, List):
+                self.head()  # Indefinite length array
+                while self.head() != (7, None):
+                    values = []
+                    for ln in node.key_leafs:
+                        kl = self.member(node)
+                        values.append(self.item(*self.head(), kl))
+                    le = doc.add_list_entry(node.name, node.module, node.key_leafs, values, node)
+                    self.replay_map(le, node)
+            elif isinstance(node, LeafList):
+                self.head()  # Indefinite length array
+                while (h := self.head()) != (7, None):
+                    doc.add_leaf(node.name, node.module, self.item(*h, node), node)
+            elif isinstance(node, Container):
+                self.head()  # Indefinite length map
+                self.replay_map(doc.add_container(node.name, node.module, node), node)
+            else:
+                doc.add_leaf(node.name, node.module, self.item(*self.head(), node), node)
+
+
+#### XML and JSON readers
+
+class ReaderFrame:
+    def __init__(self, node, module, doc, parent_doc=None, keys=None):
+        self.node = node  # Schema node of the object, the schema for the config root
+        self.module = module  # Module of the object, for member names without one
+        self.doc = doc  # Backend of the object, None for a list entry until its keys are read
+        self.parent_doc = parent_doc
+        self.keys = keys  # Key values of a list entry read so far
+
+
+class ConfigReader:
+    """
+    Base of the readers of XML and JSON config, written by this tool or not,
+    replaying it into a backend. Members are looked up in the schema by name
+    and module, members that are not in it are passed to report() and
+    skipped. Objects outside the schema, like the envelope, are skipped.
+    List entries are added when their keys are read, which are expected
+    first as in the config written by the backends.
+    """
+    def __init__(self, schema, input_file, report=None):
+        self.schema = schema
+        self.input_file = input_file
+        self.report = report or self.fail
+        self.frames = []
+        self.failed = False  # Invalid XML or JSON, the rest of the document isn't replayed
+
+    def fail(self, message):
+        raise Exception(f"{self.position()}: {message}")
+
+    def position(self):
+        return ''
+
+    def start(self, doc):
+        self.frames = [ReaderFrame(self.schema, None, doc)]
+
+    def child(self, name, module):
+        """The schema node of a member of the current object, None if not in the schema."""
+        frame = self.frames[-1]
+        children = frame.node.data_children()
+        module = module or frame.module
+        if module == frame.module:
+            return children.get(name) or children.get(f'{module}:{name}')
+        return children.get(f'{module}:{name}') or children.get(name)
+
+    def begin(self, node):
+        """Open a container or a list entry."""
+        frame = self.frames[-1]
+        self.flush(frame)
+        module = node.module or frame.module
+        if isinstance(node, List):
+            self.frames.append(ReaderFrame(node, module, None, frame.doc, {}))
+        else:
+            self.frames.append(ReaderFrame(node, module, frame.doc.add_container(node.name, node.module, node)))
+
+    def leaf(self, node, value):
+        frame = self.frames[-1]
+        if frame.keys is not None and node.parent is frame.node and node.name in frame.node.key_leafs and \
+                node.name not in frame.keys:
+            frame.keys[node.name] = value
+            if len(frame.keys) == len(frame.node.key_leafs):
+                self.flush(frame)
+            return
+        self.flush(frame)
+        frame.doc.add_leaf(node.name, node.module, value, node)
+
+    def end(self):
+        self.flush(self.frames.pop())
+
+    def flush(self, frame):
+        """Add a list entry whose keys are read, or missing (None) when another member comes first."""
+        if frame.keys is not None:
+            node = frame.node
+            frame.doc = frame.parent_doc.add_list_entry(node.name, node.module, node.key_leafs,
+                                                        [frame.keys.get(k) for k in node.key_leafs], node)
+            frame.keys = None
+
+
+ENVELOPE = 'envelope'  # XML elements outside the schema
+SKIP = 'skip'  # XML elements not in the schema, and their children
+DATA = 'data'  # XML containers and list entries
+
+
+class XMLReader(ConfigReader):
+    """Reads XML config with expat, streaming, and replays it into a backend."""
+    buffer_text = True  # Text in one call instead of per line, which is faster
+
+    def replay(self, doc):
+        self.start(doc)
+        self.modules = {ns: m for m, (_prefix, ns) in self.schema.json['modules'].items()}
+        self.elements = []  # ENVELOPE, SKIP, DATA or [leaf node, text] per open element
+        self.parser = parser = expat.ParserCreate(namespace_separator=' ')
+        parser.buffer_text = self.buffer_text
+        parser.StartElementHandler = self.start_element
+        parser.EndElementHandler = self.end_element
+        parser.CharacterDataHandler = self.character_data
+        try:
+            parser.ParseFile(self.input_file)
+        except expat.ExpatError as e:
+            self.failed = True
+            self.report(f"invalid XML: {expat.errors.messages[e.code]}")
+            return
+        while len(self.frames) > 1:
+            self.end()
+        self.flush(self.frames[0])
+
+    def position(self):
+        return f'line {self.parser.CurrentLineNumber}'
+
+    def start_element(self, name, attrs):
+        ns, _, name = name.rpartition(' ')
+        elements = self.elements
+        top = elements[-1] if elements else ENVELOPE
+        if top is SKIP or isinstance(top, list):
+            elements.append(SKIP)
+            return
+        node = self.child(name, self.modules.get(ns))
+        if node is None:
+            if top is DATA:
+                self.report(f"{name} is not in the schema at {kp2str(self.frames[-1].node.get_kp)}")
+            elements.append(SKIP if top is DATA else ENVELOPE)
+        elif isinstance(node, Leaf):
+            elements.append([node, []])
+        else:
+            self.begin(node)
+            elements.append(DATA)
+
+    def end_element(self, name):
+        top = self.elements.pop()
+        if top is DATA:
+            self.end()
+        elif isinstance(top, list):
+            self.leaf(top[0], ''.join(top[1]))
+
+    def character_data(self, data):
+        top = self.elements[-1] if self.elements else None
+        if isinstance(top, list):
+            top[1].append(data)
+
+
+# Punctuation, a string without escapes, any other string, a number and true/false/null
+JSON_TOKEN = re.compile(r'[ \t\r\n]*(?:([\[\]{}:,])|"([^"\\\x00-\x1f]*)"|(")|(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)|'
+                        r'(true|false|null))')
+JSON_CHUNK = 1 << 16  # Characters read at a time
+JSON_LOOKAHEAD = 1 << 10  # Characters kept ahead of the position, more than any number or literal
+
+
+class JSONTokens:
+    """
+    Streaming tokenizer of JSON text. Tokens are (kind, value) with the kind
+    one of {}[]:, or 's' for strings, 'n' for numbers (their text) and 'l'
+    for true, false and null. ('', None) at the end.
+    """
+    def __init__(self, text_file):
+        self.read = text_file.read
+        self.buf = ''
+        self.pos = 0
+        self.offset = 0  # Characters read before buf
+        self.start = 0  # Offset of the last token
+        self.eof = False
+        self.pushed = None
+
+    def fill(self):
+        data = self.read(JSON_CHUNK)
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        self.eof = not data
+
+    def peek(self):
+        if self.pushed is None:
+            self.pushed = self.token()
+        return self.pushed
+
+    def next(self):
+        token = self.pushed
+        if token is None:
+            return self.token()
+        self.pushed = None
+        return token
+
+    def token(self):
+        while True:
+            if not self.eof and len(self.buf) - self.pos < JSON_LOOKAHEAD:
+                self.fill()
+            m = JSON_TOKEN.match(self.buf, self.pos)
+            kind = m.lastindex if m else None
+            if m is None or (kind > 3 and m.end() == len(self.buf) and not self.eof):
+                if not self.eof:
+                    self.fill()  # Possibly a token split by the end of the buffer
+                    continue
+                if self.buf[self.pos:].strip():
+                    raise ValueError("unexpected character")
+                return '', None
+            self.start = self.offset + m.start(kind)
+            if kind == 3:
+                try:
+                    s, self.pos = json.decoder.scanstring(self.buf, m.end())
+                except json.JSONDecodeError:
+                    if self.eof:
+                        raise ValueError("invalid string")
+                    self.fill()  # A string longer than the buffer
+                    continue
+                return 's', s
+            self.pos = m.end()
+            if kind == 1:
+                return m.group(1), None
+            return ('s', 'n', 'n', 'l')[kind - 2], m.group(kind)
+
+
+class JSONReader(ConfigReader):
+    """Reads RFC 7951 JSON config, streaming, and replays it into a backend."""
+    encoding = 'utf-8'
+
+    def replay(self, doc):
+        self.start(doc)
+        self.tokens = JSONTokens(io.TextIOWrapper(self.input_file, encoding=self.encoding))
+        try:
+            if self.tokens.next()[0] != '{':
+                raise ValueError("a JSON object is expected")
+            self.envelope_object()
+        except ValueError as e:
+            self.failed = True
+            self.report(f"invalid JSON: {e}")
+            return
+        while len(self.frames) > 1:
+            self.end()
+        self.flush(self.frames[0])
+
+    def position(self):
+        return f'offset {self.tokens.offset + self.tokens.pos}'
+
+    def members(self):
+        """Iterate the member names of an object after {, the values are read by the caller."""
+        tokens = self.tokens
+        while True:
+            kind, value = tokens.next()
+            if kind == ',':
+                kind, value = tokens.next()
+            if kind == '}':
+                return
+            if kind != 's' or tokens.next()[0] != ':':
+                raise ValueError("a member name is expected")
+            module, _, name = value.rpartition(':')
+            yield name, module or None
+
+    def elements(self):
+        """Iterate the elements of an array after [, the values are read by the caller."""
+        tokens = self.tokens
+        while True:
+            kind = tokens.peek()[0]
+            if kind == ',':
+                tokens.next()
+                kind = tokens.peek()[0]
+            if kind == ']':
+                tokens.next()
+                return
+            if kind == '':
+                raise ValueError("unexpected end of the document")
+            yield
+
+    def envelope_object(self):
+        for name, module in self.members():
+            node = self.child(name, module)
+            if node is None:
+                self.envelope_value()
+            else:
+                self.data_value(node)
+
+    def envelope_value(self):
+        kind, _ = self.tokens.next()
+        if kind == '{':
+            self.envelope_object()
+        elif kind == '[':
+            for _ in self.elements():
+                self.envelope_value()
+
+    def data_object(self):
+        for name, module in self.members():
+            node = self.child(name, module)
+            if node is None:
+                self.report(f"{name} is not in the schema at {kp2str(self.frames[-1].node.get_kp)}")
+                self.skip_value()
+            else:
+                self.data_value(node)
+
+    def data_value(self, node):
+        kind = self.tokens.peek()[0]
+        if isinstance(node, Container) and kind == '{':
+            self.tokens.next()
+            self.begin(node)
+            self.data_object()
+            self.end()
+        elif isinstance(node, List) and kind == '[':
+            self.tokens.next()
+            for _ in self.elements():
+                if self.tokens.next()[0] != '{':
+                    raise ValueError(f"list entries of {node.name} must be objects")
+                self.begin(node)
+                self.data_object()
+                self.end()
+        elif isinstance(node, LeafList) and kind == '[':
+            self.tokens.next()
+            for _ in self.elements():
+                self.leaf(node, self.scalar(node))
+        elif isinstance(node, Leaf) and not isinstance(node, LeafList):
+            self.leaf(node, self.scalar(node))
+        else:
+            self.report(f"unexpected value for {kp2str(node.get_kp)}")
+            self.skip_value()
+
+    def scalar(self, node):
+        """A leaf value as a string like the generated values, None for [null] (empty)."""
+        kind, value = self.tokens.next()
+        if kind in ('s', 'n'):
+            return value
+        elif kind == 'l':
+            return None if value == 'null' else value
+        elif kind == '[':
+            values = [self.scalar(node) for _ in self.elements()]
+            if values != [None]:
+                self.report(f"unexpected array for {kp2str(node.get_kp)}")
+            return None
+        elif kind == '{':
+            self.report(f"unexpected object for {kp2str(node.get_kp)}")
+            for _ in self.members():
+                self.skip_value()
+            return None
+        raise ValueError("a value is expected")
+
+    def skip_value(self):
+        kind, _ = self.tokens.next()
+        if kind == '{':
+            for _ in self.members():
+                self.skip_value()
+        elif kind == '[':
+            for _ in self.elements():
+                self.skip_value()
+        elif kind in ('', ',', ':', '}', ']'):
+            raise ValueError("a value is expected")
+
+
+# Output formats selectable with -f: backend and envelope
+output_formats = {
+    'default': (XMLBackend, 'default'),
+    'tailf-config': (XMLBackend, 'tailf-config'),
+    'nso-device': (XMLBackend, 'nso-device'),
+    'json': (JSONBackend, 'default'),
+    'json-restconf': (JSONBackend, 'restconf'),
+    'json-nso-device': (JSONBackend, 'nso-device'),
+    'cbor': (CBORBackend, 'default'),
+    'j-style': (JStyleBackend, 'default'),
+    'j-style-nso-device': (JStyleBackend, 'nso-device'),
+    'c-style': (CStyleBackend, 'default'),
+    'c-style-nso-device': (CStyleBackend, 'nso-device'),
+}
+
+
+def parse_size(s):
+    """Parse a size with an optional K, M or G suffix (powers of 1024)."""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    s = s.strip().upper().rstrip('B')
+    if s and s[-1] in units:
+        return int(float(s[:-1]) * units[s[-1]])
+    return int(s)
+
+
+class OutputSink:
+    """
+    Buffered output file, optionally compressed with gzip or xz, counting the
+    bytes written. Text is encoded as UTF-8. In chunked mode the backends call
+    next_chunk() at a list entry boundary when the chunk is full, to continue
+    in a new file <name>-<n>.<suffixes>.
+    """
+    buffer_size = 1 << 16
+
+    def __init__(self, path=None, compress=None, binary=False, chunk_entries=None, chunk_size=None):
+        self.path = path
+        self.compress = compress
+        self.chunk_entries = chunk_entries
+        self.chunk_size = chunk_size
+        self.chunked = bool(chunk_entries or chunk_size)
+        self.chunk = 0
+        self.paths = []
+        self.entries = 0  # List entries written to the current chunk
+        self.bytes = 0  # Bytes written to previous chunks
+        self.total_bytes = 0
+        self.buffer = []
+        self.buffered = 0
+        self.file = None
+        self.write = self.write_bytes if binary else self.write_text
+        self.open()
+
+    def open(self):
+        path = self.path
+        if self.chunked:
+            self.chunk += 1
+            d, f = os.path.split(path)
+            stem, dot, suffixes = f.partition('.')
+            path = os.path.join(d, f'{stem}-{self.chunk:04}{dot}{suffixes}')
+        self.paths.append(path)
+        if path is None:
+            self.file = sys.stdout.buffer
+        elif self.compress == 'gzip':
+            self.file = gzip.open(path, 'wb', compresslevel=6)
+        elif self.compress == 'xz':
+            self.file = lzma.open(path, 'wb', preset=1)
+        else:
+            self.file = open(path, 'wb')
+        self.entries = 0
+
+    def write_text(self, s):
+        self.buffer.append(s)
+        self.buffered += len(s)
+        if self.buffered > self.buffer_size:
+            self.flush()
+
+    def write_bytes(self, b):
+        self.buffer.append(b)
+        self.buffered += len(b)
+        if self.buffered > self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        data = ''.join(self.buffer).encode() if self.write == self.write_text else b''.join(self.buffer)
+        self.file.write(data)
+        self.bytes += len(data)
+        self.buffer = []
+        self.buffered = 0
+
+    def size(self):
+        """Approximate number of bytes written to the current chunk."""
+        return self.bytes + self.buffered
+
+    def chunk_full(self):
+        return ((self.chunk_entries and self.entries >= self.chunk_entries) or
+                (self.chunk_size and self.size() >= self.chunk_size))
+
+    def next_chunk(self):
+        self.close()
+        self.open()
+
+    def close(self):
+        self.flush()
+        self.total_bytes += self.bytes
+        self.bytes = 0
+        if self.path is None:
+            self.file.flush()
+        else:
+            self.file.close()
+
+
+def output_compression(args):
+    """The compression of -o, from -z or the file name."""
+    if args.compress is None and args.output:
+        return {'.gz': 'gzip', '.xz': 'xz'}.get(os.path.splitext(args.output)[1])
+    return args.compress
+
+
+def open_output(args):
+    backend, _ = output_formats[args.format]
+    compress = output_compression(args)
+    if (args.chunk_entries or args.chunk_size) and not args.output:
+        print("ERROR: Chunked output requires an output file (-o).")
+        sys.exit(1)
+    return OutputSink(args.output, compress, backend.binary, args.chunk_entries, args.chunk_size)
+
+
+def open_input(path):
+    """Open a binary input file, compressed by OutputSink or not."""
+    with open(path, 'rb') as f:
+        magic = f.read(6)
+    if magic.startswith(b'\x1f\x8b'):
+        return gzip.open(path, 'rb')
+    if magic == b'\xfd7zXZ\x00':
+        return lzma.open(path, 'rb')
+    return open(path, 'rb')
+
+
+# Arguments for commands writing config, see open_output
+output_file_arguments = [
+    argument("-o", "--output",
+         type=str,
+         help="File to write config to."
+    ),
+    argument("-z", "--compress",
+         choices=['gzip', 'xz'],
+         help="Compress the output (default from the -o suffix .gz/.xz)."
+    ),
+    argument("--chunk-entries",
+         type=int,
+         help="Start a new output file after this number of list entries."
+    ),
+    argument("--chunk-size",
+         type=parse_size,
+         help="Start a new output file after this size, e.g. 100M."
+    ),
+]
+
+# Arguments for commands regenerating a subtree of existing config, see splice_config
+splice_arguments = [
+    argument("--splice",
+         type=str,
+         metavar="EXISTING",
+         help="Generate only the subtree of --path and splice it into the config EXISTING, written to -o."
+    ),
+]
+
+# Arguments for commands with cached output, see run_cached
+cache_arguments = [
+    argument("--cache",
+         action="store_true",
+         help="Serve the output from the cache of the model when generated before with the same inputs, requires --seed."
+    ),
+    argument("--cache-size",
+         type=parse_size,
+         default='1G',
+         help="Evict the least recently used cached outputs above this size (default 1G)."
+    ),
+]
+
+# Arguments for commands generating config of a given size, see run_target
+target_arguments = [
+    argument("--target-size",
+         type=parse_size,
+         help="Scale the lists to generate this much config (uncompressed), e.g. 50M."
+    ),
+    argument("--target-elements",
+         type=parse_size,
+         help="Scale the lists to generate this number of leaf values, e.g. 2M."
+    ),
+]
+
+# Arguments for commands generating config, see start_profile
+profile_arguments = [
+    argument("--profile",
+         action="store_true",
+         help="Report time, calls and bytes per schema path and generator kind on stderr."
+    ),
+    argument("--profile-folded",
+         type=str,
+         metavar="FILE",
+         help="Write the profile as folded stacks (flamegraph.pl) to FILE."
+    ),
+]
+
+#### Profiling
+
+PROFILE_TOP = 25  # Schema paths in the profile report
+
+
+class Profiler:
+    """
+    Attributes the wall time of the generator functions and of the output
+    backend, the calls and the bytes written to schema paths and generator
+    kinds. Generator time is self time, nested generators (typedef, union,
+    leafref, ...) are subtracted from the calling one.
+    """
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.stack = []  # [kind, seconds of nested generators, path] of the generators running
+        self.paths = {}  # Path: [calls, generate seconds, output seconds, bytes]
+        self.kinds = {}  # Generator kind: [calls, seconds]
+        self.folded = {}  # Path and generator kinds: seconds
+        self.kps = {}  # Path of the schema nodes by id
+
+    def path(self, node):
+        kp = self.kps.get(id(node))
+        if kp is None:
+            kp = self.kps[id(node)] = kp2str(node.get_kp) if isinstance(node, Node) else '/'
+        return kp
+
+    def size(self):
+        return self.output_file.total_bytes + self.output_file.size()
+
+    def wrap(self, generate):
+        """Return generate_random_value, profiled."""
+        def profiled(args, schema, module, node, datatype):
+            kind = datatype[0]
+            path = self.stack[0][2] if self.stack else self.path(node)
+            frame = [kind, 0.0, path]
+            self.stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return generate(args, schema, module, node, datatype)
+            finally:
+                elapsed = time.perf_counter() - start
+                kinds = tuple(f[0] for f in self.stack)
+                self.stack.pop()
+                k = self.kinds.setdefault(kind, [0, 0.0])
+                k[0] += 1
+                k[1] += elapsed - frame[1]
+                if self.stack:
+                    self.stack[-1][1] += elapsed
+                else:
+                    p = self.paths.setdefault(path, [0, 0.0, 0.0, 0])
+                    p[1] += elapsed
+                key = (path, kinds)
+                self.folded[key] = self.folded.get(key, 0) + elapsed - frame[1]
+        return profiled
+
+    def output(self, path, write, *args):
+        """Call the backend method write and attribute its time and bytes to path."""
+        size = self.size()
+        start = time.perf_counter()
+        result = write(*args)
+        elapsed = time.perf_counter() - start
+        p = self.paths.setdefault(path, [0, 0.0, 0.0, 0])
+        p[0] += 1
+        p[2] += elapsed
+        p[3] += self.size() - size
+        key = (path, ('<output>',))
+        self.folded[key] = self.folded.get(key, 0) + elapsed
+        return result
+
+    def report(self, args):
+        out = sys.stderr
+        print(f"{'Path':<100} {'Calls':>10} {'Generate':>10} {'Output':>10} {'Bytes':>12}", file=out)
+        paths = sorted(self.paths.items(), key=lambda p: p[1][1] + p[1][2], reverse=True)
+        for path, (calls, generate, output, size) in paths[:PROFILE_TOP]:
+            print(f"{path:<100} {calls:>10} {generate:>10.3f} {output:>10.3f} {size:>12}", file=out)
+        print(file=out)
+        print(f"{'Generator':<20} {'Calls':>10} {'Seconds':>10} {'us/call':>10}", file=out)
+        for kind, (calls, seconds) in sorted(self.kinds.items(), key=lambda k: k[1][1], reverse=True):
+            print(f"{kind:<20} {calls:>10} {seconds:>10.3f} {seconds / calls * 1e6:>10.1f}", file=out)
+        if args.profile_folded:
+            with open(args.profile_folded, 'w') as f:
+                for (path, kinds), seconds in self.folded.items():
+                    stack = ';'.join(path.strip('/').split('/') + list(kinds))
+                    f.write(f"{stack} {round(seconds * 1e6)}\n")
+
+
+class ProfileBackend:
+    """Output backend proxy attributing the time and bytes of the backend to schema paths."""
+    def __init__(self, backend, profiler, path):
+        self.backend = backend
+        self.profiler = profiler
+        self.path = path
+
+    def close_document(self):
+        self.profiler.output(self.path, self.backend.close_document)
+
+    def add_container(self, name, module, node=None):
+        path = self.profiler.path(node) if node is not None else f"{self.path.rstrip('/')}/{name}"
+        e = self.profiler.output(path, self.backend.add_container, name, module, node)
+        return ProfileBackend(e, self.profiler, path)
+
+    def add_list_entry(self, name, module, keys, values, node=None):
+        path = self.profiler.path(node) if node is not None else f"{self.path.rstrip('/')}/{name}"
+        e = self.profiler.output(path, self.backend.add_list_entry, name, module, keys, values, node)
+        return ProfileBackend(e, self.profiler, path)
+
+    def add_leaf(self, name, module, value, node=None):
+        path = self.profiler.path(node) if node is not None else f"{self.path.rstrip('/')}/{name}"
+        self.profiler.output(path, self.backend.add_leaf, name, module, value, node)
+
+
+def start_profile(args, output_file):
+    """
+    Start profiling with --profile or --profile-folded by wrapping
+    generate_random_value. Returns the Profiler, None when not profiling so
+    the run has no overhead.
+    """
+    global generate_random_value
+    if not (args.profile or args.profile_folded):
+        return None
+    profiler = Profiler(output_file)
+    generate_random_value = profiler.wrap(generate_random_value)
+    return profiler
+
+
+def prepare_output(args, schema, output_file):
+    backend, envelope = output_formats[args.format]
+    return backend.open_document(args, schema, output_file, envelope)
+
+
+#############################################################################################################
+#  Compile YANG modules to a JSON schema
+#############################################################################################################
+COMPILE_CACHE_VERSION = 1
+PATTERN_RECORD_VERSION = 1
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def pyang_version(args, manifest):
+    """
+    Return the version of the pyang binary. It is only run when the binary
+    changed since the compile of the manifest.
+    """
+    path = shutil.which(args.bin) or args.bin
+    try:
+        st = os.stat(path)
+    except OSError:
+        print("ERROR: pyang not found or is not executable.")
+        sys.exit(1)
+    binary = [os.path.abspath(path), st.st_mtime, st.st_size]
+    if manifest.get('binary') == binary and manifest.get('pyang'):
+        return binary, manifest['pyang']
+    try:
+        result = subprocess.run((args.bin, '--version'), capture_output=True)
+    except OSError:
+        print("ERROR: pyang not found or is not executable.")
+        sys.exit(1)
+    vstr = result.stdout.decode().strip()
+    _, version = vstr.split(' ')
+    vparts = version.split('.')
+    if not args.no_version_check and (int(vparts[0]) < 2 or (vparts[0] == '2' and int(vparts[1]) < 5)):
+        print(f"ERROR: pyang version {version} is older than 2.5.")
+        sys.exit(1)
+    return binary, version
+
+
+def module_groups(modules):
+    """
+    Group the modules that have to be compiled together. The nodes of a
+    module augmenting or deviating another of the modules are part of the
+    tree of that module, so they end up in the same group.
+    """
+    names = {}
+    imports = {}
+    for m in modules:
+        with open(m, encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        name = re.search(r'^\s*(?:sub)?module\s+"?([\w.-]+)', text, re.M)
+        names[name.group(1) if name else m] = m
+        prefixes = dict((p, i) for i, p in re.findall(
+            r'\bimport\s+"?([\w.-]+)"?\s*{[^}]*?\bprefix\s+"?([\w.-]+)', text))
+        imports[m] = {prefixes[p] for p in re.findall(
+            r'^\s*(?:augment|deviation)\s+"?/([\w.-]+):', text, re.M) if p in prefixes}
+    targets = {m: {names[i] for i in imports[m] if i in names} for m in modules}
+    groups = []
+    for m in modules:
+        linked = [g for g in groups if any(n in targets[m] or m in targets[n] for n in g)]
+        for g in linked:
+            groups.remove(g)
+        groups.append([n for n in modules if n == m or any(n in g for g in linked)])
+    return sorted(groups, key=lambda g: modules.index(g[0]))
+
+
+def merge_fragments(fragments):
+    """
+    Merge the schemas compiled from each group of modules, in the order of
+    the groups. Identities derived in one group from a base in another only
+    get their closure here, so it is computed again over the merged table.
+    """
+    merged = {'modules': {}, 'tree': {}, 'typedefs': {}, 'identities': {}, 'annotations': {}}
+    for fragment in fragments:
+        for key, value in fragment.items():
+            if key == 'identities':
+                for base, derived in value.items():
+                    lst = merged[key].setdefault(base, [])
+                    lst += [i for i in derived if i not in lst]
+            else:
+                merged[key].update(value)
+    identities = merged['identities']
+    for base, derived in identities.items():
+        for i in derived:  # Appended to while iterated, breadth first
+            derived += [d for d in identities.get(i, []) if d not in derived]
+    return merged
+
+
+def schema_patterns(schema):
+    """The patterns of the strings of a schema, with the ones used when a string has none."""
+    patterns = dict.fromkeys([DEFAULT_STRING_PATTERN, '.*'])
+
+    def datatype(dt):
+        name, r = dt
+        if name == 'string':
+            patterns.update(dict.fromkeys(r[1]))
+        elif name == 'union':
+            for m in r:
+                datatype(m)
+
+    def nodes(tree):
+        for kind, _, data, *rest in tree.values():
+            if kind == 'choice':
+                for members in data.values():
+                    nodes(members)
+            elif kind in ('leaf', 'leaf-list'):
+                datatype(data)
+            else:
+                nodes(data)
+            if rest and isinstance(rest[-1], dict) and 'leafref-type' in rest[-1]:
+                datatype(rest[-1]['leafref-type'])
+
+    nodes(schema['tree'])
+    for dt in schema['typedefs'].values():
+        datatype(dt)
+    return list(patterns)
+
+
+def compact_encoder():
+    """The compact schema encoding, shared with the pmod plugin."""
+    sys.path.insert(0, PLUGIN_DIR)
+    try:
+        from pmod_compact import compact_schema
+    finally:
+        sys.path.remove(PLUGIN_DIR)
+    return compact_schema
+
+
+def compile_group(args, group, cache_dir):
+    """
+    Compile a group of modules to a fragment with pyang. Returns the fragment
+    file name, the files used by the group and the messages of pyang, or None
+    for the fragment when the compile failed.
+    """
+    fragment = f"compile-{hashlib.sha1('|'.join(group).encode()).hexdigest()[:16]}.json"
+    fragment_file = os.path.join(cache_dir, fragment)
+    depends_file = fragment_file + '.depends'
+    cmd = [args.bin,
+           '--plugindir', PLUGIN_DIR,
+           '-f', 'pmod',
+           '--pmod-depends', depends_file,
+           '-o', fragment_file,
+          ]
+    if args.ignore_errors:
+        cmd.append('--ignore-errors')
+    for i in args.I + sorted({os.path.dirname(m) for m in group}):
+        cmd += ['-p', i]  # Submodules are searched for next to their modules too
+    cmd += group
+    for f in (fragment_file, depends_file):
+        if os.path.exists(f):
+            os.remove(f)
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    messages = result.stdout + result.stderr
+    if not os.path.exists(fragment_file) or not os.path.exists(depends_file):
+        return None, [], messages
+    with open(depends_file) as f:
+        sources = set(json.load(f)) | set(group)
+    os.remove(depends_file)
+    return fragment, sorted(sources), messages
+
+
+"""
+../pyang/bin/pyang -p /src/ncs/yang \
+	      --ignore-errors --plugindir `pwd`/plugins -f pmod oc/openconfig-interfaces.yang -o oc/openconfig-interfaces.json-raw
+cat oc/openconfig-interfaces.json-raw | python3 -m json.tool - > oc/openconfig-interfaces.json
+rm oc/openconfig-interfaces.json-raw
+"""
+@subcommand([
+    argument('--bin',
+        type=str,
+        default='pyang',
+        help="pyang binary to use for compilation."
+    ),
+    argument("modules",
+         type=str, nargs="+",
+         help="YANG modules to compile."
+    ),
+    argument("-I",
+         type=str, action='append', default=[],
+         help="Directories to search for YANG modules."
+    ),
+    argument("-o",
+         type=str, default='model.json',
+         help="JSON output file."
+    ),
+    argument("--no-version-check",
+         action='store_true', default=False,
+         help="No pyang version check."
+    ),
+    argument("--ignore-errors",
+         action='store_true', default=False,
+         help="Ignore pyang errors."
+    ),
+    argument("--force",
+         action='store_true', default=False,
+         help="Compile all modules, also the unchanged."
+    ),
+    argument("--compact",
+         action='store_true', default=False,
+         help="Write the schema with string tables and positional nodes, smaller and faster to load."
+    ),
+    argument("-j", "--jobs",
+         type=int, default=os.cpu_count() or 1,
+         help="Groups of modules to compile in parallel (default: number of CPUs)."
+    )],
+    help="compile YANG modules to a JSON schema"
+)
+def cmd_compile(args, schema):
+    """
+    Compile YANG modules to a JSON schema with pyang and the pmod plugin.
+    The modules are compiled in groups, a module with the modules it augments
+    or deviates, to fragments in <output>.cache. A manifest records the hashes
+    of the files used by each group, imported modules included, with the
+    search paths and the plugin and pyang versions. Only groups with changed
+    files are compiled again, in parallel, and nothing when the schema is up
+    to date. The fragments are merged in the order of the modules.
+    """
+    cache_dir = os.path.splitext(args.o)[0] + '.cache'
+    manifest_file = os.path.join(cache_dir, 'compile-manifest.json')
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    binary, version = pyang_version(args, manifest)
+    settings = {
+        'version': COMPILE_CACHE_VERSION,
+        'pyang': version,
+        'plugin': hashlib.sha1(''.join(file_digest(os.path.join(PLUGIN_DIR, f))
+                                       for f in sorted(os.listdir(PLUGIN_DIR)) if f.endswith('.py')).encode()).hexdigest(),
+        'include': [os.path.abspath(i) for i in args.I],
+        'ignore_errors': args.ignore_errors,
+    }
+    modules = [os.path.abspath(m) for m in args.modules]
+    for m in modules:
+        if not os.path.isfile(m):
+            print(f"ERROR: YANG module {m} not found.")
+            sys.exit(1)
+    # The pattern records depend on the generator overrides, not on pyang
+    patterns = hashlib.sha1(json.dumps([PATTERN_RECORD_VERSION, sorted((p, g.__name__) for p, g in
+                                                                        random_pattern.items())]).encode()).hexdigest()
+    cached = manifest.get('groups', {}) if not args.force and \
+        all(manifest.get(k) == v for k, v in settings.items()) else {}
+    digests = {}
+
+    def unchanged(entry):
+        try:
+            return all(digests.setdefault(p, file_digest(p)) == d for p, d in entry['sources'].items()) and \
+                os.path.exists(os.path.join(cache_dir, entry['fragment']))
+        except OSError:
+            return False
+
+    groups = {}
+    stale = []
+    os.makedirs(cache_dir, exist_ok=True)
+    for group in module_groups(modules):
+        key = '|'.join(group)
+        if key in cached and unchanged(cached[key]):
+            groups[key] = cached[key]
+        else:
+            groups[key] = None
+            stale.append(group)
+    if stale:
+        if args.verbose:
+            for group in stale:
+                print(f"Compiling {' '.join(os.path.basename(m) for m in group)}")
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            results = list(pool.map(lambda group: compile_group(args, group, cache_dir), stale))
+        failed = False
+        for group, (fragment, sources, messages) in zip(stale, results):
+            sys.stderr.write(messages)
+            if fragment is None:
+                print(f"ERROR: pyang failed to compile {' '.join(group)}")
+                failed = True
+                continue
+            groups['|'.join(group)] = {
+                'fragment': fragment,
+                'sources': {p: digests.setdefault(p, file_digest(p)) for p in sources},
+            }
+        if failed:
+            sys.exit(1)
+    output = manifest.get('output')
+    if stale or set(groups) != set(manifest.get('groups', {})) or manifest.get('compact') != args.compact or \
+            manifest.get('patterns') != patterns or not os.path.exists(args.o) or file_digest(args.o) != output:
+        schemas = []
+        for g in groups.values():
+            with open(os.path.join(cache_dir, g['fragment'])) as f:
+                schemas.append(json.load(f))
+        merged = merge_fragments(schemas) if len(schemas) > 1 else schemas[0]
+        merged['patterns'] = {p: pattern_record(p) for p in schema_patterns(merged)}
+        with open(args.o, 'w') as f:
+            if args.compact:
+                f.write(json.dumps(compact_encoder()(merged), separators=(',', ':')))
+            else:
+                f.write(json.dumps(merged))
+        output = file_digest(args.o)
+    elif args.verbose:
+        print(f"{args.o} is up to date")
+    fragments = {g['fragment'] for g in groups.values()}
+    for old in os.listdir(cache_dir):
+        if old.startswith('compile-') and old.endswith('.json') and old not in fragments and \
+                old != os.path.basename(manifest_file):
+            os.remove(os.path.join(cache_dir, old))
+    with open(manifest_file + '.tmp', 'w') as f:
+        json.dump(dict(settings, binary=binary, groups=groups, compact=args.compact, patterns=patterns,
+                       output=output), f, indent=1)
+    os.replace(manifest_file + '.tmp', manifest_file)
+
+
+#############################################################################################################
+#  When and must expressions
+#############################################################################################################
+# A subset of XPath 1.0 is compiled to closures once per schema node: location
+# paths with predicates, current(), comparisons, and/or, + and - and the
+# functions in xpath_functions. The paths are resolved against the schema when
+# compiled, so a step is a dict lookup in the data generated so far, which
+# ConditionBackend keeps for the schema nodes the expressions refer to.
+
+MUST_ATTEMPTS = 10  # Values generated for a leaf with a must expression before it is left out
+MISSING = object()  # No value satisfying the must expression
+
+
+class XPathError(Exception):
+    pass
+
+
+XPATH_TOKEN = re.compile(r"""\s*(?:
+    (?P<number>\d+(?:\.\d*)?|\.\d+)
+  | (?P<literal>"[^"]*"|'[^']*')
+  | (?P<name>[A-Za-z_][\w.-]*(?::[A-Za-z_][\w.-]*)?)
+  | (?P<op>\.\.|//|::|!=|<=|>=|[/()\[\],=<>|+*@.-])
+)""", re.X)
+
+XPATH_COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+}
+
+
+def xpath_tokens(expr):
+    tokens = []
+    expr = expr.strip()
+    pos = 0
+    while pos < len(expr):
+        m = XPATH_TOKEN.match(expr, pos)
+        if m is None:
+            raise XPathError(f"unexpected {expr[pos:]!r}")
+        tokens.append((m.lastgroup, m.group(m.lastgroup)))
+        pos = m.end()
+    return tokens
+
+
+class DataNode:
+    """A node of the generated data, with the children the expressions refer to by schema node."""
+    __slots__ = ('schema', 'parent', 'value', 'children')
+
+    def __init__(self, schema, parent, value=None):
+        self.schema = schema
+        self.parent = parent
+        self.value = value
+        self.children = {}
+
+    def add(self, node):
+        self.children.setdefault(node.schema, []).append(node)
+
+
+def node_string(n):
+    return '' if n.value is None else str(n.value)
+
+
+def xpath_string(v):
+    if isinstance(v, list):
+        return node_string(v[0]) if v else ''
+    elif isinstance(v, bool):
+        return 'true' if v else 'false'
+    elif isinstance(v, float):
+        return str(int(v)) if v.is_integer() else str(v)
+    return v
+
+
+def xpath_number(v):
+    if isinstance(v, (list, str)):
+        try:
+            return float(xpath_string(v))
+        except ValueError:
+            return math.nan
+    return float(v)
+
+
+def xpath_boolean(v):
+    if isinstance(v, float):
+        return v != 0 and not math.isnan(v)
+    return bool(v)
+
+
+def xpath_compare(op, a, b):
+    """Compare the values a and b with the operator op as XPath 1.0 does."""
+    compare = XPATH_COMPARISONS[op]
+    equality = op in ('=', '!=')
+    if isinstance(a, bool) or isinstance(b, bool):
+        if equality:
+            return compare(xpath_boolean(a), xpath_boolean(b))
+    if isinstance(a, list) or isinstance(b, list):
+        if equality and not isinstance(a, float) and not isinstance(b, float):
+            xs = [node_string(n) for n in a] if isinstance(a, list) else [xpath_string(a)]
+            ys = [node_string(n) for n in b] if isinstance(b, list) else [xpath_string(b)]
+        else:
+            xs = [xpath_number(node_string(n)) for n in a] if isinstance(a, list) else [xpath_number(a)]
+            ys = [xpath_number(node_string(n)) for n in b] if isinstance(b, list) else [xpath_number(b)]
+        return any(compare(x, y) for x in xs for y in ys)
+    if equality and not isinstance(a, float) and not isinstance(b, float):
+        return compare(a, b)
+    return compare(xpath_number(a), xpath_number(b))
+
+
+def xf_count(nodes):
+    return float(len(nodes)) if isinstance(nodes, list) else math.nan
+
+
+# Functions by name: (number of arguments, function of the argument values)
+xpath_functions = {
+    'not': (1, lambda v: not xpath_boolean(v)),
+    'boolean': (1, xpath_boolean),
+    'true': (0, lambda: True),
+    'false': (0, lambda: False),
+    'count': (1, xf_count),
+    'string': (1, xpath_string),
+    'number': (1, xpath_number),
+    'string-length': (1, lambda v: float(len(xpath_string(v)))),
+    'contains': (2, lambda a, b: xpath_string(b) in xpath_string(a)),
+    'starts-with': (2, lambda a, b: xpath_string(a).startswith(xpath_string(b))),
+}
+
+
+def identity_test(schema, or_self):
+    """derived-from() and derived-from-or-self() of the identities of the schema."""
+    identities = schema.json['identities'] if schema.json else {}
+    derived = {}
+
+    def local(name):
+        return name.rsplit(':', 1)[-1]
+
+    def test(nodes, base):
+        base = local(xpath_string(base))
+        if base not in derived:
+            derived[base] = {local(i) for i in identities.get(base, ())} | ({base} if or_self else set())
+        return isinstance(nodes, list) and any(local(node_string(n)) in derived[base] for n in nodes)
+    return test
+
+
+def node_module(node):
+    while node is not None and getattr(node, 'module', None) is None:
+        node = getattr(node, 'parent', None)
+    return node.module if node is not None else None
+
+
+def xpath_child_step(targets):
+    def step(nodes, current):
+        if len(nodes) == 1 and len(targets) == 1:
+            return nodes[0].children.get(targets[0], [])
+        return [c for n in nodes for t in targets for c in n.children.get(t, ())]
+    return step
+
+
+def xpath_parent_step(nodes, current):
+    if len(nodes) == 1:
+        return [nodes[0].parent] if nodes[0].parent is not None else []
+    return list(dict.fromkeys(n.parent for n in nodes if n.parent is not None))
+
+
+def xpath_filter_step(step, predicate):
+    def filtered(nodes, current):
+        selected = []
+        for i, n in enumerate(step(nodes, current), 1):
+            v = predicate(n, current)
+            if (v == i) if isinstance(v, float) else xpath_boolean(v):
+                selected.append(n)
+        return selected
+    return filtered
+
+
+def xpath_root(node, current):
+    while node.parent is not None:
+        node = node.parent
+    return [node]
+
+
+def xpath_path(start, steps):
+    def path(node, current):
+        nodes = start(node, current)
+        for step in steps:
+            if not nodes:
+                break
+            nodes = step(nodes, current)
+        return nodes
+    return path
+
+
+class XPathCompiler:
+    """
+    Compiles an expression to a closure f(node, current) of the context node
+    and the node of current(), both DataNodes. Location paths are resolved
+    against the schema from context, the schema node of the context node, and
+    the schema nodes of steps to children are added to retained.
+    """
+    def __init__(self, schema, context, retained):
+        self.schema = schema
+        self.context = context
+        self.retained = retained
+        self.tokens = []
+        self.pos = 0
+
+    def compile(self, expr):
+        self.tokens = xpath_tokens(expr)
+        self.pos = 0
+        f = self.or_expr([self.context])
+        if self.pos < len(self.tokens):
+            raise XPathError(f"unexpected {self.tokens[self.pos][1]!r}")
+        return f
+
+    def peek(self, offset=0):
+        i = self.pos + offset
+        return self.tokens[i] if i < len(self.tokens) else (None, None)
+
+    def accept(self, kind, value=None):
+        k, v = self.peek()
+        if k == kind and (value is None or v == value):
+            self.pos += 1
+            return v
+        return None
+
+    def expect(self, value):
+        if self.accept('op', value) is None:
+            raise XPathError(f"expected {value!r}")
+
+    def or_expr(self, ctx):
+        f = self.and_expr(ctx)
+        while self.accept('name', 'or'):
+            f = (lambda f, g: lambda n, c: xpath_boolean(f(n, c)) or xpath_boolean(g(n, c)))(f, self.and_expr(ctx))
+        return f
+
+    def and_expr(self, ctx):
+        f = self.equality_expr(ctx)
+        while self.accept('name', 'and'):
+            f = (lambda f, g: lambda n, c: xpath_boolean(f(n, c)) and xpath_boolean(g(n, c)))(f, self.equality_expr(ctx))
+        return f
+
+    def equality_expr(self, ctx):
+        return self.comparison(('=', '!='), lambda: self.relational_expr(ctx))
+
+    def relational_expr(self, ctx):
+        return self.comparison(('<', '<=', '>', '>='), lambda: self.additive_expr(ctx))
+
+    def comparison(self, ops, operand):
+        f = operand()
+        while self.peek()[0] == 'op' and self.peek()[1] in ops:
+            op = self.accept('op')
+            f = (lambda op, f, g: lambda n, c: xpath_compare(op, f(n, c), g(n, c)))(op, f, operand())
+        return f
+
+    def additive_expr(self, ctx):
+        f = self.unary_expr(ctx)
+        while self.peek()[0] == 'op' and self.peek()[1] in ('+', '-'):
+            sign = 1 if self.accept('op') == '+' else -1
+            f = (lambda sign, f, g: lambda n, c: xpath_number(f(n, c)) + sign * xpath_number(g(n, c)))(
+                sign, f, self.unary_expr(ctx))
+        return f
+
+    def unary_expr(self, ctx):
+        if self.accept('op', '-'):
+            f = self.unary_expr(ctx)
+            return lambda n, c: -xpath_number(f(n, c))
+        f = self.path_expr(ctx)
+        while self.accept('op', '|'):
+            f = (lambda f, g: lambda n, c: list(dict.fromkeys(f(n, c) + g(n, c))))(f, self.path_expr(ctx))
+        return f
+
+    def path_expr(self, ctx):
+        kind, value = self.peek()
+        function = kind == 'name' and self.peek(1) == ('op', '(')
+        if kind == 'op' and value in ('/', '.', '..') or kind == 'name' and not function:
+            if self.accept('op', '/'):
+                if self.peek()[0] != 'name' and self.peek()[1] not in ('.', '..'):
+                    return xpath_root
+                steps, _ = self.steps([self.schema])
+                return xpath_path(xpath_root, steps)
+            steps, _ = self.steps(ctx)
+            return xpath_path(lambda node, current: [node], steps)
+        elif function and value == 'current':
+            self.pos += 2
+            self.expect(')')
+            if self.accept('op', '/'):
+                steps, _ = self.steps([self.context])
+                return xpath_path(lambda node, current: [current], steps)
+            return lambda node, current: [current]
+        f = self.primary_expr(ctx)
+        if self.peek() in (('op', '/'), ('op', '[')):
+            raise XPathError("paths and predicates of expressions other than current() are not supported")
+        return f
+
+    def primary_expr(self, ctx):
+        kind, value = self.peek()
+        self.pos += 1
+        if kind == 'literal':
+            value = value[1:-1]
+            return lambda n, c: value
+        elif kind == 'number':
+            value = float(value)
+            return lambda n, c: value
+        elif kind == 'op' and value == '(':
+            f = self.or_expr(ctx)
+            self.expect(')')
+            return f
+        elif kind == 'name':
+            self.expect('(')
+            args = []
+            if not self.accept('op', ')'):
+                args.append(self.or_expr(ctx))
+                while self.accept('op', ','):
+                    args.append(self.or_expr(ctx))
+                self.expect(')')
+            if value in ('derived-from', 'derived-from-or-self'):
+                arity, fn = 2, identity_test(self.schema, value == 'derived-from-or-self')
+            elif value in xpath_functions:
+                arity, fn = xpath_functions[value]
+            else:
+                raise XPathError(f"function {value}() is not supported")
+            if len(args) != arity:
+                raise XPathError(f"{value}() takes {arity} arguments")
+            return lambda n, c: fn(*[a(n, c) for a in args])
+        raise XPathError(f"unexpected {value!r}" if value else "unexpected end")
+
+    def steps(self, ctx):
+        """The steps of a relative location path from the schema nodes ctx, and the schema nodes it ends at."""
+        steps = []
+        while True:
+            kind, value = self.peek()
+            self.pos += 1
+            if (kind, value) == ('op', '..'):
+                steps.append(xpath_parent_step)
+                ctx = list(dict.fromkeys(n.parent for n in ctx if getattr(n, 'parent', None) is not None))
+            elif (kind, value) == ('op', '.'):
+                pass
+            elif kind == 'name':
+                module = None
+                if ':' in value:
+                    prefix, value = value.split(':')
+                    module = self.schema.prefix2module(prefix)
+                ctx = [ch for n in ctx if isinstance(n, HasChildren) for ch in n.data_children().values()
+                       if ch.name == value and (module is None or node_module(ch) == module)]
+                self.retained.update(ctx)
+                step = xpath_child_step(ctx)
+                while self.accept('op', '['):
+                    step = xpath_filter_step(step, self.or_expr(ctx))
+                    self.expect(']')
+                steps.append(step)
+            else:
+                raise XPathError(f"unexpected {value!r}" if value else "unexpected end")
+            if not self.accept('op', '/'):
+                return steps, ctx
+
+
+class Condition:
+    """The compiled when and must expressions of a schema node, None when it has none."""
+    def __init__(self, node, when, must):
+        self.node = node
+        self.when = when
+        self.must = must
+
+    def holds(self, doc):
+        """Whether the when expression is true for the node added to the backend doc."""
+        if self.when is None:
+            return True
+        # The context of the when of a choice is the parent, the node itself for other nodes
+        context = doc.frame if isinstance(self.node, Choice) else DataNode(self.node, doc.frame)
+        return xpath_boolean(self.when(context, context))
+
+    def accepts(self, doc, value):
+        """Whether the must expression is true for the value of the leaf added to the backend doc."""
+        if self.must is None:
+            return True
+        context = DataNode(self.node, doc.frame, value)
+        return xpath_boolean(self.must(context, context))
+
+    def value(self, doc, generate):
+        """
+        A value from generate() for which the must expression is true, else
+        the default of the leaf if it is, MISSING when none is found.
+        """
+        for _ in range(MUST_ATTEMPTS if self.must is not None else 1):
+            v = generate()
+            if self.accepts(doc, v):
+                return v
+        default = self.node.default
+        for v in [default] if isinstance(default, str) else default or ():
+            if self.accepts(doc, v):
+                return v
+        return MISSING
+
+
+def compile_conditions(args, schema):
+    """
+    Compile the when and must expressions of all nodes of the schema, set as
+    condition of the nodes. Expressions outside the subset are ignored,
+    reported with --verbose. Sets the number of nodes with conditions and the
+    schema nodes the expressions refer to in the schema.
+    """
+    retained = set()
+    conditions = 0
+
+    def compile_expr(node, kind, expr, context):
+        try:
+            return XPathCompiler(schema, context, retained).compile(expr)
+        except XPathError as e:
+            if args is not None and args.verbose:
+                print(f"{kp2str(node.get_kp)}: {kind} {expr!r} ignored: {e}", file=sys.stderr)
+            return None
+
+    def walk(children):
+        nonlocal conditions
+        for ch in children.values():
+            if ch.when or ch.must:
+                context = ch.parent if isinstance(ch, Choice) else ch
+                when = compile_expr(ch, 'when', ch.when, context) if ch.when else None
+                # The must of containers and lists can't be evaluated before their contents are generated
+                must = compile_expr(ch, 'must', ch.must, context) if ch.must and isinstance(ch, Leaf) else None
+                if when is not None or must is not None:
+                    ch.condition = Condition(ch, when, must)
+                    conditions += 1
+            if isinstance(ch, Choice):
+                for case in ch.choices.values():
+                    walk(case)
+            elif isinstance(ch, HasChildren):
+                walk(ch.children)
+    walk(schema.children)
+    schema.conditions = conditions
+    schema.retained = retained
+
+
+class ConditionBackend:
+    """
+    Output backend proxy keeping the generated data of the schema nodes in
+    retained, for evaluating the when and must expressions. frame is the
+    DataNode of the container or list entry of the backend.
+    """
+    def __init__(self, backend, frame, retained):
+        self.backend = backend
+        self.frame = frame
+        self.retained = retained
+
+    def close_document(self):
+        self.backend.close_document()
+
+    def add_container(self, name, module, node=None):
+        frame = DataNode(node, self.frame)
+        if node in self.retained:
+            self.frame.add(frame)
+        return ConditionBackend(self.backend.add_container(name, module, node), frame, self.retained)
+
+    def add_list_entry(self, name, module, keys, values, node=None):
+        frame = DataNode(node, self.frame)
+        if node is not None:
+            if node in self.retained:
+                self.frame.add(frame)
+            index = node.data_children()
+            for k, v in zip(keys, values):
+                if index.get(k) in self.retained:
+                    frame.add(DataNode(index[k], frame, v))
+        return ConditionBackend(self.backend.add_list_entry(name, module, keys, values, node), frame, self.retained)
+
+    def add_leaf(self, name, module, value, node=None):
+        if node in self.retained:
+            self.frame.add(DataNode(node, self.frame, value))
+        self.backend.add_leaf(name, module, value, node)
+
+
+def condition_backend(args, schema, doc):
+    """
+    Wrap the output backend doc of the schema root in a ConditionBackend when
+    the schema has when or must expressions, compiled on first use.
+    """
+    if schema.conditions is None:
+        compile_conditions(args, schema)
+    if not schema.conditions:
+        return doc
+    return ConditionBackend(doc, DataNode(schema, None), schema.retained)
+
+
+#############################################################################################################
+#  Create config by iterating schema model
+#############################################################################################################
+@subcommand([
+    argument('-f', '--format',
+        choices=list(output_formats),
+        default='default',
+        help="config output format"
+    ),
+    argument('-n', '--name',
+        type=str,
+        default='ce0',
+        help="Device name for output format nso-device"
+    ),
+    *output_file_arguments,
+    *target_arguments,
+    *profile_arguments,
+    *splice_arguments,
+    *cache_arguments,
+    argument("-1", "--one-level",
+         action="store_true",
+         help="Show one level"
+    ),
+    argument("--use-unaltered-patterns",
+         action="store_true",
+         help="Do not alter patterns to generator more natual strings."
+    )],
+    help="show model tree"
+)
+def cmd_genconfig(args, schema):
+    """
+    Show the JSON schema tree.
+    With a size target the descriptor of the whole schema, as from gendesc,
+    is run with scaled lists instead.
+    """
+    if args.splice:
+        splice_config(args, schema, lambda doc: iter_schema(args, schema, doc))
+        exit(0)
+    output_file = open_output(args)
+    if args.target_size or args.target_elements:
+        if args.one_level:
+            print("ERROR: --one-level can not be used with a size target.")
+            sys.exit(1)
+        run_target(args, schema, lambda: schema_desc(args, schema, {}), output_file)
+        exit(0)
+    profiler = start_profile(args, output_file)
+    outputroot = prepare_output(args, schema, output_file)
+    if profiler:
+        outputroot = ProfileBackend(outputroot, profiler, '/')
+    iter_schema(args, schema, outputroot)
+    outputroot.close_document()
+    output_file.close()
+    if profiler:
+        profiler.report(args)
+    exit(0)
+
+
+LEAF_LIST_ATTEMPTS = 10  # Values generated per leaf-list value to get distinct values
+
+
+def distinct_values(generate, n):
+    """Return n distinct values from generate(), fewer when it doesn't produce that many. MISSING is left out."""
+    values = []
+    for _ in range(n * LEAF_LIST_ATTEMPTS):
+        if len(values) == n:
+            break
+        v = generate()
+        if v is not MISSING and v not in values:
+            values.append(v)
+    return values
+
+
+class IterContext:
+    def __init__(self):
+        self.path = tuple()
+        self.module = None
+
+
+def create_list_entry(args, schema, doc, ch, tp, ctx, processed=None):
+    if processed is None: processed = []
+    if ch.module:
+        ctx.module = ch.module
+    g = random_keypath.get(tp)
+    values = []
+    if g:
+        if not hasattr(g, '__iter__'):
+            g = [g]
+        for ln, klg in zip(ch.key_leafs, g):
+            kl = ch.children[ln]
+            values.append(klg(kl.datatype))
+            processed.append(kl.name)
+    else:
+        for ln in ch.key_leafs:
+            kl = ch.children[ln]
+            values.append(generate_random_value(args, schema, ctx.module, kl, kl.datatype))
+            processed.append(kl.name)
+    return doc.add_list_entry(ch.name, ch.module, ch.key_leafs, values, ch)
+
+
+
+def add_levels(args, schema, doc, kp, ctx, processed):
+    """Add the ancestors of --path and the node itself, the keys of a list entry are added to processed."""
+    ch = schema
+    tp = tuple()
+    for p in kp:
+        tp += (p,)
+        ch = ch.find(p)
+        del processed[:]
+        if isinstance(ch, Container):
+            e = doc.add_container(ch.name, ch.module, ch)
+            if ch.module:
+                ctx.module = ch.module
+            doc = e
+        elif isinstance(ch, List):
+            # Create a random number of list elements between 0 and 5
+            n = 1  # random.randint(0, 2)
+            if n > 0:
+                for _ in range(0, n):
+                    e = create_list_entry(args, schema, doc, ch, tp, ctx, processed)
+            doc = e
+        else:
+            print("ERROR: Type not supported with --path")
+            sys.exit(1)
+    return e
+
+
+def iter_schema(args, schema, doc, ctx=None, ch=None, processed = None):
+    processed = processed or []
+    if ctx is None:
+        ctx = IterContext()
+        doc = condition_backend(args, schema, doc)
+        if args.path:
+            kp = str2kp(args.path)
+            ch = find_kp(schema, kp)
+            if ch is None:
+                print(f"Path {args.path} not found")
+                sys.exit(1)
+            doc = add_levels(args, schema, doc, kp, ctx, processed)
+
+    ch = ch or schema
+    for k, t in ch:
         if ':' in k:
             m, k = k.split(':')
         tp = ctx.path + (k,)
         # Fix namespace support for verbose when path supports namespaces
         if args.verbose:
             print(f'Processing {kp2str(t.get_kp)}')
+        cond = t.condition
+        if cond is not None and not cond.holds(doc):
+            continue
         if isinstance(t, Container):
-            e = doc.add_container(k, t.module)
+            e = doc.add_container(k, t.module, t)
             if t.module:
                 ctx.module = t.module
             iter_schema(args, schema, e, ctx, t)
         elif isinstance(t, List):
-            # Create a random number of list elements between 0 and 5
-            n = 1  # random.randint(0, 2)
+            n = max(1, t.min_elements)
             if n > 0:
                 for _ in range(0, n):
                     processed = []
                     e = create_list_entry(args, schema, doc, t, tp, ctx,
                                           processed)
-                    print(processed)
                     iter_schema(args, schema, e, ctx, t, processed)
         elif isinstance(t, Choice):
-            m = t[random.choice(list(t.choices.keys()))]
+            m = t[t.default if t.default in t.choices else random.choice(list(t.choices.keys()))]
             iter_schema(args, schema, doc, ctx, m.items())
-        elif isinstance(t, LeafList):
-            # Only one element is created
-            g = random_keypath.get(tp)
-            if g:
-                v = g(t.datatype)
-            else:
-                v = generate_random_value(args, schema, ctx.module, t, t.datatype)
-            doc.add_leaf(k, t.module, v)
         elif isinstance(t, Leaf):
             if k not in processed:
                 g = random_keypath.get(tp)
                 if g:
-                    v = g(t.datatype)
+                    generate = lambda: g(t.datatype)
+                else:
+                    generate = lambda: generate_random_value(args, schema, ctx.module, t, t.datatype)
+                if cond is not None:
+                    generate = lambda generate=generate: cond.value(doc, generate)
+                if isinstance(t, LeafList):
+                    # min-elements values, at least one
+                    for v in distinct_values(generate, max(1, t.min_elements)):
+                        doc.add_leaf(k, t.module, v, t)
                 else:
-                    v = generate_random_value(args, schema, ctx.module, t, t.datatype)
-                doc.add_leaf(k, t.module, v)
+                    v = generate()
+                    if v is not MISSING:
+                        doc.add_leaf(k, t.module, v, t)
         else:
             raise Exception(f"Unhandled type {type(t)}")
 
 
-def output_default():
-    return '''\
-<?xml version="1.0" ?>
-<xml-root/>''', 'root', None
+#############################################################################################################
+#  Splice a regenerated subtree into existing config
+#############################################################################################################
+# With --splice only the subtree of --path is generated, with the ancestors
+# as with -p, and it replaces the same subtree in the existing config. The
+# subtree is located in both with the XML and JSON readers, which stop at its
+# end, and everything around it is copied from the existing config as is.
+
+class SpanFound(Exception):
+    pass
+
+
+class SpanReader:
+    """
+    Mixin of the config readers locating the subtree of the schema node target.
+    Nothing is replayed, the frames are only kept to look up the schema nodes.
+    """
+    def __init__(self, schema, input_file, target):
+        super().__init__(schema, input_file, report=lambda message: None)
+        self.target = target
+        self.span_start = None
+        self.span_end = None
+
+    def locate(self):
+        """The byte offsets of the start and end of the subtree, None when it isn't in the config."""
+        try:
+            self.replay(None)
+        except SpanFound:
+            pass
+        return (self.span_start, self.span_end) if self.span_end is not None else None
+
+    def begin(self, node):
+        self.frames.append(ReaderFrame(node, node.module or self.frames[-1].module, None))
+
+    def leaf(self, node, value):
+        pass
+
+    def end(self):
+        self.frames.pop()
 
+    def flush(self, frame):
+        pass
 
-def output_nso_device(name):
-    return f'''\
-<?xml version="1.0" ?>
-<config xmlns="http://tail-f.com/ns/config/1.0">
-    <devices xmlns="http://tail-f.com/ns/ncs">
-        <device>
-            <name>{name}</name>
-            <xml-root/>
-        </device>
-    </devices>
-</config>''', 'config', 'http://tail-f.com/ns/ncs'
 
+class XMLSpanReader(SpanReader, XMLReader):
+    """
+    The span of the elements of the target node, from the first start tag to
+    the end of the last end tag of consecutive list entries. The end of a tag
+    is the offset of the event following it.
+    """
+    buffer_text = False  # Text events at the offset where the text starts
+
+    def __init__(self, schema, input_file, target):
+        super().__init__(schema, input_file, target)
+        self.depth = 0  # Open elements of the subtree
+        self.closed = False  # The target was closed by the last event
+
+    def mark(self):
+        if self.closed:
+            self.span_end = self.parser.CurrentByteIndex
+            self.closed = False
+
+    def start_element(self, name, attrs):
+        self.mark()
+        super().start_element(name, attrs)
+        if self.span_end is not None:
+            raise SpanFound()  # Another member follows the subtree
+
+    def end_element(self, name):
+        self.mark()
+        if self.span_end is not None:
+            raise SpanFound()  # The parent of the subtree is closed
+        super().end_element(name)
+
+    def character_data(self, data):
+        self.mark()
+        super().character_data(data)
+
+    def begin(self, node):
+        if self.depth:
+            self.depth += 1
+        elif node is self.target:
+            if self.span_start is None:
+                self.span_start = self.parser.CurrentByteIndex
+            self.span_end = None  # Another list entry
+            self.depth = 1
+        super().begin(node)
+
+    def end(self):
+        super().end()
+        if self.depth:
+            self.depth -= 1
+            self.closed = not self.depth
+
+
+class JSONSpanReader(SpanReader, JSONReader):
+    """The span of the value of the member of the target node, the array of all entries of a list."""
+    encoding = 'latin-1'  # One character per byte, so offsets are byte offsets
+
+    def data_value(self, node):
+        if node is not self.target:
+            super().data_value(node)
+            return
+        self.tokens.peek()
+        self.span_start = self.tokens.start
+        super().data_value(node)
+        self.span_end = self.tokens.offset + self.tokens.pos
+        raise SpanFound()
+
+
+def copy_bytes(src, write, n=None):
+    """Copy n bytes, or the rest, of the binary file src with write, which is None to skip them."""
+    while n is None or n > 0:
+        data = src.read(OutputSink.buffer_size if n is None else min(n, OutputSink.buffer_size))
+        if not data:
+            break
+        if write is not None:
+            write(data)
+        if n is not None:
+            n -= len(data)
+
+
+def splice_target(args, schema):
+    """Check the arguments of --splice and return the schema node of the path."""
+    backend, _ = output_formats[args.format]
+    if not args.path:
+        print("ERROR: --splice requires --path.")
+        sys.exit(1)
+    if not issubclass(backend, (XMLBackend, JSONBackend)):
+        print("ERROR: --splice is only supported for XML and JSON formats.")
+        sys.exit(1)
+    if args.chunk_entries or args.chunk_size or args.target_size or args.target_elements:
+        print("ERROR: --splice can not be used with chunks or size targets.")
+        sys.exit(1)
+    if not os.path.exists(args.splice):
+        print(f"ERROR: {args.splice} not found.")
+        sys.exit(1)
+    node = find_kp(schema, str2kp(args.path))
+    if node is None:
+        print(f"Path {args.path} not found")
+        sys.exit(1)
+    parent = node.parent
+    while isinstance(parent, Container):
+        parent = parent.parent
+    if not isinstance(node, (Container, List)) or not isinstance(parent, Schema):
+        print("ERROR: The path of --splice must be a container or list with only containers above it.")
+        sys.exit(1)
+    return node
 
-def output_config():
-    return '''\
-<?xml version="1.0" ?>
-<xml-root/>''', 'config', "http://tail-f.com/ns/config/1.0"
 
+def splice_config(args, schema, generate):
+    """
+    Write the config of --splice with the subtree of --path replaced by the
+    one generate(doc) writes to the root backend doc, in the format of -f.
+    """
+    node = splice_target(args, schema)
+    fd, fragment = tempfile.mkstemp(prefix='splice-')
+    os.close(fd)
+    try:
+        sink = OutputSink(fragment)
+        output = prepare_output(args, schema, sink)
+        generate(output)
+        output.close_document()
+        sink.close()
+        splice_file(args, schema, node, fragment)
+    finally:
+        os.remove(fragment)
+
+
+def splice_file(args, schema, node, fragment):
+    """Write the config of --splice with the subtree of node replaced by the one in the config fragment."""
+    reader = XMLSpanReader if issubclass(output_formats[args.format][0], XMLBackend) else JSONSpanReader
+    with open_input(fragment) as f:
+        new = reader(schema, f, node).locate()
+    if new is None:
+        print(f"ERROR: {args.path} was not generated.")
+        sys.exit(1)
+    with open_input(args.splice) as f:
+        old = reader(schema, f, node).locate()
+    if old is None:
+        print(f"ERROR: {args.path} not found in {args.splice}, which must be in the format of -f.")
+        sys.exit(1)
+    in_place = args.output and os.path.abspath(args.output) == os.path.abspath(args.splice)
+    path = args.output + '.splice' if in_place else args.output
+    output_file = OutputSink(path, output_compression(args), binary=True)
+    with open_input(args.splice) as src, open_input(fragment) as f:
+        copy_bytes(src, output_file.write, old[0])
+        copy_bytes(f, None, new[0])
+        copy_bytes(f, output_file.write, new[1] - new[0])
+        copy_bytes(src, None, old[1] - old[0])
+        copy_bytes(src, output_file.write)
+    output_file.close()
+    if in_place:
+        os.replace(path, args.output)
 
-def prepare_output(args):
-    if args.format == 'nso-device':
-        fmt, rn, ns = output_nso_device(args.name)
-    elif args.format == 'tailf-config':
-        fmt, rn, ns = output_config()
-    else:  # default
-        fmt, rn, ns = output_default()
 
-    doc = ET.fromstring(fmt)
-    if doc.tag == 'xml-root':
-        xmlroot = doc
+#############################################################################################################
+#  Cache of generated config
+#############################################################################################################
+# With --cache the output of genconfig and rundesc is stored in <model>.cache,
+# keyed by a hash of the schema, the descriptor, the generator itself with
+# rstr and all options changing the output, the seed included. The checks
+# skipped, e.g. --no-check, are part of the key, so output generated without
+# them isn't served to runs with them. Repeated runs with the same inputs
+# copy the cached file without loading the schema. With --splice the
+# -p output of the subtree is cached and spliced into the existing config.
+OUTPUT_CACHE_VERSION = 1
+# Options not changing the generated config
+OUTPUT_CACHE_IGNORED = {'func', 'output', 'compress', 'splice', 'cache', 'cache_size', 'verbose'}
+
+
+def output_cache_entry(args, compress):
+    """The path of the cache entry of the output of args, compressed with compress."""
+    options = {k: v for k, v in vars(args).items() if k not in OUTPUT_CACHE_IGNORED}
+    rstr_dir = os.path.dirname(rstr.__file__)
+    generator = [file_digest(__file__)] + [file_digest(os.path.join(rstr_dir, f))
+                                           for f in sorted(os.listdir(rstr_dir)) if f.endswith('.py')]
+    options.update(compress=compress, model=file_digest(args.model), generator=generator)
+    if 'descriptor' in options:
+        options['descriptor'] = file_digest(args.descriptor)
+    key = json.dumps([OUTPUT_CACHE_VERSION, options], sort_keys=True)
+    digest = hashlib.sha1(key.encode()).hexdigest()[:16]
+    return os.path.join(os.path.splitext(args.model)[0] + '.cache', f'config-{digest}')
+
+
+def cached_output(args, compress, schema=None):
+    """
+    Return the path of the cached output of args, generated first when not
+    cached, or None when it can't be cached, e.g. in a read only directory.
+    """
+    entry = output_cache_entry(args, compress)
+    try:
+        os.utime(entry)  # Most recently used
+        return entry
+    except OSError:
+        pass
+    try:
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(entry))
+        os.close(fd)
+    except OSError:
+        return None
+    generate = copy.copy(args)
+    generate.output, generate.compress, generate.splice = tmp, compress, None
+    try:
+        try:
+            generate.func(generate, schema or read_schema(args.model))
+        except SystemExit as e:
+            if e.code:
+                raise
+        os.replace(tmp, entry)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return entry
+
+
+def evict_output_cache(cache_dir, limit):
+    """Remove the least recently used cached outputs until they take at most limit bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.startswith('config-'):
+            st = os.stat(os.path.join(cache_dir, name))
+            entries.append((st.st_mtime, st.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= limit:
+            break
+        os.remove(os.path.join(cache_dir, name))
+        total -= size
+
+
+def run_cached(args):
+    """Run genconfig or rundesc with --cache."""
+    if args.seed is None:
+        print("ERROR: --cache requires --seed.")
+        sys.exit(1)
+    if args.chunk_entries or args.chunk_size:
+        print("ERROR: --cache can not be used with chunked output.")
+        sys.exit(1)
+    if args.profile or args.profile_folded:
+        print("ERROR: --cache can not be used with --profile.")
+        sys.exit(1)
+    for path in (args.model, getattr(args, 'descriptor', None)):
+        if path and not os.path.exists(path):
+            print(f"ERROR: {path} not found.")
+            sys.exit(1)
+    if args.splice:
+        schema = read_schema(args.model)
+        node = splice_target(args, schema)
+        entry = cached_output(args, None, schema)
+        if entry is None:
+            args.func(args, schema)
+            return
+        splice_file(args, schema, node, entry)
     else:
-        fns = f'{{{ns}}}' if ns else ''
-        xmlroot = doc.find(f'.//{fns}xml-root')
-    if rn is not None:
-        xmlroot.tag = rn
-    if ns is not None:
-        xmlroot.attrib['xmlns'] = ns
+        entry = cached_output(args, output_compression(args))
+        if entry is None:
+            args.func(args, read_schema(args.model))
+            return
+        if args.output:
+            shutil.copyfile(entry, args.output)
+        else:
+            sys.stdout.flush()
+            with open(entry, 'rb') as f:
+                shutil.copyfileobj(f, sys.stdout.buffer)
+            sys.stdout.buffer.flush()
+    evict_output_cache(os.path.dirname(entry), args.cache_size)
+
+
+#############################################################################################################
+#  Decode binary output
+#############################################################################################################
+@subcommand([
+    argument("input",
+         type=str,
+         help="CBOR file to decode."
+    ),
+    argument('-f', '--format',
+        choices=[f for f, (backend, _) in output_formats.items() if not backend.binary],
+        default='default',
+        help="config output format"
+    ),
+    argument('-n', '--name',
+        type=str,
+        default='ce0',
+        help="Device name for output format nso-device"
+    ),
+    *output_file_arguments],
+    help="decode CBOR config"
+)
+def cmd_decode(args, schema):
+    """
+    Decode config created with the cbor output format to another output format.
+    The schema must be the same as when the config was generated.
+    """
+    output_file = open_output(args)
+    output = prepare_output(args, schema, output_file)
+    with open_input(args.input) as input_file:
+        CBORReader(schema, input_file).replay(output)
+    output.close_document()
+    output_file.close()
+
+
+#############################################################################################################
+#  Validate generated config
+#############################################################################################################
+@subcommand([
+    argument("inputs",
+         nargs='+',
+         metavar="input",
+         help="Config files to validate, XML, JSON or CBOR (also gzip or xz compressed)."
+    ),
+    argument("--max-errors",
+         type=int,
+         default=20,
+         help="Number of errors to print (default 20), all are counted."
+    ),
+    argument("--no-leafref-check",
+         action="store_true",
+         help="Do not check that the targets of leafrefs exist."
+    )],
+    help="validate generated config"
+)
+def cmd_validate(args, schema):
+    """
+    Validate generated config against the schema in one streaming pass:
+    datatypes with their ranges, lengths, patterns and enumerations, the
+    uniqueness of list keys, min-elements and max-elements, that leafs are
+    given once and, with a schema compiled with leafref targets,
+    that the targets of leafrefs (not non-strict leafrefs) exist. Files are
+    checked as parts of the same config, e.g. chunks, for the leafrefs.
+    """
+    for path in args.inputs:
+        if not os.path.isfile(path):
+            print(f"ERROR: {path} not found.")
+            sys.exit(1)
+    validation = Validation(args, schema)
+    for path in args.inputs:
+        with open_input(path) as input_file:
+            head = input_file.peek(len(CBOR_SELF_DESCRIBE) + 64)[:64].lstrip()
+            if head.startswith(CBOR_SELF_DESCRIBE):
+                reader = CBORReader(schema, input_file)
+            elif head.startswith(b'<'):
+                reader = XMLReader(schema, input_file, validation.error)
+            elif head.startswith(b'{'):
+                reader = JSONReader(schema, input_file, validation.error)
+            else:
+                print(f"ERROR: {path} is not XML, JSON or CBOR config.")
+                sys.exit(1)
+            validation.start(path, reader)
+            try:
+                reader.replay(ValidateBackend(schema, validation, 0))
+                if not reader.failed:
+                    validation.close(0)
+            except (expat.ExpatError, ValueError, EOFError) as e:
+                # Invalid XML, JSON or CBOR, the reader can't continue
+                validation.error(f"{e}, the rest of the file is not validated")
+    validation.finish()
+    print(f"{validation.values} values, {validation.entries} list entries, {validation.errors} errors")
+    if validation.errors:
+        sys.exit(1)
+
+
+class ValidateFrame:
+    """An open object of the validated config."""
+    __slots__ = ('node', 'keys', 'counts', 'values', 'unique')
+
+    def __init__(self, node, keys=()):
+        self.node = node
+        self.keys = {}  # Keys of the entries of each list
+        self.counts = dict.fromkeys(keys, 1)  # Values of the leafs and leaf-lists and entries of the lists
+        self.values = None  # Values of the leafs in unique statements of a list entry
+        self.unique = None  # Values of the unique statements of the entries of each list
+
+
+class Validation:
+    """State of a validation: errors, the list keys of open objects and the leafref index."""
+    def __init__(self, args, schema):
+        self.args = args
+        self.schema = schema
+        self.errors = 0
+        self.values = 0
+        self.entries = 0
+        self.path = None
+        self.reader = None
+        self.frames = []  # ValidateFrame of each open object
+        self.checkers = {}  # Value checkers per schema node
+        self.required = {}  # Lists and leaf-lists with min-elements per schema node, not in choices or with when
+        self.check_min_elements = len(args.inputs) == 1  # Not for chunks, the entries may be in other files
+        # Values of the leafref targets, and the leafrefs to targets not seen (yet)
+        self.targets = {}
+        self.leafrefs = {}
+        self.strict = {}  # Strict leafrefs per schema node
+        if not args.no_leafref_check:
+            self.index_leafrefs(schema)
+        self.uniques = {}  # Paths and leafs of the unique statements per list
+        self.unique_leafs = {}  # The list of each leaf in a unique statement
+        self.index_uniques(schema)
+
+    def index_leafrefs(self, node):
+        for ch in node.data_children().values():
+            if isinstance(ch, HasChildren):
+                self.index_leafrefs(ch)
+            elif ch.leafref_target is not None and 'leafref' in base_types(self.schema, ch.datatype):
+                self.targets.setdefault(ch.leafref_target, set())
+                self.strict[ch] = ch.leafref_target
+
+    def index_uniques(self, node):
+        for ch in node.data_children().values():
+            if isinstance(ch, HasChildren):
+                self.index_uniques(ch)
+            if isinstance(ch, List) and ch.unique:
+                for paths in ch.unique:
+                    leafs = [unique_leaf(ch, path) for path in paths]
+                    if None in leafs:
+                        continue  # Not in the schema e.g. a deviated leaf
+                    self.uniques.setdefault(ch, []).append((paths, leafs))
+                    self.unique_leafs.update(dict.fromkeys(leafs, ch))
+
+    def start(self, path, reader):
+        self.path = path
+        self.reader = reader
+        self.frames = [ValidateFrame(self.schema)]
+
+    def open(self, node, keys=()):
+        self.frames.append(ValidateFrame(node, keys))
+
+    def close(self, depth):
+        """Close the objects below depth, checking the min-elements of their members."""
+        while len(self.frames) > depth:
+            frame = self.frames.pop()
+            uniques = self.uniques.get(frame.node)
+            if uniques is not None:
+                self.check_unique(frame, uniques)
+            if not self.check_min_elements:
+                continue
+            required = self.required.get(frame.node)
+            if required is None:
+                required = self.required[frame.node] = [
+                    ch for ch in frame.node.children.values()
+                    if isinstance(ch, (List, LeafList)) and ch.min_elements and not ch.when]
+            for ch in required:
+                n = frame.counts.get(ch, 0)
+                if n < ch.min_elements:
+                    self.error(f"{kp2str(ch.get_kp)}: min-elements is {ch.min_elements}, got {n}")
+
+    def check_unique(self, frame, uniques):
+        """Check the unique statements of a closed list entry against the other entries of the list."""
+        values = frame.values or {}
+        parent = self.frames[-1]
+        if parent.unique is None:
+            parent.unique = {}
+        for i, (paths, leafs) in enumerate(uniques):
+            value = tuple(values.get(leaf, leaf.default) for leaf in leafs)
+            if None in value:
+                continue  # Only entries with all the leafs, or their defaults
+            value = tuple(map(str, value))
+            seen = parent.unique.setdefault((frame.node, i), set())
+            if value in seen:
+                self.error(f"{kp2str(frame.node.get_kp)}: unique {' '.join(paths)} "
+                           f"{' '.join(value)} in more than one entry")
+            else:
+                seen.add(value)
+
+    def count(self, node):
+        """Count a member of the current object, checking max-elements and that leafs appear once."""
+        counts = self.frames[-1].counts
+        n = counts[node] = counts.get(node, 0) + 1
+        if n == 1 or n != getattr(node, 'max_elements', 1) + 1:
+            return
+        if isinstance(node, (List, LeafList)):
+            self.error(f"{kp2str(node.get_kp)}: more {'entries' if isinstance(node, List) else 'values'} "
+                       f"than max-elements {node.max_elements}")
+        else:
+            self.error(f"{kp2str(node.get_kp)}: leaf given more than once")
+
+    def error(self, message, where=None):
+        self.errors += 1
+        if self.errors <= self.args.max_errors:
+            where = where or (self.reader.position() if self.reader else '')
+            print(f"ERROR: {self.path} {where}: {message}")
+
+    def check(self, node, value):
+        self.values += 1
+        checker = self.checkers.get(node)
+        if checker is None:
+            checker = self.checkers[node] = value_checker(self.schema, node.datatype)
+        error = checker(value)
+        if error:
+            self.error(f"{kp2str(node.get_kp)}: {error}")
+        if node in self.targets:
+            self.targets[node].add(value)
+        target = self.strict.get(node)
+        if target is not None and value not in self.targets[target]:
+            self.leafrefs.setdefault((target, value), (node, self.path, self.reader.position()))
+        lst = self.unique_leafs.get(node)
+        if lst is not None:
+            # Kept on the innermost entry of the list, the leaf can be in containers of it
+            for frame in reversed(self.frames):
+                if frame.node is lst:
+                    if frame.values is None:
+                        frame.values = {}
+                    frame.values[node] = value
+                    break
+
+    def finish(self):
+        self.reader = None
+        for (target, value), (node, path, where) in self.leafrefs.items():
+            if value not in self.targets[target]:
+                self.path = path
+                self.error(f"{kp2str(node.get_kp)}: leafref target {kp2str(target.get_kp)} {value!r} does not exist",
+                           where)
+
+
+class ValidateBackend(OutputBackend):
+    """
+    Backend checking the config replayed into it. As in StreamBackend, an
+    object is done when a member is added to an enclosing object, and the
+    keys of its lists are dropped, so memory is bounded by the depth and the
+    entries of the open lists.
+    """
+    def __init__(self, schema, validation, depth):
+        super().__init__(schema)
+        self.validation = validation
+        self.depth = depth
+
+    def member(self):
+        self.validation.close(self.depth + 1)
+
+    def add_container(self, name, module, node=None):
+        self.member()
+        self.validation.open(node)
+        return ValidateBackend(self.schema, self.validation, self.depth + 1)
+
+    def add_list_entry(self, name, module, keys, values, node=None):
+        self.member()
+        validation = self.validation
+        validation.entries += 1
+        validation.count(node)
+        seen = validation.frames[-1].keys.setdefault(node, set())
+        values = tuple(values)
+        if None in values:
+            missing = [k for k, v in zip(keys, values) if v is None]
+            validation.error(f"{kp2str(node.get_kp)}: missing key {', '.join(missing)}")
+        elif values in seen:
+            validation.error(f"{kp2str(node.get_kp)}: duplicate entry {' '.join(values)}")
+        else:
+            seen.add(values)
+        validation.open(node, [node.children[k] for k, v in zip(keys, values) if v is not None])
+        for k, v in zip(keys, values):
+            if v is not None:
+                validation.check(node.children[k], v)
+        return ValidateBackend(self.schema, validation, self.depth + 1)
 
-    return doc, xmlroot
+    def add_leaf(self, name, module, value, node=None):
+        self.member()
+        self.validation.count(node)
+        self.validation.check(node, value)
 
 
 ###########################################################################
@@ -1113,6 +4220,28 @@ def print_levels(schema, kp):
     argument("-p", "--patterns",
              action="store_true",
              help="Show patterns"
+             ),
+    argument("--use-unaltered-patterns",
+             action="store_true",
+             help="Estimate list key spaces with unaltered patterns."
+             ),
+    argument("--no-cache",
+             action="store_true",
+             help="Analyze the schema again instead of using the cached result."
+             ),
+    argument("-e", "--estimate",
+             action="store_true",
+             help="Estimate the config size and generation time"
+             ),
+    argument("-i", "--instances",
+             action="append",
+             default=[],
+             help="List instances for --estimate: N for all lists or PATH=N for one list, may be repeated"
+             ),
+    argument("-f", "--format",
+             choices=list(output_formats),
+             default='default',
+             help="Output format for --estimate"
              )],
     help="model complexity analysis"
 )
@@ -1121,13 +4250,16 @@ def cmd_complex(args, schema):
     Show the schema model complexity in terms of nested lists, choices, leaf concentrations,
     when/must expressions and leafrefs.
     """
-    if not (args.lists or args.ns_leafrefs or args.leafrefs or args.whens or args.musts or args.patterns):
-        args.lists = args.ns_leafrefs = args.leafrefs = args.whens = args.musts = args.patterns = True
+    tables = args.lists or args.ns_leafrefs or args.leafrefs or args.whens or args.musts or args.patterns
+    if not (tables or args.estimate):
+        args.lists = args.ns_leafrefs = args.leafrefs = args.whens = args.musts = args.patterns = tables = True
     if args.rich:
         from rich.console import Console
         from rich.table import Table
         console = Console()
-    ctx = collect_schema_complexity(args, schema, schema)
+    if tables:
+        ctx = collect_schema_complexity(args)
+        rows = [row[:5] for row in ctx.lists if not (args.hide_choice and row[5] in ('choice', 'case'))]
     if args.lists:
         print()
         if args.rich:
@@ -1135,29 +4267,30 @@ def cmd_complex(args, schema):
             table.add_column("List", justify="left", no_wrap=True)
             table.add_column("Keys", justify="left", no_wrap=True)
             table.add_column("No leafs", justify="right", no_wrap=True)
-            for indent, kp, keys, count in ctx.lists:
-                table.add_row(f"{' ' * (indent * 4)}{kp}", f'{keys}', f'{count}')
+            table.add_column("Key space", justify="right", no_wrap=True)
+            for indent, kp, keys, count, keyspace in rows:
+                table.add_row(f"{' ' * (indent * 4)}{kp}", f'{keys}', f'{count}', keyspace)
             console.print(table)
         else:
             print("=== Lists ===")
             print()
-            for indent, kp, keys, count in ctx.lists:
+            for indent, kp, keys, count, keyspace in rows:
                 strkp = f"{' ' * (indent * 4)}{kp}"
-                print(f"{strkp:<120}", f'{keys:<20}', f'{count:>5}')
+                print(f"{strkp:<120}", f'{keys:<20}', f'{count:>5}', f'{keyspace:>10}')
     if args.ns_leafrefs:
         print()
         if args.rich:
             nslf_table = Table()
             nslf_table.add_column("Non-strict leafref", justify="left", no_wrap=True)
             nslf_table.add_column("Path", justify="left", no_wrap=True)
-            for lf in ctx.ns_leafrefs:
-                nslf_table.add_row(kp2str(lf.get_kp), lf.datatype[1])
+            for kp, path in ctx.ns_leafrefs:
+                nslf_table.add_row(kp, path)
             console.print(nslf_table)
         else:
             print("=== Non-strict Leafrefs ===")
             print()
-            for lf in ctx.ns_leafrefs:
-                print(f'{kp2str(lf.get_kp):<120} {lf.datatype[1]}')
+            for kp, path in ctx.ns_leafrefs:
+                print(f'{kp:<120} {path}')
 
     if args.leafrefs:
         print()
@@ -1165,42 +4298,42 @@ def cmd_complex(args, schema):
             lf_table = Table()
             lf_table.add_column("Leafref", justify="left", no_wrap=True)
             lf_table.add_column("Path", justify="left", no_wrap=True)
-            for lf in ctx.leafrefs:
-                lf_table.add_row(kp2str(lf.get_kp), lf.datatype[1])
+            for kp, path in ctx.leafrefs:
+                lf_table.add_row(kp, path)
             console.print(lf_table)
         else:
             print("=== Leafrefs ===")
             print()
-            for lf in ctx.leafrefs:
-                print(f'{kp2str(lf.get_kp):<120} {lf.datatype[1]}')
+            for kp, path in ctx.leafrefs:
+                print(f'{kp:<120} {path}')
     if args.whens:
         print()
         if args.rich:
             w_table = Table()
             w_table.add_column("When", justify="left", no_wrap=True)
             w_table.add_column("Xpath", justify="left", no_wrap=True)
-            for w in ctx.whens:
-                w_table.add_row(kp2str(w.get_kp), w.when)
+            for kp, when in ctx.whens:
+                w_table.add_row(kp, when)
             console.print(w_table)
         else:
             print("=== When statements ===")
             print()
-            for w in ctx.whens:
-                print(f"{kp2str(w.get_kp):<120} {w.when}")
+            for kp, when in ctx.whens:
+                print(f"{kp:<120} {when}")
     if args.musts:
         print()
         if args.rich:
             m_table = Table()
             m_table.add_column("Must", justify="left", no_wrap=True)
             m_table.add_column("Xpath", justify="left", no_wrap=True)
-            for m in ctx.musts:
-                m_table.add_row(kp2str(m.get_kp), m.must)
+            for kp, must in ctx.musts:
+                m_table.add_row(kp, must)
             console.print(m_table)
         else:
             print("=== Must statements ===")
             print()
-            for w in ctx.whens:
-                print(f"{kp2str(w.get_kp):<120} {w.when}")
+            for kp, must in ctx.musts:
+                print(f"{kp:<120} {must}")
     if args.patterns:
         print()
         if args.rich:
@@ -1209,125 +4342,403 @@ def cmd_complex(args, schema):
             p_table.add_column("Count", justify="right", no_wrap=True)
             p_table.add_column("Min", justify="right", no_wrap=True)
             p_table.add_column("Max", justify="right", no_wrap=True)
-            for pattern, count in ctx.patterns.items():
-                strpattern = f'"{pattern}"'
-                if pattern:
-                    mi, ma = rstr.xeger_minmax(pattern)
-                else:
-                    pattern = "(string)"
-                    mi = 0
-                    ma = sre_parse.MAXREPEAT
+            for pattern, (count, mi, ma) in ctx.patterns.items():
+                pattern = pattern or "(string)"
                 p_table.add_row(pattern, str(count), str(mi), str(ma))
             console.print(p_table)
         else:
             print("=== Patterns ===")
             print()
-            for pattern, count in ctx.patterns.items():
+            for pattern, (count, mi, ma) in ctx.patterns.items():
                 strpattern = f'"{pattern}"'
-                if pattern:
-                    mi, ma = rstr.xeger_minmax(pattern)
-                else:
-                    pattern = "(string)"
-                    mi = 0
-                    ma = sre_parse.MAXREPEAT
                 print(f"{strpattern:<120} {count:>6} {mi:>4} - {ma:>6}")
+    if args.estimate:
+        est = estimate_config(args, read_schema(args.model))
+        print()
+        if args.rich:
+            s_table = Table()
+            s_table.add_column(f"Estimate ({args.format})", justify="left", no_wrap=True)
+            s_table.add_column("Elements", justify="right", no_wrap=True)
+            s_table.add_column("Size", justify="right", no_wrap=True)
+            s_table.add_column("Seconds", justify="right", no_wrap=True)
+            s_table.add_row("Total", f"{est.elements:.0f}", format_size(est.bytes), f"{est.seconds:.2f}")
+            for kp, n, elements, size, seconds in est.lists:
+                s_table.add_row(f"{kp} ({n})", f"{elements:.0f}", format_size(size), f"{seconds:.2f}")
+            console.print(s_table)
+            c_table = Table()
+            c_table.add_column("Cost class", justify="left", no_wrap=True)
+            c_table.add_column("Values", justify="right", no_wrap=True)
+            c_table.add_column("us/value", justify="right", no_wrap=True)
+            c_table.add_column("Length", justify="right", no_wrap=True)
+            c_table.add_column("Seconds", justify="right", no_wrap=True)
+            for cls, (values, seconds, length) in est.classes.items():
+                c_table.add_row(cls, f"{values:.0f}", f"{seconds / values * 1e6:.1f}", f"{length / values:.1f}",
+                                f"{seconds:.2f}")
+            console.print(c_table)
+        else:
+            print(f"=== Estimate ({args.format}) ===")
+            print()
+            print(f"{'Total':<120} {est.elements:>12.0f} {format_size(est.bytes):>10} {est.seconds:>10.2f} s")
+            for kp, n, elements, size, seconds in est.lists:
+                print(f"{kp + f' ({n})':<120} {elements:>12.0f} {format_size(size):>10} {seconds:>10.2f} s")
+            print()
+            print(f"{'Cost class':<20} {'Values':>12} {'us/value':>10} {'Length':>8} {'Seconds':>10}")
+            for cls, (values, seconds, length) in est.classes.items():
+                print(f"{cls:<20} {values:>12.0f} {seconds / values * 1e6:>10.1f} {length / values:>8.1f} "
+                      f"{seconds:>10.2f}")
     exit(0)
 
 
-def collect_schema_complexity(args, schema, node, indent=0, ctx=None):
-    root = ctx is None
-    if indent == 0:
-        if args.path:
-            kp = str2kp(args.path)
-            node = find_kp(node, kp)
-            if node is None:
-                print(f"Path {args.path} not found")
-                sys.exit(1)
-            else:
-                indent = len(kp)
-    if ctx is None:
-        ctx = ComplexContext()
-        cnt = count_leafs(args, node, ctx)
-        ctx.lists.append((0, kp2str(node.get_kp), '', cnt))
+COMPLEX_CACHE_VERSION = 1
+
+
+def collect_schema_complexity(args):
+    """
+    Return the ComplexContext of the schema, or of the subtree at --path.
+    Results are cached in <model>.cache/complex-<hash>.json, keyed by a hash
+    of the schema file and by the options changing the analysis. The schema
+    is only loaded when the result isn't cached.
+    """
+    with open(args.model, 'rb') as f:
+        digest = hashlib.sha1(f.read() + bytes([COMPLEX_CACHE_VERSION])).hexdigest()[:16]
+    cache_dir = os.path.splitext(args.model)[0] + '.cache'
+    cache = os.path.join(cache_dir, f'complex-{digest}.json')
+    key = f'{args.path or "/"}|{int(args.one_level)}|{int(args.use_unaltered_patterns)}'
+    try:
+        with open(cache) as f:
+            results = json.load(f)
+    except (OSError, ValueError):
+        results = {}
+    ctx = ComplexContext()
+    if key in results and not args.no_cache:
+        ctx.__dict__.update(results[key])
+        return ctx
+    schema = node = read_schema(args.model)
+    indent = 0
+    if args.path:
+        kp = str2kp(args.path)
+        node = find_kp(node, kp)
+        if node is None:
+            print(f"Path {args.path} not found")
+            sys.exit(1)
+        indent = len(kp)
+    root = [0, kp2str(node.get_kp), '', 0, '', 'root']
+    ctx.lists.append(root)
+    root[3] = analyze_complexity(args, schema, node, indent, ctx, {})
+    for pattern, stats in ctx.patterns.items():
+        length = schema.pattern(pattern).length if pattern else None
+        stats += length or (0, sre_parse.MAXREPEAT)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in os.listdir(cache_dir):
+            if old.startswith('complex-') and old != os.path.basename(cache):
+                os.remove(os.path.join(cache_dir, old))
+        results[key] = vars(ctx)
+        with open(cache + '.tmp', 'w') as f:
+            json.dump(results, f)
+        os.replace(cache + '.tmp', cache)
+    except OSError:
+        pass  # Not cached, e.g. read only directory
+    return ctx
+
+
+def analyze_complexity(args, schema, node, indent, ctx, typedef_patterns, record=True):
+    """
+    Collect the complexity of the children of node in one bottom-up pass.
+    Returns the number of leafs of node, leafs of containers included but
+    not of lists and choices, which get rows of their own. With record False
+    (below --one-level) only the leafs are counted.
+    """
+    cnt = 0
     for k, t in node:
         if args.verbose:
             print(f'Processing {kp2str(t.get_kp)}')
-        if t.when:
-            ctx.whens.append(t)
-        if t.must:
-            ctx.musts.append(t)
+        if record and t.when:
+            ctx.whens.append((kp2str(t.get_kp), t.when))
+        if record and t.must:
+            ctx.musts.append((kp2str(t.get_kp), t.must))
         if isinstance(t, Container):
-            if not args.one_level:
-                collect_schema_complexity(args, schema, t, indent=indent, ctx=ctx)
+            cnt += analyze_complexity(args, schema, t, indent, ctx, typedef_patterns, record and not args.one_level)
         elif isinstance(t, List):
-            cnt = count_leafs(args, t, ctx)
-            keys = ','.join(t.key_leafs)
-            kp = kp2str(t.get_kp2level(), starting_slash=False)
-            ctx.lists.append((indent, kp, keys, cnt))
-            if not args.one_level:
-                collect_schema_complexity(args, schema, t, indent=indent + 1, ctx=ctx)
+            if record:
+                kp = kp2str(t.get_kp2level(), starting_slash=False)
+                keyspace = format_cardinality(list_keyspace(args, schema, t))
+                row = [indent, kp, ','.join(t.key_leafs), 0, keyspace, 'list']
+                ctx.lists.append(row)
+                row[3] = analyze_complexity(args, schema, t, indent + 1, ctx, typedef_patterns, not args.one_level)
         elif isinstance(t, Choice):
-            # Only print container or list choices
-            kp = kp2str(t.get_kp2level(), starting_slash=False)
-            if not args.hide_choice:
-                ctx.lists.append((indent, f'{kp} (choice)', '', ''))
-            for k2 in t.choices.keys():
-                m = t[k2]
-                cnt = count_leafs(args, m.items(), ctx)
-                if not args.hide_choice:
-                    ctx.lists.append((indent+1, f'{k2} (case)', '', cnt))
-                collect_schema_complexity(args, schema, m.items(), indent=indent + 2, ctx=ctx)
+            if record:
+                kp = kp2str(t.get_kp2level(), starting_slash=False)
+                ctx.lists.append([indent, f'{kp} (choice)', '', '', '', 'choice'])
+                for k2 in t.choices.keys():
+                    row = [indent + 1, f'{k2} (case)', '', 0, '', 'case']
+                    ctx.lists.append(row)
+                    row[3] = analyze_complexity(args, schema, t[k2].items(), indent + 2, ctx, typedef_patterns)
         elif isinstance(t, Leaf):
-            dt, meta = t.datatype
-            if dt == 'leafref':
-                ctx.leafrefs.append(t)
-            elif dt == 'ns-leafref':
-                ctx.ns_leafrefs.append(t)
-            collect_patterns(schema, ctx, t.datatype)
-    if root:
-        return ctx
+            cnt += 1
+            if record:
+                dt, meta = t.datatype
+                if dt == 'leafref':
+                    ctx.leafrefs.append((kp2str(t.get_kp), meta))
+                elif dt == 'ns-leafref':
+                    ctx.ns_leafrefs.append((kp2str(t.get_kp), meta))
+                for pattern in datatype_patterns(schema, t.datatype, typedef_patterns):
+                    if pattern in ctx.patterns:
+                        ctx.patterns[pattern][0] += 1
+                    else:
+                        ctx.patterns[pattern] = [1]
+    return cnt
 
 
-def collect_patterns(schema, ctx, datatype):
-    def inc_pattern(pattern):
-        if not pattern in ctx.patterns:
-            ctx.patterns[pattern] = 1
-        else:
-            ctx.patterns[pattern] += 1
-    typedefs = schema.json['typedefs']
+def datatype_patterns(schema, datatype, typedef_patterns):
+    """Return the patterns of a datatype, "" for strings without patterns. Typedefs are resolved once."""
     dt, r = datatype
     if dt == 'string':
         _lengths, patterns = r
-        if patterns:
-            for pattern in patterns:
-                inc_pattern(pattern)
-        else:
-            inc_pattern("")
+        return patterns or [""]
     elif dt == 'typedef':
-        collect_patterns(schema, ctx, typedefs[r])
+        if r not in typedef_patterns:
+            typedef_patterns[r] = datatype_patterns(schema, schema.json['typedefs'][r], typedef_patterns)
+        return typedef_patterns[r]
     elif dt == 'union':
-        for case in r:
-            collect_patterns(schema, ctx, case)
-
-
-def count_leafs(args, ch, ctx):
-    cnt = 0
-    for k, t in ch:
-        if isinstance(t, Container):
-            cnt += count_leafs(args, t, ctx)
-        elif isinstance(t, Leaf):
-            cnt += 1
-    return cnt
+        return [p for case in r for p in datatype_patterns(schema, case, typedef_patterns)]
+    return []
 
 
 class ComplexContext:
     def __init__(self):
-        self.lists =[]
-        self.ns_leafrefs = []
+        self.lists = []  # [indent, path, keys, leaf count, key space, kind]
+        self.ns_leafrefs = []  # (path, leafref path)
         self.leafrefs = []
-        self.whens = []
+        self.whens = []  # (path, xpath)
         self.musts = []
-        self.patterns = {}
+        self.patterns = {}  # pattern: [count, min length, max length]
+
+
+#### Size and generation cost estimate
+
+ESTIMATE_SAMPLES = 3  # Values generated per datatype to calibrate the generation cost
+
+
+def format_size(n):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024 or unit == 'GB':
+            return f'{n:.0f} {unit}' if unit == 'B' else f'{n:.1f} {unit}'
+        n /= 1024
+
+
+def cost_class(args, schema, datatype):
+    """Classify a datatype by the generator function producing its values."""
+    dt, r = datatype
+    if not args.use_unaltered_patterns and dt in random_datatype:
+        return 'custom'
+    elif dt == 'typedef':
+        if not args.use_unaltered_patterns and r in random_datatype:
+            return 'custom'
+        return cost_class(args, schema, schema.json['typedefs'][r])
+    elif dt == 'string':
+        return 'pattern' if r[1] else 'string'
+    elif dt in ilimits:
+        return 'integer'
+    elif dt in ['leafref', 'ns-leafref']:
+        return 'leafref'
+    elif dt in ['boolean', 'enumeration', 'empty', 'identityref']:
+        return 'enumeration'
+    return dt
+
+
+def backend_costs(args):
+    """
+    Micro-benchmark the backend of --format with a synthetic schema. Returns
+    the bytes of a leaf and of a container (fixed, per character of the name,
+    per level of nesting), excluding the value, and the seconds per element.
+    """
+    n, long = 200, 'a' * 16
+    leafs = {name: ['leaf', ['', ''], ['string', [[], []]]] for name in ['a', long]}
+    objects = {name: ['container', ['', ''], {'a': leafs['a']}] for name in ['o', 'o' * 16]}
+    tree = {**leafs, **objects}
+    for _ in range(5):
+        tree = {'c': ['container', ['', ''], {**leafs, **objects, **tree}]}
+    schema = Schema({'modules': {'m': ['m', 'urn:m']}, 'typedefs': {}, 'identities': {}, 'tree': {'m:c': tree['c']}})
+    backend, envelope = output_formats[args.format]
+    probe_args = type(args)(**{**vars(args), 'name': 'ce0'})
+
+    def run(depth, name=None):
+        """Bytes of a document with n leafs or containers with a leaf at depth, and the seconds of each."""
+        sink = OutputSink(os.devnull, None, backend.binary)
+        doc = backend.open_document(probe_args, schema, sink, envelope)
+        node = schema
+        for i in range(depth):
+            node = node.children['m:c' if i == 0 else 'c']
+            doc = doc.add_container(node.name, 'm' if i == 0 else None, node)
+        start = time.perf_counter()
+        if name in leafs:
+            for _ in range(n):
+                doc.add_leaf(name, None, 'x', node.children[name])
+        elif name in objects:
+            for _ in range(n):
+                o = node.children[name]
+                doc.add_container(name, None, o).add_leaf('a', None, 'x', o.children['a'])
+        elapsed = time.perf_counter() - start
+        doc.close_document()
+        sink.close()
+        return sink.total_bytes, elapsed / n
+
+    base = {depth: run(depth)[0] for depth in [1, 5]}
+
+    def per_element(depth, name):
+        return (run(depth, name)[0] - base[depth]) / n - 1  # Without the value 'x'
+
+    leaf = per_element(1, 'a')
+    leaf_char = (per_element(1, long) - leaf) / 15
+    leaf_depth = (per_element(5, 'a') - leaf) / 4
+    obj = per_element(1, 'o') - (leaf + leaf_depth)
+    obj_char = (per_element(1, 'o' * 16) - (leaf + leaf_depth) - obj) / 15
+    obj_depth = (per_element(5, 'o') - (leaf + 5 * leaf_depth) - obj) / 4
+    seconds = run(1, 'a')[1]
+    return ((leaf - leaf_char - leaf_depth, leaf_char, leaf_depth),
+            (obj - obj_char - obj_depth, obj_char, obj_depth), seconds)
+
+
+class Estimate:
+    """
+    Expected elements, bytes and generation time of the config, for the list
+    instance counts of --instances. The cost of generating a value is
+    measured for every datatype, by generating a few values with the actual
+    generator functions.
+    """
+    def __init__(self, args, schema, instances, default_instances):
+        self.args = args
+        self.schema = schema
+        self.instances = instances  # Instances of lists by id
+        self.default_instances = default_instances
+        self.leaf_bytes, self.object_bytes, self.element_seconds = backend_costs(args)
+        self.values = {}  # Datatype: (cost class, seconds, length) of a value
+        self.elements = 0
+        self.bytes = 0
+        self.seconds = 0
+        self.classes = {}  # Cost class: [values, seconds, bytes of values]
+        self.lists = []  # (path, instances, elements, bytes, seconds) of the outermost lists
+
+    def add_object(self, name, depth, weight):
+        fixed, per_char, per_depth = self.object_bytes
+        self.bytes += weight * (fixed + per_char * len(name) + per_depth * depth)
+        self.seconds += weight * self.element_seconds
+
+    def add_leaf(self, node, module, depth, weight):
+        cls, seconds, length = self.leaf_cost(node, module)
+        fixed, per_char, per_depth = self.leaf_bytes
+        self.elements += weight
+        self.bytes += weight * (fixed + per_char * len(node.name) + per_depth * depth + length)
+        self.seconds += weight * (seconds + self.element_seconds)
+        c = self.classes.setdefault(cls, [0, 0, 0])
+        c[0] += weight
+        c[1] += weight * seconds
+        c[2] += weight * length
+
+    def leaf_cost(self, node, module):
+        """
+        Return the cost class, seconds and length of a value of the leaf. A
+        leafref costs resolving the path and a value of the key leaf it
+        refers to, like in f_random_leafref.
+        """
+        dt, r = node.datatype
+        if dt not in ['leafref', 'ns-leafref']:
+            key = repr(node.datatype)
+            if key not in self.values:
+                self.values[key] = self.value_cost(node, module)
+            return self.values[key]
+        start = time.perf_counter()
+        try:
+            n = leafref_target(self.schema, module, node, r)
+        except Exception:
+            n = None
+        if n is None:
+            return 'leafref', 0, 0  # Unresolvable leafrefs are not generated
+        seconds = time.perf_counter() - start
+        if isinstance(n.parent, List) and n.name in n.parent.key_leafs:
+            _, value_seconds, length = self.leaf_cost(n, module)
+            return 'leafref', seconds + value_seconds, length
+        return 'leafref', seconds, 0
+
+    def value_cost(self, node, module):
+        args, schema = self.args, self.schema
+        length = 0
+        samples = 0
+        start = time.perf_counter()
+        try:
+            for _ in range(ESTIMATE_SAMPLES):
+                v = generate_random_value(args, schema, module, node, node.datatype)
+                length += len(str(v)) if v is not None else 0
+                samples += 1
+        except NotImplementedError:
+            pass  # Datatypes without a generator function are counted as free
+        seconds = time.perf_counter() - start
+        if not samples:
+            return cost_class(args, schema, node.datatype), 0, 0
+        return cost_class(args, schema, node.datatype), seconds / samples, length / samples
+
+
+def estimate_config(args, schema):
+    """Return the Estimate of the config of the schema, or of the subtree at --path."""
+    instances = {}
+    default_instances = 1
+    for value in args.instances:
+        path, _, n = value.rpartition('=')
+        try:
+            n = int(n)
+        except ValueError:
+            print(f"ERROR: Invalid --instances {value}, N or PATH=N expected.")
+            sys.exit(1)
+        if not path:
+            default_instances = n
+            continue
+        node = find_kp(schema, str2kp(path))
+        if not isinstance(node, List):
+            print(f"ERROR: List {path} not found.")
+            sys.exit(1)
+        instances[id(node)] = n
+    est = Estimate(args, schema, instances, default_instances)
+    node, depth = schema, 1
+    if args.path:
+        kp = str2kp(args.path)
+        node = find_kp(schema, kp)
+        if node is None:
+            print(f"Path {args.path} not found")
+            sys.exit(1)
+        for i in range(len(kp)):
+            est.add_object(kp[i][1], i + 1, 1)
+        depth = len(kp) + 1
+    module = node.module
+    parent = node.parent if isinstance(node, Node) else None
+    while not module and isinstance(parent, Node):
+        module, parent = parent.module, parent.parent
+    estimate_members(est, node, module, depth, 1, True)
+    return est
+
+
+def estimate_members(est, node, module, depth, weight, outermost):
+    for k, t in node:
+        m = t.module or module
+        if isinstance(t, Container):
+            est.add_object(t.name, depth, weight)
+            estimate_members(est, t, m, depth + 1, weight, outermost)
+        elif isinstance(t, List):
+            n = est.instances.get(id(t), max(est.default_instances, t.min_elements))
+            before = est.elements, est.bytes, est.seconds
+            est.add_object(t.name, depth, weight * n)
+            estimate_members(est, t, m, depth + 1, weight * n, False)
+            if outermost:
+                est.lists.append((kp2str(t.get_kp), n, est.elements - before[0], est.bytes - before[1],
+                                  est.seconds - before[2]))
+        elif isinstance(t, Choice):
+            # Each case is chosen with the same probability
+            for case in t.choices:
+                estimate_members(est, t[case].items(), m, depth, weight / len(t.choices), outermost)
+        elif isinstance(t, LeafList):
+            est.add_leaf(t, m, depth, weight * max(1, t.min_elements))
+        elif isinstance(t, Leaf):
+            est.add_leaf(t, m, depth, weight)
 
 
 #############################################################################################################
@@ -1338,17 +4749,85 @@ class ComplexContext:
 #  - No specification of number of list elements.
 #  - No leafs are specified.
 #
-@subcommand(
+@subcommand([
+    argument('-f', '--format',
+        choices=['python', 'json', 'yaml'],
+        default='python',
+        help="descriptor format"
+    )],
     help="generate config descriptor"
 )
 def cmd_gendesc(args, schema):
     """
-    Generates a Python config generator descriptor and print on stdout.
+    Generates a config generator descriptor and print on stdout.
     Currently, it includes:
      - Lists with key leafs as a comment.
      - Containers (presence containers are marked with a comment).
+    Comments are left out of JSON descriptors.
+    """
+    if args.format == 'python':
+        print_gen_desc(args, schema)
+        return
+    comments = {}
+    desc = schema_desc(args, schema, comments)
+    if args.format == 'json':
+        print(json.dumps(desc, indent=4))
+    else:
+        print_yaml_desc(desc, comments)
+
+
+def schema_desc(args, schema, comments):
+    """Return the data-only descriptor of the schema, or of the subtree at --path."""
+    ch = schema
+    levels = []
+    if args.path:
+        kp = str2kp(args.path)
+        ch = find_kp(schema, kp)
+        if ch is None:
+            print(f"Path {args.path} not found")
+            sys.exit(1)
+        levels = [find_kp(schema, kp[:i + 1]) for i in range(len(kp))]
+    desc = gen_desc(args, ch, comments)
+    for node in reversed(levels):
+        if isinstance(node, List):
+            comments[id(desc)] = ','.join(node.key_leafs)
+        desc = {f'{node.module}:{node.name}' if node.module else node.name: desc}
+    return desc
+
+
+def gen_desc(args, ch, comments):
+    """
+    Return a data-only descriptor of the lists, containers and choices below
+    ch. The comments of the Python descriptor are added to comments by id.
     """
-    print_gen_desc(args, schema)
+    desc = {}
+    for k, t in ch:
+        if args.verbose:
+            print(f'Processing {kp2str(t.get_kp)}', file=sys.stderr)
+        if isinstance(t, Container):
+            d = desc[k] = gen_desc(args, t, comments)
+            if t.presence:
+                comments[id(d)] = '(p-container)'
+        elif isinstance(t, List):
+            d = desc[k] = gen_desc(args, t, comments)
+            comments[id(d)] = ','.join(t.key_leafs)
+        elif isinstance(t, Choice):
+            d = desc[k] = {}
+            comments[id(d)] = '(choice)'
+            for case, m in t:
+                d[case] = gen_desc(args, m.items(), comments)
+                comments[id(d[case])] = '(case)'
+    return desc
+
+
+def print_yaml_desc(desc, comments, indent=0):
+    for k, v in desc.items():
+        comment = f'  # {comments[id(v)]}' if id(v) in comments else ''
+        if v:
+            print(f"{'  ' * indent}{json.dumps(k)}:{comment}")
+            print_yaml_desc(v, comments, indent + 1)
+        else:
+            print(f"{'  ' * indent}{json.dumps(k)}: {{}}{comment}")
 
 
 def print_gen_desc(args, schema, indent=0, root=True):
@@ -1478,7 +4957,7 @@ def print_desc_levels(schema, kp):
              help="The descriptor file to run"
     ),
     argument('-f', '--format',
-        choices=['default', 'tailf-config', 'nso-device'],
+        choices=list(output_formats),
         default='default',
         help="config output format"
     ),
@@ -1487,13 +4966,22 @@ def print_desc_levels(schema, kp):
         default='ce0',
         help="Device name for output format nso-device"
     ),
-    argument("-o", "--output",
-         type=str,
-         help="File to write generated config to."
-    ),
+    *output_file_arguments,
+    *target_arguments,
+    *profile_arguments,
+    *splice_arguments,
+    *cache_arguments,
     argument("--use-unaltered-patterns",
          action="store_true",
          help="Do not alter patterns to generator more natual strings."
+    ),
+    argument("--no-keyspace-check",
+         action="store_true",
+         help="Do not check that list key spaces and max-elements allow __NO_INSTANCES."
+    ),
+    argument("--no-check",
+         action="store_true",
+         help="Do not check the descriptor against the schema before running it."
     )],
     help="run config descriptor"
 )
@@ -1505,162 +4993,1198 @@ def cmd_rundesc(args, schema):
      - Calls generator functions for list key leafs.
      - List entry create can be controlled with __NO_INSTANCES.
     """
+    desc = load_descriptor(args.descriptor)
+    errors = [] if args.no_check else check_descriptor(args, schema, schema, desc)
+    if not errors and not args.no_keyspace_check:
+        errors = check_keyspace(args, schema, schema, desc)
+    if errors:
+        for error in errors:
+            print(f"ERROR: {error}")
+        sys.exit(1)
+
+    if args.splice:
+        plan = path_plan(args, schema, compile_descriptor(args, schema, schema, desc))
+        splice_config(args, schema, plan.run)
+        return
+    output_file = open_output(args)
+    if args.target_size or args.target_elements:
+        run_target(args, schema, lambda: load_descriptor(args.descriptor), output_file)
+        return
+    plan = compile_descriptor(args, schema, schema, desc)
+    if args.path:
+        plan = path_plan(args, schema, plan)
+    profiler = start_profile(args, output_file)
+    output = prepare_output(args, schema, output_file)
+    if profiler:
+        output = ProfileBackend(output, profiler, '/')
+    if plan is not None:
+        plan.run(output)
+    output.close_document()
+    output_file.close()
+    if profiler:
+        profiler.report(args)
+
+
+@subcommand([
+    argument("descriptor",
+             type=str,
+             help="The descriptor file to check"
+    ),
+    argument("--use-unaltered-patterns",
+         action="store_true",
+         help="Use unaltered patterns when estimating list key spaces."
+    )],
+    help="check config descriptor"
+)
+def cmd_checkdesc(args, schema):
+    """
+    Checks a config generator descriptor against the schema without running
+    it. All unknown nodes, misplaced directives, invalid constant values and
+    too small list key spaces are reported.
+    """
+    desc = load_descriptor(args.descriptor)
+    errors = check_descriptor(args, schema, schema, desc) + check_keyspace(args, schema, schema, desc)
+    for error in errors:
+        print(f"ERROR: {error}")
+    if errors:
+        sys.exit(1)
+    print(f"{args.descriptor}: OK")
+
+
+def load_descriptor(path):
+    """
+    Load a descriptor, data-only from .json/.yaml/.yml files or the
+    generator_descriptor dict of a Python file. Value source objects
+    ({"$seq": 1}, ...) can be used in both.
+    """
+    ext = os.path.splitext(path)[1]
+    if ext in data_descriptor_loaders:
+        return data_descriptor(load_data_descriptor(path, ext))
     import importlib.machinery
     import importlib.util
-    loader = importlib.machinery.SourceFileLoader(args.descriptor, args.descriptor)
-    spec = importlib.util.spec_from_loader(args.descriptor, loader)
+    loader = importlib.machinery.SourceFileLoader(path, path)
+    spec = importlib.util.spec_from_loader(path, loader)
     mymodule = importlib.util.module_from_spec(spec)
     loader.exec_module(mymodule)
+    return data_descriptor(mymodule.generator_descriptor)
+
+
+#### Data-only descriptors
+#
+# JSON and YAML descriptors have the same structure as Python descriptors.
+# Instead of functions and generators leaf values and directives use value
+# source objects, a dict with one $ key, see data_sources.
+
+DATA_DESCRIPTOR_CACHE_VERSION = 1
+
+
+def load_json(f):
+    return json.load(f)
+
+
+def load_yaml(f):
+    try:
+        import yaml
+    except ImportError:
+        print("ERROR: YAML descriptors require PyYAML (pip install pyyaml).")
+        sys.exit(1)
+    return yaml.load(f, Loader=getattr(yaml, 'CSafeLoader', yaml.SafeLoader))
+
+
+data_descriptor_loaders = {
+    '.json': load_json,
+    '.yaml': load_yaml,
+    '.yml': load_yaml,
+}
+
+
+def load_data_descriptor(path, ext):
+    """
+    Parse a data-only descriptor. The parsed form is cached with marshal in
+    __pycache__ next to the file, keyed by a hash of the file content.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha1(content + bytes([DATA_DESCRIPTOR_CACHE_VERSION])).hexdigest()[:16]
+    d, base = os.path.split(path)
+    cache_dir = os.path.join(d, '__pycache__')
+    cache = os.path.join(cache_dir, f'{base}.{digest}.desc')
+    try:
+        with open(cache, 'rb') as f:
+            return marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        pass
+    desc = data_descriptor_loaders[ext](io.BytesIO(content))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for old in os.listdir(cache_dir):
+            if old.startswith(f'{base}.') and old.endswith('.desc'):
+                os.remove(os.path.join(cache_dir, old))
+        with open(cache + '.tmp', 'wb') as f:
+            marshal.dump(desc, f)
+        os.replace(cache + '.tmp', cache)
+    except (OSError, ValueError):
+        pass  # Not cached, e.g. read only directory or YAML types marshal doesn't support
+    return desc
+
+
+def data_descriptor(desc):
+    """Convert the value source objects of a data-only descriptor to Python value sources."""
+    if isinstance(desc, dict):
+        sources = [k for k in desc if isinstance(k, str) and k.startswith('$')]
+        if sources:
+            f = data_sources.get(sources[0])
+            if f is None:
+                print(f"ERROR: Unknown value source {sources[0]}, valid sources: {', '.join(data_sources)}")
+                sys.exit(1)
+            return f(desc[sources[0]], desc)
+        return {str(k): data_descriptor(v) for k, v in desc.items()}
+    elif isinstance(desc, list):
+        return [data_descriptor(v) for v in desc]
+    return desc
+
+
+def source_range(spec, desc):
+    """{"$range": [min, max]} or [min, max, step]: random integer, max included."""
+    mi, mx, *step = spec
+    if step:
+        return (random.randrange, mi, mx + 1, step[0])
+    return (random.randint, mi, mx)
+
+
+def source_seq(spec, desc):
+    """{"$seq": start} or {"$seq": {"start": 1, "step": 1, "format": "{}", "scope": "global"}}"""
+    if isinstance(spec, dict):
+        return SeqSource(spec.get('start', 0), spec.get('step', 1), spec.get('format'), spec.get('scope', 'global'))
+    return SeqSource(spec or 0)
+
+
+def source_ip_range(spec, desc):
+    """{"$ip-range": "10.0.0.0/24"} or "10.0.0.1", or {"start": ..., "step": 1, "scope": "global"}"""
+    if isinstance(spec, dict):
+        return IPRangeSource(spec['start'], spec.get('step', 1), spec.get('scope', 'global'))
+    return IPRangeSource(spec)
+
+
+def source_ifname_range(spec, desc):
+    """{"$ifname-range": "GigabitEthernet{0-1}/0/{0-47}"} or {"format": ..., "scope": "global"}"""
+    if isinstance(spec, dict):
+        return IfNameRangeSource(spec['format'], spec.get('scope', 'global'))
+    return IfNameRangeSource(spec)
+
+
+def source_product(spec, desc):
+    """
+    {"$product": [["red", "blue"], {"from": 1, "to": 3}], "format": "{0}-{1}"}:
+    all combinations of the factors, lists of values or integer ranges.
+    """
+    factors = [range(f['from'], f['to'] + 1) if isinstance(f, dict) else f for f in spec]
+    return ProductSource(factors, desc.get('format'), desc.get('scope', 'global'))
+
+
+def source_choice(spec, desc):
+    """{"$choice": [a, b, ...]}: random value from the list."""
+    return (random.choice, list(spec))
+
+
+def source_weighted(spec, desc):
+    """{"$weighted": {a: weight, ...}} or [[a, weight], ...]: random value by weight."""
+    values, weights = zip(*(spec.items() if isinstance(spec, dict) else spec))
+    return lambda s_node: random.choices(values, weights)[0]
+
+
+def source_template(spec, desc):
+    """
+    {"$template": "ge-{slot}/0/{port}", "slot": ..., "port": ...}: format
+    string with the values of the other members, constants or value sources.
+    """
+    return TemplateSource(spec, {k: data_descriptor(v) for k, v in desc.items() if k != '$template'})
+
+
+def source_repeat(spec, desc):
+    """{"$repeat": count, "value": ...}: leaf-list with count values."""
+    return (data_descriptor(spec), data_descriptor(desc['value']))
+
+
+# Value sources of data-only descriptors
+data_sources = {
+    '$range': source_range,
+    '$seq': source_seq,
+    '$ip-range': source_ip_range,
+    '$ifname-range': source_ifname_range,
+    '$product': source_product,
+    '$choice': source_choice,
+    '$weighted': source_weighted,
+    '$template': source_template,
+    '$repeat': source_repeat,
+}
+
+
+class SequenceSource:
+    """
+    Base of the stateful value sources. Value i of the sequence is computed
+    directly, so values are produced one at a time with next() or in batches
+    with take(n). With scope 'parent' the sequence restarts at the first
+    value for every run of the enclosing list, i.e. for every entry of the
+    parent of the list, see PlanList. With scope 'global' it never restarts.
+    """
+    size = None  # Number of distinct values, finite sequences wrap around
+
+    def __init__(self, scope='global'):
+        if scope not in ['global', 'parent']:
+            print(f"ERROR: Invalid sequence scope {scope}, valid scopes: global, parent")
+            sys.exit(1)
+        self.scope = scope
+        self.i = 0
+
+    def reset(self):
+        self.i = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        v = self.value(self.i)
+        self.i += 1
+        return v
+
+    def take(self, n):
+        i = self.i
+        self.i += n
+        return [self.value(j) for j in range(i, i + n)]
+
+    def value(self, i):
+        raise NotImplementedError
+
+
+class SeqSource(SequenceSource):
+    def __init__(self, start=0, step=1, format=None, scope='global'):
+        super().__init__(scope)
+        if not step:
+            print("ERROR: Invalid sequence step 0")
+            sys.exit(1)
+        self.start = start
+        self.step = step
+        self.format = format
+
+    def value(self, i):
+        v = self.start + i * self.step
+        return self.format.format(v) if self.format else v
+
+    def take(self, n):
+        start = self.start + self.i * self.step
+        self.i += n
+        values = range(start, start + n * self.step, self.step)
+        return [self.format.format(v) for v in values] if self.format else list(values)
+
+
+class IPRangeSource(SequenceSource):
+    """Addresses from a start address, or the host addresses of a network."""
+    def __init__(self, start, step=1, scope='global'):
+        super().__init__(scope)
+        if step < 1:
+            print(f"ERROR: Invalid address range step {step}, must be positive")
+            sys.exit(1)
+        if '/' in start:
+            network = ipaddress.ip_network(start, strict=False)
+            first, last = int(network.network_address), int(network.broadcast_address)
+            if network.version == 4 and network.prefixlen < 31:
+                first, last = first + 1, last - 1  # Skip network and broadcast addresses
+            self.size = (last - first) // step + 1
+        else:
+            network = ipaddress.ip_address(start)
+            first = int(network)
+        self.first = first
+        self.step = step
+        self.cls = ipaddress.IPv4Address if network.version == 4 else ipaddress.IPv6Address
+
+    def value(self, i):
+        if self.size:
+            i %= self.size
+        return str(self.cls(self.first + i * self.step))
+
+
+class ProductSource(SequenceSource):
+    """All combinations of the factors, the last factor varying fastest."""
+    def __init__(self, factors, format=None, scope='global'):
+        super().__init__(scope)
+        self.factors = [list(f) for f in factors]
+        self.size = math.prod(len(f) for f in self.factors)
+        if not self.size:
+            print(f"ERROR: Invalid product, factor {[len(f) for f in self.factors].index(0) + 1} has no values")
+            sys.exit(1)
+        self.format = format or ' '.join('{}' for _ in self.factors)
+
+    def value(self, i):
+        i %= self.size
+        values = []
+        for f in reversed(self.factors):
+            i, r = divmod(i, len(f))
+            values.append(f[r])
+        return self.format.format(*reversed(values))
+
+
+class IfNameRangeSource(ProductSource):
+    """Interface names from a format with ranges, e.g. GigabitEthernet{0-1}/0/{0-47}."""
+    def __init__(self, format, scope='global'):
+        ranges = re.findall(r'\{(\d+)-(\d+)\}', format)
+        for a, b in ranges:
+            if int(a) > int(b):
+                print(f"ERROR: Invalid range {{{a}-{b}}} in interface name format {format}")
+                sys.exit(1)
+        super().__init__([range(int(a), int(b) + 1) for a, b in ranges],
+                         re.sub(r'\{\d+-\d+\}', '{}', format), scope)
+
+
+class TemplateSource:
+    def __init__(self, template, fields):
+        self.template = template
+        self.fields = fields
+
+    def __call__(self, s_node):
+        return self.template.format(**{k: value_source(s_node, v)() for k, v in self.fields.items()})
+
+
+def parent_sequences(value):
+    """Return the sequences in a descriptor value restarting for each run of the enclosing list."""
+    if isinstance(value, SequenceSource):
+        return [value] if value.scope == 'parent' else []
+    elif isinstance(value, TemplateSource):
+        return [q for v in value.fields.values() for q in parent_sequences(v)]
+    elif isinstance(value, tuple):
+        return [q for v in value for q in parent_sequences(v)]
+    return []
+
+
+PLAN_BATCH_ENTRIES = 4096  # List entries whose keys are taken at once
+
+
+class PlanNode:
+    """
+    A descriptor node resolved against the schema by compile_descriptor.
+    Running the plan only evaluates the value sources and writes the config.
+    """
+    def __init__(self, s_node, members=None):
+        self.s_node = s_node
+        self.name = s_node.name
+        self.module = s_node.module
+        self.members = members or []
+        self.condition = getattr(s_node, 'condition', None)
+
+    def run(self, doc):
+        for member in self.members:
+            member.run(doc)
+
+
+class PlanSchema(PlanNode):
+    def __init__(self, s_node, members, args):
+        super().__init__(s_node, members)
+        self.args = args
+
+    def run(self, doc):
+        super().run(condition_backend(self.args, self.s_node, doc))
+
+
+class PlanContainer(PlanNode):
+    def run(self, doc):
+        if self.condition is not None and not self.condition.holds(doc):
+            return
+        e = doc.add_container(self.name, self.module, self.s_node)
+        for member in self.members:
+            member.run(e)
+
+
+class PlanList(PlanNode):
+    def __init__(self, s_node, members, no_instances, keys, batches, resets, desc=None):
+        super().__init__(s_node, members)
+        self.no_instances = no_instances
+        self.desc = desc  # Descriptor of the list, for scaling to size targets
+        self.keys = keys  # Value sources of the key leafs
+        self.batches = batches  # take() of key leafs from sequences, to get the keys of all entries at once
+        self.batched = all(batches)
+        self.resets = resets  # Sequences restarting for each run
+
+    def run(self, doc):
+        if self.condition is not None and not self.condition.holds(doc):
+            return
+        s_node = self.s_node
+        for sequence in self.resets:
+            sequence.reset()
+        n = self.no_instances()
+        while n > 0:
+            # The keys are taken in batches, n is infinite when a size target stops the run
+            k = min(n, PLAN_BATCH_ENTRIES)
+            n -= k
+            if self.batched:
+                entries = zip(*[take(k) for take in self.batches]) if self.batches else itertools.repeat((), k)
+            else:
+                columns = [take(k) if take else None for take in self.batches]
+                entries = ([c[i] if c is not None else key() for c, key in zip(columns, self.keys)]
+                           for i in range(k))
+            for values in entries:
+                le = doc.add_list_entry(self.name, self.module, s_node.key_leafs, values, s_node)
+                for member in self.members:
+                    member.run(le)
+
+
+class PlanChoice(PlanNode):
+    def __init__(self, s_node, cases, choose):
+        super().__init__(s_node)
+        self.cases = cases  # Members of each case
+        self.case_names = list(cases)
+        self.choose = choose  # Value source of __CHOOSE, the default or a random case if None
+        self.default = s_node.default if s_node.default in cases else None
+
+    def run(self, doc):
+        if self.condition is not None and not self.condition.holds(doc):
+            return
+        if self.choose is not None:
+            case = self.choose()
+        elif self.default is not None:
+            case = self.default
+        else:
+            case = random.choice(self.case_names)
+        for member in self.cases[case]:
+            member.run(doc)
+
+
+class PlanLeaf(PlanNode):
+    def __init__(self, s_node, value, optional=False):
+        super().__init__(s_node)
+        self.value = value
+        self.optional = optional  # Leave out the leaf when the value is None
+
+    def run(self, doc):
+        if self.condition is None:
+            value = self.value()
+        elif self.condition.holds(doc):
+            value = self.condition.value(doc, self.value)
+            if value is MISSING:
+                return
+        else:
+            return
+        if value is not None or not self.optional:
+            doc.add_leaf(self.name, self.module, value, self.s_node)
 
-    doc, xmlroot = prepare_output(args)
-    output = XMLBackend(schema, xmlroot)
-    iterate_descriptor(args, schema, schema, output, mymodule.generator_descriptor)
 
-    output_file = open(args.output, 'w') if args.output else sys.stdout
-    output_file.write(prettify(doc))
+class PlanLeafSample:
+    """
+    The leafs not in the descriptor, populated as sampled for each entry by
+    __LEAVES_ALGO. Mandatory leafs are always populated.
+    """
+    def __init__(self, leaves, sample):
+        self.leaves = leaves
+        # Mandatory leafs and leaf-lists with min-elements
+        self.mandatory = [i for i, leaf in enumerate(leaves) if leaf.s_node.mandatory or
+                          getattr(leaf.s_node, 'min_elements', 0)]
+        self.indexes = [i for i in range(len(leaves)) if i not in self.mandatory]
+        self.sample = sample
+
+    def run(self, doc):
+        leaves = self.leaves
+        indexes = self.sample(self.indexes)
+        if self.mandatory:
+            indexes = sorted(chain(indexes, self.mandatory))
+        for i in indexes:
+            leaves[i].run(doc)
+
+
+class PlanLeafList(PlanNode):
+    def __init__(self, s_node, values=None, count=None, value=None, optional=False):
+        super().__init__(s_node)
+        self.values = values or []  # Fixed values
+        self.count = count  # Value sources for the number of values and each value
+        self.value = value
+        self.optional = optional  # Distinct values, None left out, for leaf-lists not in the descriptor
+
+    def run(self, doc):
+        if self.condition is not None:
+            self.run_condition(doc)
+            return
+        for value in self.values:
+            doc.add_leaf(self.name, self.module, value, self.s_node)
+        if self.optional:
+            for value in distinct_values(self.value, self.count()):
+                if value is not None:
+                    doc.add_leaf(self.name, self.module, value, self.s_node)
+        elif self.count is not None:
+            for _ in range(0, self.count()):
+                doc.add_leaf(self.name, self.module, str(self.value()), self.s_node)
+
+    def run_condition(self, doc):
+        """Run with the when and must expressions, fixed values must satisfy must too."""
+        if not self.condition.holds(doc):
+            return
+        for value in self.values:
+            if self.condition.accepts(doc, value):
+                doc.add_leaf(self.name, self.module, value, self.s_node)
+        if self.optional:
+            for value in distinct_values(lambda: self.condition.value(doc, self.value), self.count()):
+                if value is not None:
+                    doc.add_leaf(self.name, self.module, value, self.s_node)
+        elif self.count is not None:
+            for _ in range(0, self.count()):
+                value = self.condition.value(doc, lambda: str(self.value()))
+                if value is not MISSING:
+                    doc.add_leaf(self.name, self.module, value, self.s_node)
 
 
-def iterate_descriptor(args, schema, s_node, doc, desc):
-    __no_instances = 1 # Used by lists, default is one instance
-    __choose = None # Used by choices, default is random
+def compile_descriptor(args, schema, s_node, desc, resets=None, leaves=None):
+    """
+    Compile the descriptor of a schema node into a plan. Directives, schema
+    lookups and the unspecified leafs are resolved once, instead of for every
+    list entry. Sequences with scope parent are added to resets of the
+    enclosing list. leaves is the __LEAVES_ALGO sampler inherited from the
+    parent. Returns None for nodes with __SKIP.
+    """
     # Process any processing directives starting with double underscore.
     for k, v in desc.items():
         if k.startswith('__'):
             if k == '__NO_INSTANCES':
-                if isinstance(s_node, List):
-                    __no_instances = v
-                else:
-                    print("ERROR: __NO_INSTAMCES only valid for list nodes:", s_node.name, str(type(s_node)))
+                if not isinstance(s_node, List):
+                    print("ERROR: __NO_INSTANCES only valid for list nodes:", s_node.name, str(type(s_node)))
                     sys.exit(1)
             elif k == '__CHOOSE':
-                if isinstance(s_node, Choice):
-                    __choose = v
-                else:
-                    print("ERROR: __NO_INSTAMCES only valid for list nodes:", s_node.name, str(type(s_node)))
+                if not isinstance(s_node, Choice):
+                    print("ERROR: __CHOOSE only valid for choice nodes:", s_node.name, str(type(s_node)))
                     sys.exit(1)
             elif k == '__SKIP' and v == True:
-                return
+                return None
+            elif k == '__LEAVES_ALGO':
+                leaves = leaves_algo(v)
+                if isinstance(leaves, str):
+                    print(f"ERROR: {leaves}")
+                    sys.exit(1)
     if isinstance(s_node, Schema):
-        process_members(args, schema, s_node, doc, desc, [])
+        if s_node.conditions is None:
+            compile_conditions(args, s_node)
+        return PlanSchema(s_node, compile_members(args, schema, s_node, desc, leaves=leaves), args)
     elif isinstance(s_node, List):
-        noi = eval_leaf_value(s_node, __no_instances)
-        for _ in range(0, noi):
-            processed = []  # List of processed nodes
-            values = []
-            for leaf in s_node.key_leafs:
-                processed.append(leaf)
-                n = s_node.find_path(leaf)
-                if leaf not in desc.keys():
-                    values.append(process_leaf_default(args, schema, n))
-                else:
-                    values.append(eval_leaf_value(n, desc[leaf]))
-            le = doc.add_list_entry(s_node.name, s_node.module, s_node.key_leafs, values)
-            process_members(args, schema, s_node, le, desc, processed)
-            create_unspecified_leafs(args, schema, s_node, le, desc, processed)
+        keys = []
+        batches = []
+        resets = []
+        for leaf in s_node.key_leafs:
+            n = s_node.find_path(leaf)
+            v = desc.get(leaf)
+            keys.append(value_source(n, v) if leaf in desc else default_source(args, schema, n))
+            batches.append(v.take if isinstance(v, SequenceSource) else None)
+            resets += parent_sequences(v)
+        members = compile_members(args, schema, s_node, desc, s_node, s_node.key_leafs, resets, leaves)
+        # Default is one instance, or min-elements
+        no_instances = value_source(s_node, desc.get('__NO_INSTANCES', max(1, s_node.min_elements)))
+        return PlanList(s_node, members, no_instances, keys, batches, resets, desc)
     elif isinstance(s_node, Container):
-        processed = []
-        e = doc.add_container(s_node.name, s_node.module)
-        if s_node.presence:
-            pass  # Handle presence container
-
-        process_members(args, schema, s_node, e, desc, processed)
-        create_unspecified_leafs(args, schema, s_node, e, desc, processed)
+        return PlanContainer(s_node, compile_members(args, schema, s_node, desc, s_node, resets=resets, leaves=leaves))
     elif isinstance(s_node, Choice):
-        if __choose is None:
-            case = random.choice(list(s_node.choices))
-        else:
-            case = eval_leaf_value(__choice)
-        case_nodes = s_node.choices[case]
-        processed = []
-        process_members(args, schema, s_node, doc, desc[case], processed)
-        create_unspecified_leafs(args, schema, Case(s_node[case]), doc, desc[case], processed)
-
+        # Cases not in the descriptor only get their unspecified leafs
+        cases = {case: compile_members(args, schema, s_node, desc.get(case, {}), Case(case_nodes),
+                                       resets=resets, leaves=leaves)
+                 for case, case_nodes in s_node}
+        choose = desc.get('__CHOOSE')
+        return PlanChoice(s_node, cases, value_source(s_node, choose) if choose is not None else None)
     else:
         print("ERROR: Invalid node", str(type(s_node)), desc)
         sys.exit(1)
 
 
+def path_plan(args, schema, plan):
+    """
+    The plan with only the members on the path of --path to its node, which
+    is run as a whole. The path must be in the descriptor.
+    """
+    node = find_kp(schema, str2kp(args.path))
+    if node is None:
+        print(f"Path {args.path} not found")
+        sys.exit(1)
+    nodes = []
+    while not isinstance(node, Schema):
+        nodes.insert(0, node)
+        node = node.parent
+
+    def member(members, node):
+        for m in members:
+            if isinstance(m, PlanChoice):
+                for case in m.cases.values():
+                    found = member(case, node)
+                    if found is not None:
+                        return found
+            elif getattr(m, 's_node', None) is node:
+                return m
+        return None
+
+    root = parent = copy.copy(plan)
+    for i, node in enumerate(nodes):
+        m = member(parent.members, node) if parent is not None else None
+        if m is None:
+            print(f"ERROR: Path {args.path} is not in the descriptor.")
+            sys.exit(1)
+        if i < len(nodes) - 1:
+            m = copy.copy(m)
+        parent.members = [m]
+        parent = m
+    return root
+
+
+def compile_members(args, schema, s_node, desc, unspecified=None, processed=(), resets=None, leaves=None):
+    """
+    Compile the members of the descriptor, followed by the leafs and
+    leaf-lists of the node unspecified not in the descriptor, which get
+    random values. Which of them are populated is sampled by leaves.
+    """
+    plan = []
+    for k, v in desc.items():
+        if k.startswith('__') or k in processed:
+            continue  # Processing directives already handled
+        n = s_node.find_path(k, find_in_choice=False)
+        if n is None:
+            print(f"ERROR: Node {k} at {kp2str(s_node.get_kp)} not in schema.")
+            sys.exit(1)
+        if resets is not None:
+            resets += parent_sequences(v)
+        if isinstance(v, dict):
+            p = compile_descriptor(args, schema, n, v, resets, leaves)
+            if p is not None:
+                plan.append(p)
+        elif isinstance(n, LeafList):
+            if isinstance(v, list):
+                plan.append(PlanLeafList(n, values=v))
+            elif isinstance(v, tuple):
+                c, v = v
+                plan.append(PlanLeafList(n, count=value_source(n, c), value=value_source(n, v)))
+        else:
+            plan.append(PlanLeaf(n, value_source(n, v)))
+    if unspecified is not None:
+        # A leaf-list gets min-elements values, at least one, like in genconfig
+        optional = [PlanLeafList(n, count=lambda n=n: max(1, n.min_elements), value=default_source(args, schema, n),
+                                 optional=True) if isinstance(n, LeafList) else
+                    PlanLeaf(n, default_source(args, schema, n), optional=True)
+                    for k, n in unspecified.children.items()
+                    if k not in desc and k not in processed and isinstance(n, Leaf)]
+        if optional and leaves is None:
+            plan += optional
+        elif optional:
+            plan.append(PlanLeafSample(optional, leaves))
+    return plan
+
+
+def leaves_percent(percent):
+    def sample(population):
+        return sorted(random.sample(population, round(len(population) * percent / 100)))
+    return sample
+
+
+def leaves_random_percent(percent):
+    lo, hi = percent
+    def sample(population):
+        return sorted(random.sample(population, round(len(population) * random.uniform(lo, hi) / 100)))
+    return sample
+
+
+def leaves_algo(value):
+    """
+    Return the sampler of a __LEAVES_ALGO value, None for all leafs, or an
+    error message. A sampler returns the sorted indexes of the leafs to
+    populate from a range of leaf indexes.
+    """
+    if value == 'all':
+        return None
+    elif value == 'none':
+        return lambda population: ()
+    elif isinstance(value, dict) and len(value) == 1:
+        (algo, percent), = value.items()
+        if algo == 'percent' and isinstance(percent, (int, float)) and 0 <= percent <= 100:
+            return leaves_percent(percent)
+        elif (algo == 'random-percent' and isinstance(percent, (list, tuple)) and len(percent) == 2 and
+              0 <= percent[0] <= percent[1] <= 100):
+            return leaves_random_percent(percent)
+    return (f"Invalid __LEAVES_ALGO {value!r}, valid: 'all', 'none', "
+            "{'percent': 0-100} or {'random-percent': [min, max]}")
+
+
+def max_instances(value):
+    """
+    Return the upper bound of a __NO_INSTANCES value or None if it can't be
+    determined before running the descriptor.
+    """
+    if isinstance(value, int):
+        return value
+    elif isinstance(value, tuple) and len(value) == 3:
+        func, mi, mx = value
+        if func == random.randint:
+            return mx
+        elif func == random.randrange:
+            return mx - 1
+    return None
+
+
+def check_keyspace(args, schema, s_node, desc, errors=None):
+    """
+    Check that the key space and max-elements of every list in the
+    descriptor allow the requested number of instances. Returns a list of
+    error messages.
+    """
+    errors = errors if errors is not None else []
+    if desc.get('__SKIP') == True:
+        return errors
+    if isinstance(s_node, List) and '__NO_INSTANCES' in desc:
+        n = max_instances(desc['__NO_INSTANCES'])
+        if n is not None:
+            ks = list_keyspace(args, schema, s_node, desc)
+            if n > ks:
+                errors.append(f"{kp2str(s_node.get_kp)} requests up to {n} instances but the key space only "
+                              f"allows {format_cardinality(ks)} distinct keys")
+            elif n > s_node.max_elements:
+                errors.append(f"{kp2str(s_node.get_kp)} requests up to {n} instances but max-elements is "
+                              f"{s_node.max_elements}")
+    if isinstance(s_node, Choice):
+        members = [(s_node, v) for k, v in desc.items() if not k.startswith('__') and isinstance(v, dict)]
+    else:
+        members = [(s_node, desc)]
+    for parent, d in members:
+        for k, v in d.items():
+            if k.startswith('__') or not isinstance(v, dict):
+                continue
+            n = parent.find_path(k, find_in_choice=False)
+            if n is not None:
+                check_keyspace(args, schema, n, v, errors)
+    return errors
+
+
+# Descriptor directives and the schema nodes they are valid for
+descriptor_directives = {
+    '__NO_INSTANCES': (List,),
+    '__CHOOSE': (Choice,),
+    '__SKIP': (Container, List, Choice),
+    '__LEAVES_ALGO': (Schema, Container, List, Choice),
+    '__WEIGHT': (List,),
+}
+
+
+def is_constant(value):
+    """True if a descriptor leaf value is a constant, see value_source."""
+    return not (callable(value) or hasattr(value, '__next__') or isinstance(value, tuple))
+
+
+def check_descriptor(args, schema, s_node, desc, errors=None):
+    """
+    Check the descriptor against the schema. Returns a list of error messages
+    for unknown nodes, misplaced or invalid directives and constant values not
+    valid for the datatype of the leaf.
+    """
+    errors = errors if errors is not None else []
+    path = kp2str(s_node.get_kp) if not isinstance(s_node, Schema) else '/'
+    if not isinstance(desc, dict):
+        errors.append(f"{path}: {type(s_node).__name__.lower()} requires a dict, got {desc!r}")
+        return errors
+    for k, v in desc.items():
+        if not k.startswith('__'):
+            continue
+        if k not in descriptor_directives:
+            errors.append(f"{path}: unknown directive {k}")
+        elif not isinstance(s_node, descriptor_directives[k]):
+            errors.append(f"{path}: {k} is not valid for {type(s_node).__name__.lower()} nodes")
+        elif k == '__NO_INSTANCES' and is_constant(v) and not (isinstance(v, int) and v >= 0):
+            errors.append(f"{path}: __NO_INSTANCES must be a non-negative integer, got {v!r}")
+        elif k == '__CHOOSE' and is_constant(v) and v not in s_node.choices:
+            errors.append(f"{path}: __CHOOSE case {v!r} not in choice, valid cases: {', '.join(s_node.choices)}")
+        elif k == '__LEAVES_ALGO' and isinstance(leaves_algo(v), str):
+            errors.append(f"{path}: {leaves_algo(v)}")
+        elif k == '__WEIGHT' and not (isinstance(v, (int, float)) and not isinstance(v, bool) and v >= 0):
+            errors.append(f"{path}: __WEIGHT must be a non-negative number, got {v!r}")
+    if desc.get('__SKIP') == True:
+        return errors
+    if isinstance(s_node, Choice):
+        for case, d in desc.items():
+            if case.startswith('__'):
+                continue
+            if case not in s_node.choices:
+                errors.append(f"{path}: case {case} not in choice, valid cases: {', '.join(s_node.choices)}")
+            elif not isinstance(d, dict):
+                errors.append(f"{path}/{case}: case requires a dict, got {d!r}")
+            else:
+                check_members(args, schema, Case(s_node.choices[case]), f"{path}/{case}", d, errors)
+    else:
+        check_members(args, schema, s_node, path, desc, errors)
+    return errors
+
+
+def check_members(args, schema, s_node, path, desc, errors):
+    for k, v in desc.items():
+        if k.startswith('__'):
+            continue
+        n = s_node.find_path(k, find_in_choice=False)
+        if n is None:
+            errors.append(f"{path.rstrip('/')}/{k}: not in schema")
+        elif isinstance(n, Leaf):
+            if isinstance(v, dict):
+                errors.append(f"{kp2str(n.get_kp)}: {type(n).__name__.lower()} can not have a dict")
+            elif isinstance(n, LeafList):
+                if isinstance(v, list):
+                    for value in v:
+                        check_leaf_value(schema, n, value, errors)
+                elif not isinstance(v, tuple) or len(v) != 2:
+                    errors.append(f"{kp2str(n.get_kp)}: leaf-list requires a list or a (count, value) tuple")
+            else:
+                check_leaf_value(schema, n, v, errors)
+        else:
+            check_descriptor(args, schema, n, v, errors)
+
+
+def check_leaf_value(schema, n, value, errors):
+    if is_constant(value):
+        error = check_value(schema, n.datatype, value)
+        if error:
+            errors.append(f"{kp2str(n.get_kp)}: {error}")
+
+
+def check_value(schema, datatype, value):
+    """
+    Check a constant value against a datatype. Returns an error message or
+    None if the value is valid. Types that can't be checked without the
+    config, like leafrefs, are accepted.
+    """
+    return value_checker(schema, datatype)(value)
+
+
+def value_checker(schema, datatype):
+    """
+    Return a function checking values against a datatype like check_value.
+    The ranges, enumerations and patterns are prepared once, for checking
+    many values of the same datatype.
+    """
+    dt, r = datatype
+    if dt in ilimits:
+        ranges = [int_range(dt, rng) for rng in (r or [None])]
+
+        def check(value):
+            try:
+                v = int(value)
+            except (TypeError, ValueError):
+                return f"{value!r} is not a valid {dt}"
+            for mi, mx, step in ranges:
+                if mi <= v <= mx and (v - mi) % step == 0:
+                    return None
+            return f"{value!r} is out of range for {dt}"
+    elif dt == 'string':
+        lengths, patterns = r
+        # Patterns that are not Python regular expressions are not checked
+        matches = [(p, m) for p in patterns if (m := schema.pattern(p).match()) is not None]
+
+        def check(value):
+            s = str(value)
+            if lengths and not any((lmax or lmin) >= len(s) >= lmin for lmin, lmax in lengths):
+                return f"length of {value!r} not in {lengths}"
+            for pattern, match in matches:
+                if not match(s):
+                    return f"{value!r} does not match pattern {pattern}"
+            return None
+    elif dt == 'boolean':
+        def check(value):
+            if value not in [True, False, 'true', 'false']:
+                return f"{value!r} is not a boolean"
+            return None
+    elif dt == 'enumeration':
+        enums = set(r)
+
+        def check(value):
+            if value not in enums:
+                return f"{value!r} not in enumeration {', '.join(r)}"
+            return None
+    elif dt == 'empty':
+        def check(value):
+            if value not in [None, '']:
+                return f"{value!r} given for leaf of type empty"
+            return None
+    elif dt == 'decimal64':
+        fd, rng = r
+
+        def check(value):
+            try:
+                v = decimal.Decimal(str(value))
+            except decimal.InvalidOperation:
+                return f"{value!r} is not a decimal64"
+            if not v.is_finite() or -v.as_tuple().exponent > fd or (rng and not rng[0] <= v <= rng[1]):
+                return f"{value!r} is out of range for decimal64 with {fd} fraction digits"
+            return None
+    elif dt == 'typedef':
+        return value_checker(schema, schema.json['typedefs'][r])
+    elif dt == 'union':
+        checkers = [value_checker(schema, m) for m in r]
+
+        def check(value):
+            if all(c(value) for c in checkers):
+                return f"{value!r} matches no member type of the union"
+            return None
+    else:
+        def check(value):
+            return None
+    return check
+
+
 # TODO: Incorporate or move this to Schema?
 class Case(HasChildren):
     def __init__(self, case_children):
         self.children = case_children
 
 
-def eval_leaf_value(s_node, value):
+def value_source(s_node, value):
+    """Return a function producing the values of a descriptor leaf value."""
     if callable(value):
-        return value(s_node)
+        return lambda: value(s_node)
     elif hasattr(value, '__next__'):
-        return value.__next__()
+        return value.__next__
     elif isinstance(value, tuple):
         func, *args = value
         assert(callable(func))
-        return func(*args)
+        return lambda: func(*args)
     else:
-        return value
-def create_unspecified_leafs(args, schema, s_node, doc, desc, processed):
-    for k, v in s_node.children.items():
-        if k not in desc.keys() and k not in processed:
-            if isinstance(v, LeafList):
-                #create_leaflist(args, schema, s_node, doc, v)
-                pass
-            elif isinstance(v, Leaf):
-                value = process_leaf_default(args, schema, v)
-                if value is not None:
-                    doc.add_leaf(k, None, value)
+        return lambda: value
 
 
-def create_leaflist(args, schema, s_node, doc, k, inp):
-    if isinstance(inp, list):
-        for value in inp:
-            doc.add_leaf(k, None, value)
-    elif isinstance(inp, tuple):
-        c, v = inp
-        for _ in range(0, eval_leaf_value(s_node, c)):
-            value = eval_leaf_value(s_node, v)
-            doc.add_leaf(k, None, eval_leaf_value(s_node, str(value)))
+def default_source(args, schema, s_node):
+    """Return a function producing random values for a leaf not in the descriptor."""
+    assert (isinstance(s_node, Leaf))
+    return lambda: generate_random_value(args, schema, s_node.module, s_node, s_node.datatype)
 
 
-def process_members(args, schema, s_node, doc, desc, processed):
-    for k, v in desc.items():
-        if k.startswith('__'):
-            pass  # Processing directives already handled
-        elif k not in processed:
-            # TODO: Improve test with processed
-            processed.append(k)
-            n = s_node.find_path(k, find_in_choice=False)
-            if n is None:
-                print(f"ERROR: Node {k} at {kp2str(s_node.get_kp)} not in schema.")
-                sys.exit(0)
-            if isinstance(v, dict):
-                iterate_descriptor(args, schema, n, doc, v)
-            else:
-                if isinstance(n, LeafList):
-                    create_leaflist(args, schema, n, doc, k, v)
-                else:
-                    doc.add_leaf(k, None, eval_leaf_value(n, v))
+#### Size targets
 
+PILOT_ENTRIES = 10  # Entries of every scaled list in the pilot run
 
-def process_leaf_default(args, schema, s_node):
-    assert (isinstance(s_node, Leaf))
-    return generate_random_value(args, schema, s_node.module, s_node, s_node.datatype)
+
+class BudgetReached(Exception):
+    pass
+
+
+class ReserveReached(BudgetReached):
+    """Only the entries of a list with a reserve are stopped, the run continues after the list."""
+
+
+class Budget:
+    """
+    Counts the elements (leaf and leaf-list values, list keys included) and
+    the bytes written to the output file. check() raises BudgetReached when
+    a target is reached. Entries of the lists in reserves, by schema node,
+    are stopped that many bytes and elements before the targets, left for
+    the config after them.
+    """
+    def __init__(self, output_file, target_size=None, target_elements=None, reserves=None):
+        self.output_file = output_file
+        self.target_size = target_size
+        self.target_elements = target_elements
+        self.reserves = reserves or {}
+        self.elements = 0
+
+    def size(self):
+        """Uncompressed bytes written, all chunks included."""
+        return self.output_file.total_bytes + self.output_file.size()
+
+    def reached(self, reserve=(0, 0)):
+        return bool((self.target_elements and self.elements >= self.target_elements - reserve[1]) or
+                    (self.target_size and self.size() >= self.target_size - reserve[0]))
+
+    def check(self, node=None):
+        if self.reached():
+            raise BudgetReached()
+        if node in self.reserves and self.reached(self.reserves[node]):
+            raise ReserveReached()
+
+
+class BudgetBackend:
+    """
+    Output backend proxy counting the elements in the budget. Before every
+    list entry the budget is checked, so a run is stopped between list
+    entries and the document can be closed as usual.
+    """
+    def __init__(self, backend, budget):
+        self.backend = backend
+        self.budget = budget
+
+    def close_document(self):
+        self.backend.close_document()
+
+    def add_container(self, name, module, node=None):
+        return BudgetBackend(self.backend.add_container(name, module, node), self.budget)
+
+    def add_list_entry(self, name, module, keys, values, node=None):
+        self.budget.check(node)
+        self.budget.elements += len(values)
+        return BudgetBackend(self.backend.add_list_entry(name, module, keys, values, node), self.budget)
+
+    def add_leaf(self, name, module, value, node=None):
+        self.budget.elements += 1
+        self.backend.add_leaf(name, module, value, node)
+
+
+def scaled_lists(plan):
+    """Return the outermost lists of the plan, the lists scaled to reach a size target."""
+    if isinstance(plan, PlanList):
+        return [plan]
+    elif isinstance(plan, PlanChoice):
+        members = [m for case in plan.cases.values() for m in case]
+    else:
+        members = getattr(plan, 'members', [])
+    return [pl for m in members for pl in scaled_lists(m)]
+
+
+def pilot_costs(args, schema, plan):
+    """
+    Run the plan with PILOT_ENTRIES entries of every scaled list to a null
+    sink. Returns the bytes and elements outside of the scaled lists and the
+    average bytes and elements of an entry of each scaled list, None for
+    lists not run (in a case not chosen).
+    """
+    sink = OutputSink(os.devnull, None, output_formats[args.format][0].binary)
+    budget = Budget(sink)
+    lists = scaled_lists(plan)
+    measured = {}
+    for pl in lists:
+        def run(doc, pl=pl, run=pl.run):
+            size, elements = budget.size(), budget.elements
+            run(doc)
+            b, e, n = measured.get(pl, (0, 0, 0))
+            measured[pl] = (b + budget.size() - size, e + budget.elements - elements, n + PILOT_ENTRIES)
+        pl.run = run
+        pl.no_instances = lambda: PILOT_ENTRIES
+    output = prepare_output(args, schema, sink)
+    plan.run(BudgetBackend(output, budget))
+    output.close_document()
+    sink.close()
+    base = (budget.size() - sum(b for b, e, n in measured.values()),
+            budget.elements - sum(e for b, e, n in measured.values()))
+    costs = [(measured[pl][0] / measured[pl][2], measured[pl][1] / measured[pl][2]) if pl in measured else None
+             for pl in lists]
+    return base, costs
+
+
+def target_instances(target, base, lists):
+    """
+    Distribute what is left of the target after the fixed part base over the
+    lists, given as (instances, weight, cost per entry, limit). With weights
+    the lists with a weight get that share of the target and the others keep
+    their instances, otherwise all lists are scaled by the same factor. Lists
+    reaching their limit get it, and their share is distributed over the other
+    lists. Returns the number of instances of each list and the index of the
+    last list not limited, None if there is none.
+    """
+    weighted = any(w is not None for n, w, c, limit in lists)
+    shares = [None if not c else (w if weighted else n * c) for n, w, c, limit in lists]
+    counts = [n for n, w, c, limit in lists]
+    scaled = [i for i, s in enumerate(shares) if s is not None]
+    while scaled:
+        fixed = base + sum(counts[i] * (c or 0) for i, (n, w, c, limit) in enumerate(lists) if i not in scaled)
+        total = sum(shares[i] for i in scaled)
+        left = max(0, target - fixed)
+        for i in scaled:
+            counts[i] = math.ceil(left * shares[i] / total / lists[i][2]) if total else lists[i][0]
+        limited = [i for i in scaled if counts[i] >= lists[i][3]]
+        if not limited:
+            return counts, scaled[-1]
+        for i in limited:
+            counts[i] = lists[i][3]
+            scaled.remove(i)
+    return counts, None
+
+
+def scale_plan(args, schema, plan, pilot):
+    """
+    Set the number of instances of the outermost lists of plan to reach the
+    size or element target, estimated from a pilot run of the plan pilot
+    compiled from the same descriptor. Counts are limited to the key space
+    and max-elements. The last list not limited runs until the target is
+    reached, less the estimated bytes and elements of the lists after it.
+    Returns those as the reserves of the budget, see ReserveReached.
+    """
+    (base_size, base_elements), costs = pilot_costs(args, schema, pilot)
+    lists = scaled_lists(plan)
+    declared = [(max_instances(pl.desc.get('__NO_INSTANCES', max(1, pl.s_node.min_elements))) or 1,
+                 pl.desc.get('__WEIGHT'),
+                 min(pl.s_node.max_elements, list_keyspace(args, schema, pl.s_node, pl.desc))) for pl in lists]
+    counts = [math.inf] * len(lists)
+    unlimited = []
+    for target, i in [(args.target_size, 0), (args.target_elements, 1)]:
+        if target:
+            per_list = [(n, w, c[i] if c else None, limit) for (n, w, limit), c in zip(declared, costs)]
+            t_counts, last = target_instances(target, (base_size, base_elements)[i], per_list)
+            counts = [min(a, b) for a, b in zip(counts, t_counts)]
+            if last is not None:
+                unlimited.append(last)
+    reserves = {}
+    if unlimited:
+        last = min(unlimited)
+        counts[last] = declared[last][2]
+        reserves[lists[last].s_node] = tuple(sum(n * c[i] for n, c in zip(counts[last + 1:], costs[last + 1:]) if c)
+                                             for i in (0, 1))
+
+        def run(doc, run=lists[last].run):
+            try:
+                run(doc)
+            except ReserveReached:
+                pass
+        lists[last].run = run
+    for pl, n in zip(lists, counts):
+        if args.verbose:
+            print(f"{kp2str(pl.s_node.get_kp)}: {format_cardinality(n)} instances", file=sys.stderr)
+        pl.no_instances = lambda n=n: n
+    return reserves
+
+
+def run_target(args, schema, load, output_file):
+    """
+    Run the descriptor returned by load() until --target-size or
+    --target-elements is reached. The descriptor is loaded twice, the pilot
+    run gets value sources of its own. The result is reported on stderr.
+    """
+    plan = compile_descriptor(args, schema, schema, load())
+    start = time.time()
+    reserves = {}
+    if plan is not None:
+        reserves = scale_plan(args, schema, plan, compile_descriptor(args, schema, schema, load()))
+    pilot = time.time() - start
+    budget = Budget(output_file, args.target_size, args.target_elements, reserves)
+    profiler = start_profile(args, output_file)
+    output = prepare_output(args, schema, output_file)
+    if profiler:
+        output = ProfileBackend(output, profiler, '/')
+    start = time.time()
+    try:
+        if plan is not None:
+            plan.run(BudgetBackend(output, budget))
+    except BudgetReached:
+        pass
+    output.close_document()
+    output_file.close()
+    elapsed = max(time.time() - start, 1e-9)
+    size = budget.size()
+    print(f"{'Target reached' if budget.reached() else 'Target not reached'}: "
+          f"{budget.elements} elements, {size} bytes in {elapsed:.2f} s (pilot {pilot:.2f} s), "
+          f"{budget.elements / elapsed:.0f} elements/s, {size / elapsed / (1 << 20):.1f} MB/s", file=sys.stderr)
+    if profiler:
+        profiler.report(args)
 
 
 #############################################################################################################
 #  Main
 #############################################################################################################
+def read_schema(path):
+    return Schema(json.loads(open(path).read()))
+
+
 def main():
     global parser, subparsers
     set_epilog()
     args = parser.parse_args(sys.argv[1:])
+    if args.seed is not None:
+        random.seed(args.seed)
 
     if args.subcommand is None:
         parser.print_help()
-    elif args.subcommand == "compile":
-        args.func(args, None)
+    elif args.subcommand in ("compile", "complex"):
+        args.func(args, None)  # The schema is loaded when needed
+    elif getattr(args, 'cache', False):
+        run_cached(args)  # The schema is loaded when not cached
     else:
-        json_schema = json.loads(open(args.model).read())
-        schema = Schema(json_schema)
-        args.func(args, schema)
+        args.func(args, read_schema(args.model))
     sys.exit()
 
 if __name__ == "__main__":